@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2018--, Qurro development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#
+# asv benchmarks for each stage of Qurro's python visualization generation
+# pipeline. Each class here benchmarks a single stage, using synthetic
+# datasets of various sizes (see synthetic_data.py); everything needed to run
+# a stage is computed beforehand in setup(), so it isn't included in the
+# timing.
+#
+# Note that asv measures peak memory (for the peakmem_* benchmarks) across
+# the entire benchmarking process, so these measurements include the memory
+# used by setup(). They're still useful for comparing different versions of
+# Qurro, though.
+# ----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import altair as alt
+import qurro
+from qurro.generate import process_input, gen_rank_plot, gen_sample_plot
+from qurro._count_utils import sparse_count_dict
+from qurro._json_utils import dumps_json, replace_js_json_definitions
+from qurro._table_utils import get_feature_ids, get_sample_ids
+from .synthetic_data import FEATURE_COUNTS, SAMPLE_COUNTS, make_dataset
+
+MAIN_JS_LOC = os.path.join(
+    os.path.dirname(os.path.realpath(qurro.__file__)),
+    "support_files",
+    "main.js",
+)
+
+
+class StageBenchmark:
+    """Base class for the benchmarks of each stage."""
+
+    params = (FEATURE_COUNTS, SAMPLE_COUNTS)
+    param_names = ["features", "samples"]
+
+    # Each stage can take a while to run on the larger datasets, so only run
+    # each benchmark a few times
+    number = 1
+    repeat = 3
+    warmup_time = 0
+    timeout = 3600
+
+    def setup(self, num_features, num_samples):
+        self.ranks, self.metadata, self.table = make_dataset(
+            num_features, num_samples
+        )
+        # Same as in generate.gen_visualization()
+        alt.data_transformers.enable("default", max_rows=None)
+
+
+class ProcessInput(StageBenchmark):
+    def time_process_input(self, num_features, num_samples):
+        process_input(self.ranks, self.metadata, self.table)
+
+    def peakmem_process_input(self, num_features, num_samples):
+        process_input(self.ranks, self.metadata, self.table)
+
+
+class ProcessedStageBenchmark(StageBenchmark):
+    """Base class for the benchmarks of stages after process_input()."""
+
+    def setup(self, num_features, num_samples):
+        super().setup(num_features, num_samples)
+        (
+            self.U,
+            self.V,
+            self.ranking_ids,
+            self.feature_metadata_cols,
+            self.processed_table,
+        ) = process_input(self.ranks, self.metadata, self.table)
+
+    def gen_rank_plot(self):
+        return gen_rank_plot(
+            self.V,
+            "Differential",
+            self.ranking_ids,
+            self.feature_metadata_cols,
+            self.processed_table,
+        )
+
+    def sparse_count_dict(self):
+        return sparse_count_dict(
+            self.processed_table.matrix_data,
+            get_feature_ids(self.processed_table),
+            get_sample_ids(self.processed_table),
+        )
+
+
+class GenRankPlot(ProcessedStageBenchmark):
+    def time_gen_rank_plot(self, num_features, num_samples):
+        self.gen_rank_plot()
+
+    def peakmem_gen_rank_plot(self, num_features, num_samples):
+        self.gen_rank_plot()
+
+
+class GenSamplePlot(ProcessedStageBenchmark):
+    def time_gen_sample_plot(self, num_features, num_samples):
+        gen_sample_plot(self.U)
+
+    def peakmem_gen_sample_plot(self, num_features, num_samples):
+        gen_sample_plot(self.U)
+
+
+class SparsifyCounts(ProcessedStageBenchmark):
+    def time_sparse_count_dict(self, num_features, num_samples):
+        self.sparse_count_dict()
+
+    def peakmem_sparse_count_dict(self, num_features, num_samples):
+        self.sparse_count_dict()
+
+
+class DumpRelativeCountJSON(ProcessedStageBenchmark):
+    """Serializes a count JSON of relative abundances, rather than counts.
+
+    Lots of relative abundances in larger tables are small enough (< 1e-4)
+    that orjson formats them differently than the json module does, so this
+    checks how much using orjson actually helps with these.
+    """
+
+    def setup(self, num_features, num_samples):
+        super().setup(num_features, num_samples)
+        relative_table = self.processed_table.norm(
+            axis="sample", inplace=False
+        )
+        self.count_json = sparse_count_dict(
+            relative_table.matrix_data,
+            get_feature_ids(relative_table),
+            get_sample_ids(relative_table),
+        )
+
+    def time_dumps_json(self, num_features, num_samples):
+        dumps_json(self.count_json)
+
+
+class ReplaceJSONs(ProcessedStageBenchmark):
+    def setup(self, num_features, num_samples):
+        super().setup(num_features, num_samples)
+        self.rank_plot_json = self.gen_rank_plot()
+        self.sample_plot_json = gen_sample_plot(self.U)
+        self.count_json = self.sparse_count_dict()
+        # Write to a separate output file, so that the input main.js always
+        # just contains empty placeholder JSONs
+        self.output_dir = tempfile.mkdtemp()
+        self.output_loc = os.path.join(self.output_dir, "main.js")
+
+    def teardown(self, num_features, num_samples):
+        shutil.rmtree(self.output_dir)
+
+    def replace_js_json_definitions(self):
+        replace_js_json_definitions(
+            MAIN_JS_LOC,
+            self.rank_plot_json,
+            self.sample_plot_json,
+            self.count_json,
+            output_file_loc=self.output_loc,
+        )
+
+    def time_replace_js_json_definitions(self, num_features, num_samples):
+        self.replace_js_json_definitions()
+
+    def peakmem_replace_js_json_definitions(self, num_features, num_samples):
+        self.replace_js_json_definitions()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2018--, Qurro development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#
+# Generates synthetic datasets for Qurro's benchmarks.
+# ----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from biom import Table
+
+# The numbers of features and samples to run benchmarks on. Every combination
+# of these is benchmarked.
+FEATURE_COUNTS = [1000, 10000, 100000]
+SAMPLE_COUNTS = [100, 1000, 10000]
+
+# The fraction of entries in a synthetic table that are nonzero. Real
+# amplicon sequencing tables are usually very sparse, so this is pretty low.
+TABLE_DENSITY = 0.01
+
+
+def get_ids(prefix, count):
+    """Returns a list of IDs like ["F0", "F1", ...]."""
+    return ["{}{}".format(prefix, i) for i in range(count)]
+
+
+def make_table(num_features, num_samples, density=TABLE_DENSITY, seed=0):
+    """Returns a random biom.Table of integer counts.
+
+    Every sample and feature in the table is guaranteed to contain at least
+    one nonzero count, so that Qurro won't filter anything out of the table.
+    """
+    rng = np.random.default_rng(seed)
+    matrix = scipy.sparse.random(
+        num_features,
+        num_samples,
+        density=density,
+        format="coo",
+        random_state=rng,
+        data_rvs=lambda n: rng.integers(1, 100, size=n),
+    )
+    # Give every feature and sample at least one count by adding a count of 1
+    # on the (wrapped-around) "diagonal" of the table. This might overlap
+    # with a few of the random counts, which is fine.
+    diag_len = max(num_features, num_samples)
+    diagonal = scipy.sparse.coo_matrix(
+        (
+            np.ones(diag_len),
+            (
+                np.arange(diag_len) % num_features,
+                np.arange(diag_len) % num_samples,
+            ),
+        ),
+        shape=(num_features, num_samples),
+    )
+    return Table(
+        (matrix + diagonal).tocsr(),
+        get_ids("F", num_features),
+        get_ids("S", num_samples),
+    )
+
+
+def make_differentials(num_features, seed=0):
+    """Returns a DataFrame of random differentials for some features."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Intercept": rng.normal(size=num_features),
+            "Group[T.B]": rng.normal(size=num_features),
+            "Age": rng.normal(scale=0.1, size=num_features),
+        },
+        index=get_ids("F", num_features),
+    )
+
+
+def make_sample_metadata(num_samples, seed=0):
+    """Returns a DataFrame of random sample metadata.
+
+    This includes a categorical field, a numeric field, and a field with some
+    missing values.
+    """
+    rng = np.random.default_rng(seed)
+    metadata = pd.DataFrame(
+        {
+            "Group": rng.choice(["A", "B"], size=num_samples),
+            "Age": rng.integers(18, 90, size=num_samples).astype(float),
+            "Site": rng.choice(["gut", "skin", "oral"], size=num_samples),
+        },
+        index=get_ids("S", num_samples),
+    )
+    metadata.loc[metadata.index[::10], "Site"] = np.nan
+    return metadata
+
+
+def make_dataset(num_features, num_samples, seed=0):
+    """Returns (differentials, sample metadata, BIOM table) for a synthetic
+    dataset with the given numbers of features and samples.
+    """
+    return (
+        make_differentials(num_features, seed),
+        make_sample_metadata(num_samples, seed),
+        make_table(num_features, num_samples, seed=seed),
+    )
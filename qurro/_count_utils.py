@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2018--, Qurro development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#
+# Utilities for serializing the feature count data shown in a Qurro
+# visualization.
+# ----------------------------------------------------------------------------
+
+import os
+import logging
+import numpy as np
+import scipy.sparse
+
+# Name of the "sidecar" file containing the binary count data, relative to the
+# output directory of a Qurro visualization.
+BINARY_COUNTS_FILENAME = "counts.bin"
+
+# Largest value representable in the uint32 arrays we use for the row pointers
+# and column indices (and, if possible, the counts themselves).
+UINT32_MAX = np.iinfo(np.uint32).max
+
+
+def to_csr(matrix):
+    """Returns a canonical CSR version of a sparse matrix.
+
+    "Canonical" here means that explicitly stored zeros have been removed and
+    that the column indices within every row are sorted. The JS code relies
+    on the latter property to look up counts using binary search.
+
+    The input matrix is not modified.
+    """
+    csr = scipy.sparse.csr_matrix(matrix, copy=True)
+    csr.sum_duplicates()
+    csr.eliminate_zeros()
+    csr.sort_indices()
+    return csr
+
+
+def get_count_value_type(data):
+    """Returns the narrowest typed array type that can store a count array.
+
+    If every count is an integer in the range [0, 2^32 - 1], the counts can
+    be stored as unsigned 32-bit integers (halving the size of the output
+    compared to using 64-bit floats). Otherwise, we use 64-bit floats.
+
+    Returns either "uint32" or "float64".
+    """
+    if (
+        len(data) > 0
+        and data.min() >= 0
+        and data.max() <= UINT32_MAX
+        and np.all(np.mod(data, 1) == 0)
+    ):
+        return "uint32"
+    return "float64"
+
+
+def sparse_count_dict(matrix, feature_ids, sample_ids):
+    """Returns a "sparse" dict representation of a sparse count matrix.
+
+    The output is of the format {feature ID: {sample ID: count, sample 2 ID:
+    count, ...}, ...}, where only nonzero counts are included. This doesn't
+    require converting the entire table to a dense dict first -- we just
+    walk through the nonzero entries of the matrix, so the time and memory
+    taken here scale with the number of nonzero entries in the table rather
+    than with (# features) * (# samples).
+
+    Parameters
+    ----------
+
+    matrix: scipy.sparse matrix
+        Feature counts, with shape (# features, # samples).
+
+    feature_ids: list-like
+        Feature IDs, in the same order as the rows of matrix.
+
+    sample_ids: list-like
+        Sample IDs, in the same order as the columns of matrix.
+
+    Returns
+    -------
+
+    dict
+        As described above. Every feature is included as a key in this dict,
+        even if it doesn't have any nonzero counts.
+    """
+    logging.debug("Creating sparse count dict.")
+    csr = to_csr(matrix)
+    # Converting these to lists up front means that the dict contains normal
+    # python ints/floats/strs, rather than numpy scalars (which the json
+    # module can't serialize)
+    sample_ids = list(sample_ids)
+    indptr = csr.indptr.tolist()
+    indices = csr.indices.tolist()
+    data = csr.data.tolist()
+    count_dict = {}
+    for fi, feature_id in enumerate(feature_ids):
+        start = indptr[fi]
+        end = indptr[fi + 1]
+        count_dict[feature_id] = {
+            sample_ids[si]: ct
+            for si, ct in zip(indices[start:end], data[start:end])
+        }
+    logging.debug("Done creating sparse count dict.")
+    return count_dict
+
+
+def write_binary_counts(matrix, feature_ids, sample_ids, output_dir):
+    """Writes feature counts to a binary CSR file in the output directory.
+
+    The counts are stored in compressed sparse row (CSR) format, where rows
+    correspond to features and columns correspond to samples. The output
+    file consists of three little-endian arrays, laid out one after another:
+
+    1. data: the nonzero counts (either float64 or uint32; see
+       get_count_value_type())
+    2. indptr: row pointers into data and indices (uint32, with length equal
+       to the number of features plus one)
+    3. indices: the sample position of each nonzero count (uint32)
+
+    The data array is written first so that it starts at a byte offset
+    that is a multiple of 8, which lets the JS code create typed array
+    views of these arrays directly from the fetched buffer (without copying
+    anything).
+
+    Parameters
+    ----------
+
+    matrix: scipy.sparse matrix
+        Feature counts, with shape (# features, # samples).
+
+    feature_ids: list-like
+        Feature IDs, in the same order as the rows of matrix.
+
+    sample_ids: list-like
+        Sample IDs, in the same order as the columns of matrix.
+
+    output_dir: str
+        The directory to write the binary file to.
+
+    Returns
+    -------
+
+    descriptor: dict
+        A description of the binary file that the JS code can use to load
+        it. This includes the feature and sample IDs, since the binary file
+        only refers to features and samples by their positions. This is
+        meant to be written to main.js in place of the usual count JSON.
+
+    Raises
+    ------
+
+    ValueError: if the shape of the matrix doesn't match up with the numbers
+                of feature and sample IDs, or if the table is too large to be
+                indexed using uint32s.
+    """
+    if matrix.shape != (len(feature_ids), len(sample_ids)):
+        raise ValueError(
+            "Count matrix shape {} doesn't match the numbers of feature and "
+            "sample IDs ({} and {}).".format(
+                matrix.shape, len(feature_ids), len(sample_ids)
+            )
+        )
+    logging.debug("Converting count data to binary CSR format.")
+    csr = to_csr(matrix)
+    if csr.nnz > UINT32_MAX or csr.shape[1] > UINT32_MAX:
+        raise ValueError(
+            "The table is too large to be stored in the binary count format."
+        )
+
+    value_type = get_count_value_type(csr.data)
+    arrays = (
+        ("data", csr.data.astype("<u4" if value_type == "uint32" else "<f8")),
+        ("indptr", csr.indptr.astype("<u4")),
+        ("indices", csr.indices.astype("<u4")),
+    )
+
+    descriptor = {
+        "qurro_count_format": "csr",
+        "file": BINARY_COUNTS_FILENAME,
+        "featureIDs": [str(f) for f in feature_ids],
+        "sampleIDs": [str(s) for s in sample_ids],
+        "nnz": int(csr.nnz),
+        "valueType": value_type,
+    }
+    offset = 0
+    with open(os.path.join(output_dir, BINARY_COUNTS_FILENAME), "wb") as bf:
+        for name, arr in arrays:
+            descriptor[name + "Offset"] = offset
+            bf.write(arr.tobytes())
+            offset += arr.nbytes
+    logging.debug("Wrote binary count data ({} bytes).".format(offset))
+    return descriptor
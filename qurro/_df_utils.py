@@ -9,6 +9,8 @@
 
 import logging
 import numpy as np
+from biom import Table
+from qurro._table_utils import get_value_range
 
 
 def ensure_df_headers_unique(df, df_name):
@@ -59,6 +61,22 @@ def validate_df(df, name, min_row_ct, min_col_ct):
         )
 
 
+# Maps each character that fix_id() escapes to its replacement (or to None,
+# for characters that are just removed). This is used with str.translate().
+ID_ESCAPE_TABLE = str.maketrans(
+    {
+        ".": "_",
+        ":": ";",
+        "]": ")",
+        "[": "(",
+        # Don't bother replacing quotes
+        "'": None,
+        '"': None,
+        "\\": "|",
+    }
+)
+
+
 def fix_id(fid):
     """As a temporary measure, escapes certain special characters in a name.
 
@@ -67,33 +85,16 @@ def fix_id(fid):
 
     See https://github.com/vega/vega-lite/issues/4965.
     """
-
-    new_id = ""
-    for c in fid:
-        if c == ".":
-            new_id += "_"
-        elif c == ":":
-            new_id += ";"
-        elif c == "]":
-            new_id += ")"
-        elif c == "[":
-            new_id += "("
-        elif c == "'" or c == '"':
-            # Don't bother replacing quotes
-            pass
-        elif c == "\\":
-            new_id += "|"
-        else:
-            new_id += c
-    return new_id
+    return fid.translate(ID_ESCAPE_TABLE)
 
 
 def escape_columns(df, df_name):
-    """Calls str() then fix_id() on each of the column names of the DF."""
-    new_cols = []
-    for col in df.columns:
-        new_cols.append(fix_id(str(col)))
-    df.columns = new_cols
+    """Calls str() then fix_id() on each of the column names of the DF.
+
+    This is done all at once (using pandas' vectorized string methods), so
+    it's fast even for DFs with lots of columns.
+    """
+    df.columns = df.columns.astype(str).str.translate(ID_ESCAPE_TABLE)
     # Ensure that this didn't make the column names non-unique
     ensure_df_headers_unique(df, df_name)
     return df
@@ -122,277 +123,6 @@ def replace_nan(df, new_nan_val=None):
     return df.replace({np.nan: new_nan_val})
 
 
-def biom_table_to_sparse_df(table, min_row_ct=2, min_col_ct=1):
-    """Loads a BIOM table as a (sparse) pd.DataFrame. Also calls validate_df().
-
-    In the past, we did this in a roundabout way to avoid a weird biom-format
-    issue (https://github.com/biocore/biom-format/issues/808), but now our min
-    biom-format version should mean that we never run into this problem.
-    """
-    logging.debug("Creating a DataFrame from BIOM table.")
-
-    table_sdf = table.to_dataframe(dense=False)
-
-    # Validate the DataFrame -- should be ok since we loaded the table through
-    # biom, but might as well check
-    validate_df(table_sdf, "BIOM table", min_row_ct, min_col_ct)
-
-    logging.debug("Converted BIOM table to DataFrame.")
-    return table_sdf
-
-
-def remove_empty_samples_and_features(
-    table_sdf, sample_metadata_df, feature_ranks_df
-):
-    """Removes empty samples and features from the table, sample metadata, and
-    feature ranks DataFrames.
-
-    This should be called *after* matching the table with the sample
-    metadata and feature ranks -- we assume that the columns of the
-    table DataFrame are equivalent to the indices of the sample metadata
-    DataFrame, and that the indices (rows) of the table are also equivalent
-    to the indices of the feature ranks DataFrame.
-
-    This will raise a ValueError if the input table is empty (i.e. all
-    samples/features would be removed).
-    """
-    logging.debug("Attempting to remove empty samples and features.")
-
-    # Filter out empty samples (columns) and features (rows) from the table
-    # This approach based on https://stackoverflow.com/a/21165116/10730311.
-    neq_0 = table_sdf != 0
-    filtered_table = table_sdf.loc[
-        neq_0.any(axis="columns"), neq_0.any(axis="index")
-    ]
-
-    # If the table only contains zeros, then attempting to drop all empty
-    # samples and/or features results in a 0x0 DataFrame. We raise a ValueError
-    # in this case.
-    if filtered_table.empty:
-        raise ValueError("The table is empty.")
-
-    # Let user know about which samples/features may have been dropped, if any.
-    # And, if we filtered out any samples or features, filter the sample
-    # metadata and feature ranks (respectively) to match (this is just done by
-    # aligning them to the filtered table).
-    filtered_metadata = sample_metadata_df
-    filtered_ranks = feature_ranks_df
-
-    sample_diff = len(table_sdf.columns) - len(filtered_table.columns)
-    if sample_diff > 0:
-        # As with match_table_and_data, we have to transpose the sample
-        # metadata in order to align it with the table (since samples are
-        # stored as columns in the table but as indices in the sample metadata)
-        sm_t = sample_metadata_df.T
-        filtered_metadata = filtered_table.align(
-            sm_t, join="inner", axis="columns"
-        )[1].T
-        print("Removed {} empty sample(s).".format(sample_diff))
-    else:
-        logging.debug("Couldn't find any empty samples.")
-
-    feature_diff = len(table_sdf.index) - len(filtered_table.index)
-    if feature_diff > 0:
-        filtered_ranks = filtered_table.align(
-            feature_ranks_df, join="inner", axis="index"
-        )[1]
-        print("Removed {} empty feature(s).".format(feature_diff))
-    else:
-        logging.debug("Couldn't find any empty features.")
-
-    return filtered_table, filtered_metadata, filtered_ranks
-
-
-def print_if_dropped(
-    df_old, df_new, axis_num, item_name, df_name, filter_basis_name
-):
-    """Prints a message if a given DataFrame has been filtered.
-
-    Essentially, this function just checks if
-    df_old.shape[axis_num] - df_new.shape[axis_num] > 0.
-
-    If so, this prints a message with a bunch of details (which the _name
-    parameters all describe).
-
-    Parameters
-    ----------
-    df_old: pd.DataFrame
-         "Unfiltered" DataFrame -- used as the reference when trying to
-         determine if df_new has been filtered.
-
-    df_new: pd.DataFrame
-         A potentially-filtered DataFrame.
-
-    axis_num: int
-         The axis in the DataFrames' .shapes to check. This should be either
-         0 or 1, but we don't explicitly check for that.
-
-    item_name: str
-         The name of the "thing" described by the given axis in these
-         DataFrames. In practice, this is either "sample" or "feature".
-
-    df_name: str
-         The name of the DataFrame represented by df_old and df_new.
-
-    filter_basis_name: str
-         The name of the other DataFrame which caused these items to be
-         dropped. For example, if we're checking to see if samples were
-         dropped from the sample metadata file due to to samples not being
-         in the BIOM table, df_name could be "sample metadata file" and
-         filter_basis_name could be "BIOM table".
-    """
-
-    dropped_item_ct = df_old.shape[axis_num] - df_new.shape[axis_num]
-    if dropped_item_ct > 0:
-        print(
-            "{} {}(s) in the {} were not present in the {}.".format(
-                dropped_item_ct, item_name, df_name, filter_basis_name
-            )
-        )
-        print(
-            "These {}(s) have been removed from the "
-            "visualization.".format(item_name)
-        )
-
-
-def match_table_and_data(table, feature_ranks, sample_metadata):
-    """Matches feature rankings and then sample metadata to a table.
-
-    TODO: Some of the logic in this function for matching the feature ranks
-    and sample metadata could probably be abstracted out to another
-    function. This individual function isn't directly unit-tested, but its
-    behavior should be mostly tested in the "matching" integration tests
-    (...that being said, it'd be a lot easier + sustainable to also add
-    direct unit tests for this function).
-
-    Parameters
-    ----------
-
-    table: pd.DataFrame
-         A DataFrame created from a BIOM table. The index of this DataFrame
-         should correspond to observations (i.e. features), and the columns
-         should correspond to samples.
-
-         Note that the input BIOM table might contain features or samples
-         that are not included in feature_ranks or sample_metadata,
-         respectively -- this is totally fine. The opposite, though, is
-         where things get to be a problem: if any of the features in
-         feature_ranks are not present in the table, or if all of the
-         samples in sample_metadata are not in the table, then this will
-         raise errors.
-
-    feature_ranks: pd.DataFrame
-         A DataFrame describing features' "ranks" along ranking(s). The
-         index of this DataFrame should correspond to feature IDs, and the
-         columns should correspond to different rankings' names.
-
-    sample_metadata: pd.DataFrame
-         A DataFrame describing sample metadata. The index of this DataFrame
-         should describe sample IDs, and the columns should correspond to
-         different sample metadata fields' names.
-
-    Returns
-    -------
-
-    (m_table, m_sample_metadata): both pd.[Sparse]DataFrame
-         Versions of the input table and sample metadata only containing
-         samples shared by both datasets. The table will also only contain
-         features shared by both the table and the feature ranks.
-
-         (None of the features in the feature ranks should be dropped during
-         this operation, so we don't bother returning the feature ranks
-         DataFrame.)
-
-    Raises
-    ------
-
-    If any of the features described in feature_ranks are not present in
-    the table, this will raise a ValueError.
-
-    If all of the samples described in sample_metadata are not present
-    in the table, this will raise a ValueError.
-    """
-    logging.debug("Starting matching table with feature ranks.")
-    featurefiltered_table, m_feature_ranks = table.align(
-        feature_ranks, axis="index", join="inner"
-    )
-    logging.debug("Matching table with feature ranks done.")
-    # Ensure that every ranked feature was present in the BIOM table. Raise an
-    # error if this isn't the case.
-    if m_feature_ranks.shape[0] < feature_ranks.shape[0]:
-        unsupported_feature_ct = (
-            feature_ranks.shape[0] - m_feature_ranks.shape[0]
-        )
-        # making this error message as pretty as possible
-        word = "were"
-        if unsupported_feature_ct == 1:
-            word = "was"
-        raise ValueError(
-            "Of the {} ranked features, {} {} not present in "
-            "the input BIOM table.".format(
-                feature_ranks.shape[0], unsupported_feature_ct, word
-            )
-        )
-    print_if_dropped(
-        table,
-        featurefiltered_table,
-        0,
-        "feature",
-        "BIOM table",
-        "feature rankings",
-    )
-
-    # We transpose the sample metadata instead of the actual table because
-    # transposing in pandas, at least from some personal testing, can be really
-    # expensive for huge (EMP-scale) DataFrames. Since sample metadata will
-    # generally be smaller than the actual table, we transpose that.
-    #
-    # (The reason we have debug log messages around these statements is because
-    # of how expensive transposing can be -- this is a rudimentary way to check
-    # for bottlenecks when really large datasets are passed into Qurro.)
-    logging.debug(
-        "Temporarily transposing sample metadata to make matching easier."
-    )
-    sample_metadata_transposed = sample_metadata.T
-    logging.debug("Transposing done.")
-    logging.debug("Starting matching table with (tranposed) sample metadata.")
-    m_table, m_sample_metadata_transposed = featurefiltered_table.align(
-        sample_metadata_transposed, axis="columns", join="inner"
-    )
-    logging.debug("Matching table with sample metadata done.")
-    logging.debug("Transposing sample metadata again to reset it.")
-    m_sample_metadata = m_sample_metadata_transposed.T
-    logging.debug("Transposing done.")
-    # Allow for dropped samples (e.g. negative controls), but ensure that at
-    # least one sample is supported by the BIOM table.
-    #
-    # We only need to check m_sample_metadata.shape[0] here since it should be
-    # equal to m_table.shape[1] at this point (due to our use of .align()).
-    if m_sample_metadata.shape[0] < 1:
-        raise ValueError(
-            "No samples are shared between the sample metadata file and BIOM "
-            "table."
-        )
-    print_if_dropped(
-        sample_metadata,
-        m_sample_metadata,
-        0,
-        "sample",
-        "sample metadata file",
-        "BIOM table",
-    )
-    print_if_dropped(
-        featurefiltered_table,
-        m_table,
-        1,
-        "sample",
-        "BIOM table",
-        "sample metadata file",
-    )
-
-    return m_table, m_sample_metadata
-
-
 def merge_feature_metadata(feature_ranks, feature_metadata=None):
     """Attempts to merge feature metadata into a feature ranks DataFrame.
 
@@ -443,97 +173,6 @@ def merge_feature_metadata(feature_ranks, feature_metadata=None):
     return output_feature_data, feature_metadata_cols
 
 
-def sparsify_count_dict(count_dict):
-    """Returns a "sparse" representation of a dict of counts data.
-
-    We expect that the input dict is of the format {feature ID: {sample ID:
-    count, sample 2 ID: count, ...}, ...}. In theory you could also totally
-    pass in a transposed dict here (where samples are the "outer layer" of
-    the dict), but the variable names would need to be flipped to make this
-    function make sense. (See #175 on GitHub for context.)
-
-    Anyway, this function returns the input dict, but without references to
-    0-count samples for a given feature. (Since we filter out empty
-    features, we expect that every feature should have at least one sample
-    with a nonzero count of that feature.)
-    """
-    logging.debug("Sparsifying count data.")
-    sparse_count_dict = {}
-    for feature_id, sample_counts in count_dict.items():
-        # This will be the new sample_counts dict for this feature ID, but only
-        # containing sample IDs with nonzero counts.
-        fdict = {}
-        for sample_id, count in sample_counts.items():
-            if count != 0:
-                fdict[sample_id] = count
-        sparse_count_dict[feature_id] = fdict
-    logging.debug("Done sparsifying count data.")
-    return sparse_count_dict
-
-
-def add_sample_presence_count(feature_data, table_sdf):
-    """Adds a "qurro_spc" column to a DataFrame of feature information.
-
-    The value in this column corresponds to the number of samples a given
-    feature is present in, as determined by the count data given in the
-    table_sdf argument.
-
-    Parameters
-    ----------
-
-    feature_data: pd.DataFrame
-         A DataFrame containing some sort of feature information. At the
-         point in Qurro this is called, this will likely include both
-         feature ranking information and feature metadata information.
-
-    table_sdf: pd.DataFrame
-         Representation of a BIOM table containing count data. The index
-         contains feature IDs, and the columns contain sample IDs.
-         This table should only contain samples that will be used in the
-         Qurro visualization (i.e. this table should be the output of all
-         the matching, filtering, removing empty, etc. steps), since the
-         presence of irrelevant samples will result in inaccurate SPC values
-         being computed.
-
-    Returns
-    -------
-
-    output_feature_data: pd.DataFrame
-         feature_data, with a qurro_spc column added.
-
-    Raises
-    ------
-
-    ValueError: if feature_data already contains a column named "qurro_spc".
-                (Assuming you've already called check_column_names() on this
-                data this shouldn't be a problem, but this checks anyway.)
-    """
-    # Convert the table into a presence-absence representation (every count
-    # value > 0 is replaced with 1).
-    #
-    # When I was looking around for ways to do this, I googled "pandas
-    # dataframe presence absence" and one of the first hits was the docs for
-    # DF.where() (which led me to DF.mask). Nowhere on either of these pages
-    # is "presence" or "absence" mentioned. But, uh, thanks Google for reading
-    # my mind?
-    table_pa = table_sdf.mask(table_sdf > 0, 1)
-    # Sum each row of the presence-absence table, producing a series with
-    # qurro_spc values
-    spc_series = table_pa.sum(axis="columns")
-    spc_series.name = "qurro_spc"
-
-    # Return merged copy of the feature data with the series named "qurro_spc"
-    # Note the use of suffixes=(False, False) -- this will throw a ValueError
-    # if feature_data already contains a column called "qurro_spc".
-    return feature_data.merge(
-        spc_series,
-        how="left",
-        left_index=True,
-        right_index=True,
-        suffixes=(False, False),
-    )
-
-
 def check_column_names(sample_metadata, feature_ranks, feature_metadata=None):
     """Checks that column names in input data will work properly in Qurro.
 
@@ -561,10 +200,17 @@ def check_column_names(sample_metadata, feature_ranks, feature_metadata=None):
             "{}".format(sugg)
         )
 
-    if "qurro_balance" in sm_cols or "qurro_jitter" in sm_cols:
+    reserved_sm_cols = (
+        "qurro_balance",
+        "qurro_jitter",
+        "qurro_x_value",
+        "qurro_color_value",
+    )
+    if any(c in sm_cols for c in reserved_sm_cols):
         raise ValueError(
             "Sample metadata can't contain any columns called "
-            '"qurro_balance" or "qurro_jitter".{}'.format(sugg)
+            '"qurro_balance", "qurro_jitter", "qurro_x_value", or '
+            '"qurro_color_value".{}'.format(sugg)
         )
 
     if "qurro_classification" in fr_cols or "qurro_classification" in fm_cols:
@@ -585,6 +231,12 @@ def check_column_names(sample_metadata, feature_ranks, feature_metadata=None):
             '"qurro_spc".{}'.format(sugg)
         )
 
+    if "qurro_rank_value" in fr_cols or "qurro_rank_value" in fm_cols:
+        raise ValueError(
+            "Feature rankings/metadata can't contain any columns called "
+            '"qurro_rank_value".{}'.format(sugg)
+        )
+
     if len(set(fr_cols) & set(fm_cols)) > 0:
         raise ValueError(
             "Column names for the feature metadata and feature ranks must be "
@@ -619,9 +271,10 @@ def vibe_check(
          to feature IDs and the columns correspond to ranking names.
          Critically, every entry in this should be numeric.
 
-    table_sdf: pd.DataFrame
-         DataFrame representation of a feature table. Similarly to the
-         feature rankings, every entry in this should be numeric.
+    table_sdf: pd.DataFrame or biom.Table
+         DataFrame (or biom.Table) representation of a feature table.
+         Similarly to the feature rankings, every entry in this should be
+         numeric.
 
     safe_range: collection with exactly two entries
          The first entry in the safe_range specifies the minimum value we
@@ -673,7 +326,16 @@ def vibe_check(
         (table_sdf, "feature table"),
         (feature_ranks, "feature rankings data"),
     ):
-        if (df > safe_range[1]).any().any():
+        if isinstance(df, Table):
+            # Avoid creating a dense boolean version of the table -- we can
+            # just check the extreme values in the table's sparse matrix
+            min_val, max_val = get_value_range(df)
+            too_large = max_val > safe_range[1]
+            too_small = min_val < safe_range[0]
+        else:
+            too_large = (df > safe_range[1]).any().any()
+            too_small = (df < safe_range[0]).any().any()
+        if too_large:
             raise OverflowError(upper_error.replace("THING", df_name))
-        if (df < safe_range[0]).any().any():
+        if too_small:
             raise OverflowError(lower_error.replace("THING", df_name))
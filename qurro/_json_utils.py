@@ -9,7 +9,197 @@
 
 import json
 import copy
+import math
 import os
+import re
+import shutil
+import tempfile
+
+# orjson is an optional dependency (install Qurro with the "fast" extra to get
+# it). If it's available, we use it to serialize and parse JSONs, since it's a
+# lot faster than the json module; otherwise we just use the json module.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Containers (dicts/lists) with at least this many items are considered
+# "large" by iter_json_chunks(). This is also roughly the number of items
+# that iter_json_chunks() will combine into a single chunk.
+JSON_CHUNK_SIZE = 1000
+
+# How deep into nested dicts/lists iter_json_chunks() will go looking for
+# large containers. See iter_json_chunks() for details.
+JSON_CHUNK_DEPTH = 3
+
+# The name of the JSON backend used by dumps_json() and loads_json(): either
+# "orjson" (if it's installed) or "json".
+JSON_BACKEND = "json" if orjson is None else "orjson"
+
+# Equivalent to json.dumps(..., sort_keys=True, separators=(",", ":"),
+# ensure_ascii=False, allow_nan=False). Reusing a single encoder avoids
+# creating a new JSONEncoder every time we serialize a chunk.
+_SORTED_JSON_ENCODER = json.JSONEncoder(
+    sort_keys=True, separators=(",", ":"), ensure_ascii=False, allow_nan=False
+)
+
+# Same as _SORTED_JSON_ENCODER, but escapes all non-ASCII characters. This is
+# used for objects containing lone surrogates (which orjson refuses to
+# serialize), since these can't be written to a UTF-8 file as is.
+_SORTED_ASCII_JSON_ENCODER = json.JSONEncoder(
+    sort_keys=True, separators=(",", ":"), ensure_ascii=True, allow_nan=False
+)
+
+# Matches lone surrogates (a valid string only contains surrogates as part of
+# "surrogate pairs", and python combines these into a single character)
+_SURROGATE = re.compile("[\ud800-\udfff]")
+
+# orjson formats some numbers differently than the json module (which uses
+# repr()): it writes exponents like "1e16" and "1e-7" where repr() writes
+# "1e+16" and "1e-07", and it writes numbers in [1e-5, 1e-4) like "0.00001"
+# where repr() writes "1e-05". (The digits of each number are the same, since
+# both write the shortest representation that round-trips.) These patterns
+# match the parts of orjson's output that could belong to these numbers.
+_ORJSON_EXPONENT = re.compile(rb"e[-0-9]")
+_ORJSON_SMALL_NUMBER = re.compile(rb"0\.0000")
+
+# These patterns match the parts of these numbers that need to be changed, in
+# orjson's output for a dict or list. (Since the output is compact, numbers in
+# a dict or list always start right after a [, :, or , and end right before a
+# , ], or }.) Each pattern starts with a literal, and checks what comes before
+# that literal using a lookbehind; this lets re search for it a lot faster.
+_ORJSON_POSITIVE_EXPONENT = re.compile(rb"e(?<=[0-9]e)(?=[0-9]+[,\]}])")
+_ORJSON_SHORT_NEGATIVE_EXPONENT = re.compile(rb"e-(?<=[0-9]e-)(?=[0-9][,\]}])")
+_ORJSON_SMALL_NUMBER_DIGITS = re.compile(
+    rb"0\.0000(?<=[-:,\[]0\.0000)([1-9])([0-9]*)(?=[,\]}])"
+)
+
+
+def _small_number_to_exponent(match):
+    """Converts a match of _ORJSON_SMALL_NUMBER_DIGITS (e.g. the 0.000032 in
+    "0.000032") to how repr() would write it (e.g. "3.2e-05").
+    """
+    if match[2]:
+        return match[1] + b"." + match[2] + b"e-05"
+    return match[1] + b"e-05"
+
+
+def _fix_orjson_numbers(output):
+    """Changes the numbers in orjson's output for a dict or list that orjson
+    formatted differently than the json module would have.
+
+    This only changes the numbers' text -- there's no need to parse and then
+    repr() each number again, which is about as slow as just using the json
+    module in the first place.
+
+    Returns None if the output contains a string that looks like one of
+    these numbers (e.g. "a,1e5,"), or if it contains any backslashes (in
+    which case telling apart the parts of the output that are in strings
+    is more trouble than it's worth). Otherwise, returns the fixed output.
+    """
+    if (
+        _ORJSON_EXPONENT.search(output) is None
+        and _ORJSON_SMALL_NUMBER.search(output) is None
+    ):
+        return output
+    if b"\\" in output:
+        return None
+    # Without backslashes, every " in the output starts or ends a string, so
+    # every other part of the output between "s is a string
+    strings = b'"'.join(output.split(b'"')[1::2])
+    for pattern in (
+        _ORJSON_POSITIVE_EXPONENT,
+        _ORJSON_SHORT_NEGATIVE_EXPONENT,
+        _ORJSON_SMALL_NUMBER_DIGITS,
+    ):
+        if pattern.search(strings) is not None:
+            return None
+    output = _ORJSON_POSITIVE_EXPONENT.sub(b"e+", output)
+    output = _ORJSON_SHORT_NEGATIVE_EXPONENT.sub(b"e-0", output)
+    return _ORJSON_SMALL_NUMBER_DIGITS.sub(_small_number_to_exponent, output)
+
+
+def _replace_nonfinite_floats(obj):
+    """Returns a copy of obj with NaN and +/- Infinity floats set to None.
+
+    Only dicts, lists, and tuples are recursed into.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    elif isinstance(obj, dict):
+        return {k: _replace_nonfinite_floats(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_replace_nonfinite_floats(v) for v in obj]
+    return obj
+
+
+def _dumps_json_stdlib(obj):
+    """Serializes an object to a JSON string using the json module.
+
+    See dumps_json() for details.
+    """
+    try:
+        output = _SORTED_JSON_ENCODER.encode(obj)
+    except ValueError:
+        # obj contains NaN and/or Infinity. These aren't valid JSON, so (like
+        # orjson) we represent them as null.
+        obj = _replace_nonfinite_floats(obj)
+        output = _SORTED_JSON_ENCODER.encode(obj)
+    if not output.isascii() and _SURROGATE.search(output) is not None:
+        output = _SORTED_ASCII_JSON_ENCODER.encode(obj)
+    return output
+
+
+def _dumps_json_orjson(obj):
+    """Serializes an object to a JSON string using orjson.
+
+    Numbers that orjson formats differently than the json module are fixed
+    up afterwards (see _fix_orjson_numbers()). This falls back to
+    _dumps_json_stdlib() for anything that orjson can't serialize (e.g.
+    dicts with non-string keys, integers that don't fit in 64 bits, or
+    strings containing lone surrogates), for lone floats, and for anything
+    whose numbers can't be fixed up. This way, the output is always exactly
+    the same as _dumps_json_stdlib()'s output.
+    """
+    if isinstance(obj, float):
+        return _dumps_json_stdlib(obj)
+    try:
+        output = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        return _dumps_json_stdlib(obj)
+    output = _fix_orjson_numbers(output)
+    if output is None:
+        return _dumps_json_stdlib(obj)
+    return output.decode("utf-8")
+
+
+def dumps_json(obj):
+    """Serializes an object to a JSON string.
+
+    The output is sorted by key and compact (no whitespace), and non-ASCII
+    characters aren't escaped -- unless obj contains a string with a lone
+    surrogate (which can't be encoded as UTF-8), in which case all non-ASCII
+    characters are escaped. NaN and Infinity are written as null. This
+    uses orjson if it's installed and the json module otherwise; the output
+    is exactly the same either way.
+    """
+    if JSON_BACKEND == "orjson":
+        return _dumps_json_orjson(obj)
+    return _dumps_json_stdlib(obj)
+
+
+def loads_json(json_str):
+    """Parses a JSON string, using orjson if it's installed.
+
+    This also accepts the NaN / Infinity values that older versions of Qurro
+    wrote out to main.js files (these are parsed using the json module).
+    """
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(json_str)
 
 
 def extract_json_from_line(line):
@@ -52,7 +242,7 @@ def get_jsons(main_js_loc, as_dict=True, return_nones=False, json_prefix=""):
        as either dicts or strings.
 
     as_dict: bool
-       If True, this will load the JSONs as dicts by calling json.loads().
+       If True, this will load the JSONs as dicts by calling loads_json().
        If False, this will just return the strings.
 
     return_nones: bool
@@ -88,7 +278,7 @@ def get_jsons(main_js_loc, as_dict=True, return_nones=False, json_prefix=""):
     rp_def = "var {}rankPlotJSON = {{".format(json_prefix)
     sp_def = "var {}samplePlotJSON = {{".format(json_prefix)
     c_def = "var {}countJSON = {{".format(json_prefix)
-    with open(main_js_loc, "r") as mf:
+    with open(main_js_loc, "r", encoding="utf-8") as mf:
         for line in mf:
             sline = line.strip()
 
@@ -118,7 +308,7 @@ def get_jsons(main_js_loc, as_dict=True, return_nones=False, json_prefix=""):
             if s is None:
                 return None
             else:
-                return json.loads(s)
+                return loads_json(s)
 
         return (
             str_to_json(rank_plot_json_str),
@@ -189,6 +379,220 @@ def plot_jsons_equal(json1, json2):
     return json1_c == json2_c
 
 
+def get_json_definition_start(json_type, json_prefix=""):
+    """Returns the start of a JSON declaration line in a JS file.
+
+    For example, get_json_definition_start("rank", "SST") returns
+    "var SSTrankPlotJSON = {".
+
+    json_type must be one of "rank", "sample", or "count". Other values will
+    result in a ValueError being thrown.
+    """
+    if json_type == "rank":
+        definition_start = "var {}rankPlotJSON = {{"
+    elif json_type == "sample":
+        definition_start = "var {}samplePlotJSON = {{"
+    elif json_type == "count":
+        definition_start = "var {}countJSON = {{"
+    else:
+        raise ValueError(
+            "Invalid json_type argument. Must be 'rank', "
+            "'sample', or 'count'."
+        )
+    return definition_start.format(json_prefix)
+
+
+def _is_large_json(obj, max_depth):
+    """Returns True if obj is, or contains, a "large" container.
+
+    A large container is a dict or list with at least JSON_CHUNK_SIZE items.
+    We only look for these up to max_depth levels deep in obj.
+    """
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    else:
+        return False
+    if len(obj) >= JSON_CHUNK_SIZE:
+        return True
+    if max_depth <= 1:
+        return False
+    for c in children:
+        if isinstance(c, (dict, list, tuple)) and _is_large_json(
+            c, max_depth - 1
+        ):
+            return True
+    return False
+
+
+def iter_json_chunks(obj, max_depth=JSON_CHUNK_DEPTH):
+    """Yields a JSON representation of an object in chunks.
+
+    Joining the chunks yielded by this function gives exactly the same string
+    as dumps_json(obj). The difference is that this doesn't build the entire
+    string in memory at once, so it can be used to write huge JSONs (e.g.
+    count JSONs for EMP-scale tables) to a file without using a ton of
+    memory.
+
+    We could just use json.JSONEncoder.iterencode() for this, but that uses
+    the pure-python version of the json encoder, which is a lot slower than
+    the C version (and yields lots of tiny chunks). Instead, we walk through
+    the dicts/lists in obj that are (or contain) large containers ourselves
+    (looking up to max_depth levels deep). Everything else is split into
+    batches of up to JSON_CHUNK_SIZE consecutive items, each of which is
+    serialized with a single call to dumps_json(). (Since dict keys are
+    sorted, serializing a batch of consecutive keys gives the same output
+    as the corresponding part of the entire dict's output.)
+
+    Dicts with non-string keys are just passed to dumps_json() as is, since
+    the json module does some extra work to convert their keys to strings.
+    """
+    if max_depth > 0 and _is_large_json(obj, max_depth):
+        if isinstance(obj, dict):
+            if all(type(k) is str for k in obj):
+                items = ((k, obj[k]) for k in sorted(obj))
+                brackets = ("{", "}")
+            else:
+                items = None
+        else:
+            items = ((None, v) for v in obj)
+            brackets = ("[", "]")
+
+        if items is not None:
+
+            def dump_batch(batch):
+                if brackets[0] == "{":
+                    return dumps_json(dict(batch))[1:-1]
+                return dumps_json([v for k, v in batch])[1:-1]
+
+            yield brackets[0]
+            separator = ""
+            batch = []
+            for key, val in items:
+                if _is_large_json(val, max_depth - 1):
+                    if len(batch) > 0:
+                        yield separator + dump_batch(batch)
+                        separator = ","
+                        batch = []
+                    if key is None:
+                        yield separator
+                    else:
+                        yield separator + dumps_json(key) + ":"
+                    yield from iter_json_chunks(val, max_depth - 1)
+                    separator = ","
+                else:
+                    batch.append((key, val))
+                    if len(batch) >= JSON_CHUNK_SIZE:
+                        yield separator + dump_batch(batch)
+                        separator = ","
+                        batch = []
+            if len(batch) > 0:
+                yield separator + dump_batch(batch)
+            yield brackets[1]
+            return
+    yield dumps_json(obj)
+
+
+def write_js_json_definitions(
+    input_file_loc,
+    rank_plot_json=None,
+    sample_plot_json=None,
+    count_json=None,
+    output_file_loc=None,
+    json_prefix="",
+):
+    """Writes a version of the input JS file with JSON(s) changed.
+
+    Unlike replace_js_json_definitions(), this doesn't bother checking if the
+    new JSONs differ from the JSONs currently in the input file. This makes
+    this function well-suited for filling in a "fresh" template main.js file
+    (e.g. as is done in generate.gen_visualization()), since in that case
+    we know that all of the JSONs in the file are just empty placeholders.
+
+    The output file is written line by line, and JSONs are serialized
+    straight to the output file in chunks (see iter_json_chunks()) -- so we
+    never need to hold the entire output file (or even an entire JSON string)
+    in memory. The output is first written to a temporary file in the same
+    directory as the output file, which is then moved to the output file's
+    location; this way, it's fine for output_file_loc to be the same as
+    input_file_loc (and if writing fails partway through, we won't have
+    overwritten the output file with a partial file).
+
+    Parameters
+    ----------
+    input_file_loc: str
+       The JS file to read from.
+
+    rank_plot_json, sample_plot_json, count_json: dict or None
+       JSONs to write to the corresponding definitions in the file. If any
+       of these is None, the corresponding definition won't be changed.
+
+    output_file_loc: str or None
+       Where to write the output file. If this is None, the input file will
+       be overwritten.
+
+    json_prefix: str
+       Works the same way as in replace_js_json_definitions().
+
+    Returns
+    -------
+    int
+       0 if at least one JSON definition was replaced (in which case the
+       output file was written), and 1 otherwise (in which case nothing was
+       written).
+    """
+    if output_file_loc is None:
+        output_file_loc = input_file_loc
+
+    replacements = []
+    for json_type, new_json in (
+        ("rank", rank_plot_json),
+        ("sample", sample_plot_json),
+        ("count", count_json),
+    ):
+        if new_json is not None:
+            replacements.append(
+                (get_json_definition_start(json_type, json_prefix), new_json)
+            )
+
+    at_least_one_json_changed = False
+    output_dir = os.path.dirname(os.path.abspath(output_file_loc))
+    temp_fd, temp_loc = tempfile.mkstemp(
+        dir=output_dir, prefix=".qurro-", suffix=".js.tmp"
+    )
+    try:
+        # Wrap the temporary file's descriptor before opening the input
+        # file, so that the descriptor is closed even if the input file
+        # can't be opened
+        with open(temp_fd, "w", encoding="utf-8") as temp_file_obj, open(
+            input_file_loc, "r", encoding="utf-8"
+        ) as input_file_obj:
+            for line in input_file_obj:
+                sline = line.lstrip()
+                for definition_start, new_json in replacements:
+                    if sline.startswith(definition_start):
+                        temp_file_obj.write(line[: line.index("{")])
+                        temp_file_obj.writelines(iter_json_chunks(new_json))
+                        temp_file_obj.write(";\n")
+                        at_least_one_json_changed = True
+                        break
+                else:
+                    temp_file_obj.write(line)
+
+        if at_least_one_json_changed:
+            # mkstemp() creates files that only the current user can read, so
+            # match the permissions of the input file before moving the temp
+            # file into place
+            shutil.copymode(input_file_loc, temp_loc)
+            os.replace(temp_loc, output_file_loc)
+            return 0
+        return 1
+    finally:
+        if os.path.exists(temp_loc):
+            os.remove(temp_loc)
+
+
 def try_to_replace_line_json(line, json_type, new_json, json_prefix=""):
     """Attempts to replace a JSON declaration if it's on the line.
 
@@ -230,28 +634,11 @@ def try_to_replace_line_json(line, json_type, new_json, json_prefix=""):
        will be equal to the new line with the JSON replaced.
     """
 
-    prefixToReplace = ""
-    if json_type == "rank":
-        prefixToReplace = "var {}rankPlotJSON = {{"
-    elif json_type == "sample":
-        prefixToReplace = "var {}samplePlotJSON = {{"
-    elif json_type == "count":
-        prefixToReplace = "var {}countJSON = {{"
-    else:
-        raise ValueError(
-            "Invalid json_type argument. Must be 'rank', "
-            "'sample', or 'count'."
-        )
-
-    prefixToReplace = prefixToReplace.format(json_prefix)
+    prefixToReplace = get_json_definition_start(json_type, json_prefix)
 
     if line.lstrip().startswith(prefixToReplace):
         return (
-            (
-                line[: line.index("{")]
-                + json.dumps(new_json, sort_keys=True)
-                + ";\n"
-            ),
+            (line[: line.index("{")] + dumps_json(new_json) + ";\n"),
             True,
         )
     return line, False
@@ -325,41 +712,15 @@ def replace_js_json_definitions(
             )
         )
 
-    output_file_contents = ""
-    at_least_one_json_changed = False
-    with open(input_file_loc, "r") as input_file_obj:
-        # read in basic main.js contents. Replace everything after the {
-        # in a JSON definition with the actual JSON.
-        for line in input_file_obj:
-            output_line = line
-            changed_yet = False
-            if diff_rp:
-                output_line, changed_yet = try_to_replace_line_json(
-                    line, "rank", rank_plot_json, json_prefix
-                )
-            if diff_sp and not changed_yet:
-                output_line, changed_yet = try_to_replace_line_json(
-                    line, "sample", sample_plot_json, json_prefix
-                )
-            if diff_c and not changed_yet:
-                output_line, changed_yet = try_to_replace_line_json(
-                    line, "count", count_json, json_prefix
-                )
-            if changed_yet:
-                at_least_one_json_changed = True
-            output_file_contents += output_line
-
-    if at_least_one_json_changed:
-        if output_file_loc is None:
-            output_file_loc = input_file_loc
-
-        with open(output_file_loc, "w") as output_file_obj:
-            output_file_obj.write(output_file_contents)
-        return 0
-    # Let the caller know that nothing was written to the output file location.
-    # If this was called on a JS test then this perfectly normal, but if this
-    # was called during the execution of Qurro then this is a problem.
-    return 1
+    # Only bother writing the JSONs that are different
+    return write_js_json_definitions(
+        input_file_loc,
+        rank_plot_json if diff_rp else None,
+        sample_plot_json if diff_sp else None,
+        count_json if diff_c else None,
+        output_file_loc=output_file_loc,
+        json_prefix=json_prefix,
+    )
 
 
 def check_json_dataset_names(json_dict, *restricted_names):
@@ -9,7 +9,6 @@
 
 import pandas as pd
 import numpy as np
-from io import StringIO
 from ._df_utils import replace_nan
 
 
@@ -29,10 +28,11 @@ def get_q2_comment_lines(md_file_loc):
       that doesn't start with "#q2:". Currently, "#q2:types" is the only Q2
       "comment directive" available, but ostensibly this could detect future
       Q2 comment directives.
-     -This checks if md_file_loc is of type StringIO. If so, this will
-      handle it properly (iterating over it directly); otherwise, this
-      assumes that md_file_loc is an actual filename, and this will open
-      it using open().
+     -This checks if md_file_loc is a file object (e.g. a StringIO, or a
+      file that's already been opened). If so, this will handle it properly
+      (iterating over it directly, and then seeking back to the start of
+      it); otherwise, this assumes that md_file_loc is an actual filename,
+      and this will open it using open().
       (I realize that ideally this wouldn't have to do any type checking,
       but it's either this or do a bunch of weird refactoring to get my test
       code working.)
@@ -55,52 +55,91 @@ def get_q2_comment_lines(md_file_loc):
             line_num += 1
         return q2_lines
 
-    if type(md_file_loc) is StringIO:
+    if hasattr(md_file_loc, "read"):
         q2_lines = iterate_over_file_obj_lines(md_file_loc)
-        # HACK: Allow us to read through this StringIO again --
+        # HACK: Allow us to read through this file object again --
         # https://stackoverflow.com/a/27261215/10730311
-        # Note that we're only ever bothering with StringIOs here during test
-        # code, so this weirdness should be ignored during normal operation of
-        # Qurro.
         md_file_loc.seek(0)
         return q2_lines
     else:
-        with open(md_file_loc, "r") as md_file_obj:
+        with open(md_file_loc, "r", encoding="utf-8") as md_file_obj:
             return iterate_over_file_obj_lines(md_file_obj)
 
 
+def strip_and_nanify(values):
+    """Strips whitespace from strings, and converts ""s to NaNs.
+
+    values should be a 1-D array-like of strings (and/or NaNs, which are left
+    as is). This returns a new 1-D numpy array with dtype=object.
+
+    Metadata columns usually contain lots of repeated values, so (rather than
+    stripping every single value) we just strip the unique values in the
+    input and then map these back to the input's positions.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # The last position in stripped_uniques is for NaNs in the input, which
+    # pd.factorize() gives a code of -1
+    stripped_uniques = np.empty(len(uniques) + 1, dtype=object)
+    stripped_uniques[:-1] = [u.strip() for u in uniques]
+    stripped_uniques[stripped_uniques == ""] = np.nan
+    stripped_uniques[-1] = np.nan
+    return stripped_uniques[codes]
+
+
 def read_metadata_file(md_file_loc):
     """Reads in a metadata file using pandas.read_csv().
 
     This treats all metadata values (including the index column) as
-    strings, due to the use of dtype=object.
-
-    NOTE THAT THIS WILL CONVERT empty cells in the TSV file to
-    np.nan values in the output DataFrame -- this is done to be
-    consistent with QIIME2's Metadata utilities. If you don't want
-    NaNs in your DataFrame, just call qurro._df_utils.replace_nan()
+    strings, due to the use of dtype=object. Leading/trailing whitespace is
+    stripped from each value (mimicking how QIIME 2 ignores this
+    whitespace).
+
+    NOTE THAT THIS WILL CONVERT empty cells in the TSV file (including cells
+    that only contain whitespace) to np.nan values in the output DataFrame
+    -- this is done to be consistent with QIIME2's Metadata utilities. If you
+    don't want NaNs in your DataFrame, just call qurro._df_utils.replace_nan()
     on the DataFrame you get from this function: e.g.
     metadata_df = replace_nan(read_metadata_file(...)). (You can also just
     call read_metadata_file_sane(), which will do this for you.)
+
+    md_file_loc can be either a filename (in which case the file is read as
+    UTF-8) or a file object.
     """
-    q2_lines = get_q2_comment_lines(md_file_loc)
-    metadata_df = pd.read_csv(
-        md_file_loc,
-        sep="\t",
-        na_values=[""],
-        keep_default_na=False,
-        dtype=object,
-        skiprows=q2_lines,
-    )
 
-    # Take care of leading/trailing whitespace
-    for column in metadata_df.columns:
-        # Strip surrounding whitespace from each value
-        # This mimics how QIIME 2 ignores this whitespace
-        metadata_df[column] = metadata_df[column].str.strip()
-    # Sorta the opposite of replace_nan(). Find all of the ""s resulting from
-    # removing values with just-whitespace, and convert them to NaNs.
-    metadata_df.where(metadata_df != "", np.nan, inplace=True)
+    def read_file_obj(file_obj):
+        # get_q2_comment_lines() only looks at the first few lines of the
+        # file (and then seeks back to the start of it), so we don't need to
+        # reopen the file to read it in after this.
+        q2_lines = get_q2_comment_lines(file_obj)
+        # We handle empty values ourselves (along with whitespace stripping)
+        # in strip_and_nanify(), so we don't bother having pandas look for
+        # them. This makes reading the file a bit faster.
+        return pd.read_csv(
+            file_obj,
+            sep="\t",
+            na_filter=False,
+            dtype=object,
+            skiprows=q2_lines,
+        )
+
+    if hasattr(md_file_loc, "read"):
+        raw_metadata_df = read_file_obj(md_file_loc)
+    else:
+        with open(md_file_loc, "r", encoding="utf-8") as md_file_obj:
+            raw_metadata_df = read_file_obj(md_file_obj)
+
+    # Take care of leading/trailing whitespace, and find all of the ""s
+    # (including the ones resulting from removing values with
+    # just-whitespace) and convert them to NaNs. This is sorta the opposite of
+    # replace_nan().
+    metadata_df = pd.DataFrame(
+        {
+            i: strip_and_nanify(raw_metadata_df.iloc[:, i])
+            for i in range(len(raw_metadata_df.columns))
+        },
+        index=raw_metadata_df.index,
+    )
+    metadata_df.columns = raw_metadata_df.columns
 
     # If there are any NaNs in the first column (that will end up being the
     # index column), then the user supplied at least one empty ID
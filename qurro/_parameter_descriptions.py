@@ -57,4 +57,23 @@ EXTREME_FEATURE_COUNT = (
     "filtering step."
 )
 
+COUNT_FORMAT = (
+    'How to store the feature count data in the visualization. "json" '
+    "embeds the counts directly in the visualization's main.js file. "
+    '"binary" writes the counts to a separate, compact binary file '
+    "(counts.bin), which is much smaller and faster to load for large "
+    "tables. Note that visualizations using the binary format need to be "
+    'viewed through a web server (e.g. by running "python3 -m http.server" '
+    "in the output directory, or by using QIIME 2 View) rather than by "
+    "opening index.html directly from your filesystem, since most browsers "
+    "won't load files from file:// URLs."
+)
+
 DEBUG = "If this flag is used, Qurro will output debug messages."
+
+PROFILE = (
+    "If this flag is used, Qurro will record how much time and memory each "
+    "step of generating the visualization takes, and write this information "
+    "to a JSON file (qurro_profile.json) alongside the visualization's other "
+    "files. Note that this slows Qurro down somewhat."
+)
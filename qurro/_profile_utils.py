@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2018--, Qurro development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#
+# Utilities for measuring how much time and memory each step of Qurro's
+# visualization generation pipeline uses (see the --profile option).
+# ----------------------------------------------------------------------------
+
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from qurro._json_utils import dumps_json
+
+PROFILE_FILENAME = "qurro_profile.json"
+
+
+class StageProfiler:
+    """Records the resources used by each stage of a pipeline.
+
+    For each stage, this records the wall time, CPU time, and peak memory
+    usage (as measured by tracemalloc, so this only accounts for memory
+    allocated by python) of the stage.
+
+    A disabled StageProfiler doesn't record anything, so code can just always
+    use a StageProfiler without having to check if profiling was requested.
+
+    Note that tracemalloc slows down python code quite a bit, so the times
+    recorded by this will be larger than the times these stages would take
+    without profiling. (They should still be useful for comparing different
+    stages, though.)
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = []
+        self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that records the resources used within it.
+
+        Stages shouldn't be nested, since the measurement of a stage's peak
+        memory usage would mess up the measurement of its parent stage's peak
+        memory usage.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        start_memory = tracemalloc.get_traced_memory()[0]
+        # tracemalloc.reset_peak() was added in Python 3.9. In older versions
+        # of Python, the peak memory we record will be the peak since
+        # tracemalloc was started (so it's an upper bound for each stage).
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+            end_memory, peak_memory = tracemalloc.get_traced_memory()
+            self.stages.append(
+                {
+                    "name": name,
+                    "wall_time": wall_time,
+                    "cpu_time": cpu_time,
+                    "start_memory": start_memory,
+                    "end_memory": end_memory,
+                    "peak_memory": peak_memory,
+                }
+            )
+            logging.debug(
+                "Stage {} took {:.3f} seconds (peak memory {} bytes).".format(
+                    name, wall_time, peak_memory
+                )
+            )
+
+    def stop(self):
+        """Stops tracemalloc, if this started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def get_report(self):
+        """Returns a dict describing the recorded stages.
+
+        Times are in seconds, and memory amounts are in bytes.
+        """
+        return {
+            "stages": self.stages,
+            "total_wall_time": sum(s["wall_time"] for s in self.stages),
+            "total_cpu_time": sum(s["cpu_time"] for s in self.stages),
+            "peak_memory": max(
+                (s["peak_memory"] for s in self.stages), default=0
+            ),
+        }
+
+    def write_report(self, output_dir):
+        """Writes out a JSON report of the recorded stages to output_dir.
+
+        This also stops tracemalloc (if this StageProfiler started it). If
+        this StageProfiler is disabled, this doesn't do anything and returns
+        None; otherwise, this returns the path to the report file.
+        """
+        self.stop()
+        if not self.enabled:
+            return None
+        report_path = os.path.join(output_dir, PROFILE_FILENAME)
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            report_file.write(dumps_json(self.get_report()))
+        return report_path
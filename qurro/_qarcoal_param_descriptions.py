@@ -35,3 +35,18 @@ QARCOAL_SMP_TO_USE = (
 QARCOAL_NUM = "Numerator string to search for in taxonomy."
 
 QARCOAL_DENOM = "Denominator string to search for in taxonomy."
+
+QARCOAL_BATCH_DESC = (
+    "Compute many log-ratios of feature strings at once. For each query, "
+    "this searches taxonomy for incidence of the query's numerator and "
+    "denominator strings, sums all relevant feature counts for each sample, "
+    "and takes the natural log of the numerator sum divided by denominator "
+    "sum. The output contains one column of log-ratios per query."
+)
+
+QARCOAL_QUERIES = (
+    "Metadata file describing the log-ratios to compute. Each ID is used as "
+    "the name of a log-ratio, and the num_string and denom_string columns "
+    "contain the numerator and denominator strings to search for in "
+    "taxonomy. Every query must have both a num_string and a denom_string."
+)
@@ -9,8 +9,11 @@
 
 import logging
 import skbio
+import numpy as np
 import pandas as pd
+from biom import Table
 from qurro._df_utils import escape_columns
+from qurro._table_utils import subset_table, get_feature_ids
 from qurro._metadata_utils import get_q2_comment_lines
 
 
@@ -80,45 +83,94 @@ def differentials_to_df(differentials_loc):
     # doesn't check column names, and I want it to do that...)
     differentials.index.rename(None, inplace=True)
 
-    # This is slow but it should at least *work as intended.*
     # If there are any non-numeric differentials, or any NaN differentials, or
     # any infinity/-infinity differentials (???), then we should raise an
-    # error. This code should do that.
-    for feature_row in differentials.itertuples():
-        for differential in feature_row[1:]:
-            try:
-                fd = float(differential)
-                if pd.isna(fd) or fd == float("inf") or fd == float("-inf"):
-                    raise ValueError
-            except ValueError:
-                raise ValueError(
-                    "Missing / nonnumeric differential(s) found for feature "
-                    "{}".format(feature_row[0])
-                )
-
-    # Now, we should be able to do this freely.
-    for column in differentials.columns:
-        differentials[column] = differentials[column].astype(float)
-    return differentials
+    # error. To check this, we convert all of the differentials to floats at
+    # once. (This uses float() on each differential, so the same strings are
+    # accepted as numbers as if we'd called float() on each one ourselves.
+    # pd.to_numeric() is a bit pickier -- e.g. it doesn't accept "1_000".)
+    raw_values = differentials.to_numpy()
+    try:
+        values = raw_values.astype(float)
+    except ValueError:
+        # At least one differential is non-numeric. Figure out which ones
+        # (converting them to NaN), so we can report the first one below.
+        values = np.vectorize(_float_or_nan, otypes=[float])(raw_values)
+
+    finite_rows = np.isfinite(values).all(axis=1)
+    if not finite_rows.all():
+        raise ValueError(
+            "Missing / nonnumeric differential(s) found for feature "
+            "{}".format(differentials.index[np.argmin(finite_rows)])
+        )
+
+    return pd.DataFrame(
+        values, index=differentials.index, columns=differentials.columns
+    )
+
+
+def _float_or_nan(value):
+    """Returns float(value), or NaN if value can't be converted to a float."""
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def top_k_mask(values, k):
+    """Returns a boolean mask of the k largest values in each column.
+
+    This mimics pandas' DataFrame.nlargest(k, column) for each column: if
+    there are ties for the k-th largest value in a column, the values that
+    occur first in the column are selected.
+
+    Parameters
+    ----------
+
+    values: numpy.ndarray
+         A 2-D array of numbers with no NaNs. This should have more than k
+         rows.
+
+    k: int
+         The number of values to select from each column.
+
+    Returns
+    -------
+
+    numpy.ndarray
+         A boolean array with the same shape as values, where exactly k
+         entries in each column are True.
+    """
+    num_rows = values.shape[0]
+    # np.partition() puts the k-th largest value of each column in the
+    # (num_rows - k)-th row, in linear time
+    kth_largest = np.partition(values, num_rows - k, axis=0)[num_rows - k]
+    larger = values > kth_largest
+    tied = values == kth_largest
+    # For each column, we still need (k - # of larger values) of the tied
+    # values; take the ones that occur first.
+    num_tied_needed = k - larger.sum(axis=0)
+    return larger | (tied & (np.cumsum(tied, axis=0) <= num_tied_needed))
 
 
 def filter_unextreme_features(
-    table: pd.DataFrame, ranks: pd.DataFrame, extreme_feature_count: int
+    table, ranks: pd.DataFrame, extreme_feature_count: int
 ) -> None:
     """Returns copies of the table and ranks with "unextreme" features removed.
 
     This assumes that the table and ranks have already been matched (i.e.
-    their indices are now identical). If this isn't the case, the behavior
-    of this function is undefined (I'm pretty sure it will make the print
-    messages incorrect at minimum).
+    they contain the same features, although these features don't have to
+    be in the same order). If this isn't the case, the behavior of this
+    function is undefined (I'm pretty sure it will make the print messages
+    incorrect at minimum).
 
     Parameters
     ----------
 
-    table: pd.DataFrame
-         A DataFrame representation of a BIOM table. This can be
-         generated easily from a biom.Table object using
-         qurro._df_utils.biom_table_to_sparse_df().
+    table: biom.Table or pd.DataFrame
+         A BIOM table, or a DataFrame representation of a BIOM table (this
+         can be generated easily from a biom.Table object using
+         biom.Table.to_dataframe()).
 
     ranks: pandas.DataFrame
          A DataFrame where the index consists of ranked features' IDs, and
@@ -134,8 +186,10 @@ def filter_unextreme_features(
     Returns
     -------
 
-    (table, ranks): (pandas.DataFrame, pandas.DataFrame)
-         Filtered copies of the input table and ranks DataFrames.
+    (table, ranks): (biom.Table or pandas.DataFrame, pandas.DataFrame)
+         Filtered copies of the input table and ranks. The table will be of
+         the same type as the input table. Features in the output are in the
+         same order as in the input.
 
     Behavior
     --------
@@ -197,35 +251,37 @@ def filter_unextreme_features(
     )
     logging.debug("Input table has shape {}.".format(table.shape))
     logging.debug("Input feature ranks have shape {}.".format(ranks.shape))
-    # We store these features in a set to avoid duplicates -- Python does the
-    # hard work here for us
-    features_to_preserve = set()
-    for ranking in ranks.columns:
-        upper_extrema = ranks.nlargest(extreme_feature_count, ranking).index
-        lower_extrema = ranks.nsmallest(extreme_feature_count, ranking).index
-        features_to_preserve |= set(upper_extrema)
-        features_to_preserve |= set(lower_extrema)
-
-    # In the year of our lord 2022, using a set as an indexer for .loc[]
-    # makes pandas raise a warning. So, now that we've made use of the fact
-    # that features_to_preserve has no duplicates, we convert it back to a
-    # list. There's probably a more efficient way to do this, but I doubt this
-    # will be a bottleneck.
-    features_to_preserve_but_as_a_list = list(features_to_preserve)
-
-    # (NOTE FROM 2022: the below comment is old and I have no idea why I
-    # formatted it like that or if this benchmarking is even still accurate
-    # after pandas 1's changes to dataframe sparsity, idk)
-    #
-    # Now, we actually filter the feature ranks and table. We do this using
-    # .loc[]. I benchmarked it, and .loc was about 1.77x as fast as .filter --
-    # >>> df = pd.SparseDataFrame(np.zeros(34000000).reshape(17000, 2000))
-    # >>> %timeit df.loc[set([16990, 8983, 8982])]
-    # 460 ms +/- 17.6 ms per loop
-    # >>> %timeit df.filter(items=set([16990, 8983, 8982]), axis="index")
-    # 818 ms +/- 25.6 ms per loop
-    filtered_ranks = ranks.loc[features_to_preserve_but_as_a_list]
-    filtered_table = table.loc[features_to_preserve_but_as_a_list]
+    # Figure out which features are extreme in at least one ranking. This is
+    # done for all of the rankings at once, so it stays fast even when there
+    # are lots of rankings (e.g. from multinomial models with many
+    # covariates).
+    rank_values = ranks.to_numpy(dtype=float)
+    is_nan = np.isnan(rank_values)
+    keep_mask = (
+        top_k_mask(
+            np.where(is_nan, -np.inf, rank_values), extreme_feature_count
+        )
+        | top_k_mask(
+            np.where(is_nan, -np.inf, -rank_values), extreme_feature_count
+        )
+    ) & ~is_nan
+    positions_to_preserve = np.flatnonzero(keep_mask.any(axis=1))
+
+    # Now, we actually filter the feature ranks and table. The ranks can be
+    # filtered by position, but the table's features aren't necessarily in
+    # the same order as the ranks' features -- so we look up the positions
+    # of the preserved features in the table. (Both outputs have their
+    # features in the same order as the input ranks.)
+    filtered_ranks = ranks.iloc[positions_to_preserve]
+    if isinstance(table, Table):
+        table_positions = get_feature_ids(table).get_indexer(
+            filtered_ranks.index
+        )
+        if (table_positions < 0).any():
+            raise ValueError("Not all ranked features are in the table.")
+        filtered_table = subset_table(table, table_positions)
+    else:
+        filtered_table = table.loc[filtered_ranks.index]
 
     filtered_feature_ct = filtered_ranks.shape[0]
     print(
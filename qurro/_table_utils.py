@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------------------------
+# Copyright (c) 2018--, Qurro development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#
+# Utilities for processing BIOM tables without converting them to DataFrames.
+#
+# The functions here work directly on the sparse matrix underlying a
+# biom.Table. This way, we never need to hold a dense (or boolean) copy of the
+# table in memory -- which matters a lot for EMP-scale tables.
+# ----------------------------------------------------------------------------
+
+import logging
+import numpy as np
+import pandas as pd
+from biom import Table
+from qurro._count_utils import to_csr
+
+
+def get_feature_ids(table):
+    """Returns a pd.Index of the feature (observation) IDs in a biom.Table."""
+    return pd.Index(table.ids(axis="observation"))
+
+
+def get_sample_ids(table):
+    """Returns a pd.Index of the sample IDs in a biom.Table."""
+    return pd.Index(table.ids(axis="sample"))
+
+
+def validate_table(table, min_row_ct=2, min_col_ct=1):
+    """Does some basic validation on a biom.Table.
+
+    This is analogous to calling _df_utils.validate_df() on a DataFrame
+    representation of the table, and raises the same errors. (These checks
+    should generally pass, since biom validates tables when loading them --
+    but we might as well check.)
+    """
+    if not get_feature_ids(table).is_unique:
+        raise ValueError("Indices of the BIOM table DataFrame are not unique.")
+    if not get_sample_ids(table).is_unique:
+        raise ValueError("Columns of the BIOM table DataFrame are not unique.")
+    logging.debug("Ensured uniqueness of BIOM table.")
+    if table.shape[0] < min_row_ct:
+        raise ValueError(
+            "Less than {} rows found in the BIOM table.".format(min_row_ct)
+        )
+    if table.shape[1] < min_col_ct:
+        raise ValueError(
+            "Less than {} columns found in the BIOM table.".format(min_col_ct)
+        )
+
+
+def subset_table(table, feature_positions=None, sample_positions=None):
+    """Returns a new biom.Table containing a subset of a table's data.
+
+    This indexes the sparse matrix underlying the table by position, so the
+    output table's features and samples will be in the same order as the
+    input positions (which don't have to be sorted).
+
+    Parameters
+    ----------
+
+    table: biom.Table
+
+    feature_positions: array-like of int, or None
+        Positions of the features (rows) to include in the output. If this is
+        None, all features will be included.
+
+    sample_positions: array-like of int, or None
+        Positions of the samples (columns) to include in the output. If this
+        is None, all samples will be included.
+
+    Returns
+    -------
+
+    biom.Table
+        Note that observation and sample metadata in the input table are not
+        preserved, since Qurro doesn't use this information anyway.
+    """
+    matrix = table.matrix_data
+    feature_ids = table.ids(axis="observation")
+    sample_ids = table.ids(axis="sample")
+    if feature_positions is not None:
+        feature_positions = np.asarray(feature_positions, dtype=np.intp)
+        matrix = matrix[feature_positions]
+        feature_ids = feature_ids[feature_positions]
+    if sample_positions is not None:
+        sample_positions = np.asarray(sample_positions, dtype=np.intp)
+        matrix = matrix[:, sample_positions]
+        sample_ids = sample_ids[sample_positions]
+    # We've already validated the input table, so we don't bother having biom
+    # re-validate this subset of it
+    return Table(matrix, feature_ids, sample_ids, validate=False)
+
+
+def get_nonzero_counts(table):
+    """Returns the numbers of nonzero entries in each row and column.
+
+    Returns
+    -------
+
+    (row_nonzero_counts, col_nonzero_counts): (np.ndarray, np.ndarray)
+        Arrays of length (# features) and (# samples), respectively.
+    """
+    # The code below relies on the matrix being in CSR format (which biom
+    # doesn't guarantee)
+    matrix = to_csr(table.matrix_data)
+    nonzero = matrix.data != 0
+    row_positions = np.repeat(
+        np.arange(matrix.shape[0]), np.diff(matrix.indptr)
+    )
+    row_nonzero_counts = np.bincount(
+        row_positions[nonzero], minlength=matrix.shape[0]
+    )
+    col_nonzero_counts = np.bincount(
+        matrix.indices[nonzero], minlength=matrix.shape[1]
+    )
+    return row_nonzero_counts, col_nonzero_counts
+
+
+def remove_empty_samples_and_features(
+    table, sample_metadata_df, feature_ranks_df
+):
+    """Removes empty samples and features from the table, sample metadata, and
+    feature ranks.
+
+    This should be called *after* matching the table with the sample
+    metadata and feature ranks -- we assume that the table's samples are
+    the same as the samples in the sample metadata, and that the table's
+    features are the same as the features in the feature ranks.
+
+    This will raise a ValueError if the input table is empty (i.e. all
+    samples/features would be removed).
+    """
+    logging.debug("Attempting to remove empty samples and features.")
+
+    row_nonzero_counts, col_nonzero_counts = get_nonzero_counts(table)
+    feature_positions = np.flatnonzero(row_nonzero_counts)
+    sample_positions = np.flatnonzero(col_nonzero_counts)
+
+    if len(feature_positions) == 0 or len(sample_positions) == 0:
+        raise ValueError("The table is empty.")
+
+    filtered_metadata = sample_metadata_df
+    filtered_ranks = feature_ranks_df
+
+    sample_diff = table.shape[1] - len(sample_positions)
+    feature_diff = table.shape[0] - len(feature_positions)
+    if sample_diff == 0 and feature_diff == 0:
+        logging.debug("Couldn't find any empty samples or features.")
+        return table, filtered_metadata, filtered_ranks
+
+    filtered_table = subset_table(
+        table,
+        feature_positions if feature_diff > 0 else None,
+        sample_positions if sample_diff > 0 else None,
+    )
+
+    if sample_diff > 0:
+        # Align the (transposed) sample metadata with the filtered table's
+        # samples. (Transposing and then transposing back means that the
+        # metadata's column dtypes are the same as they would be if we had
+        # matched it up with a DataFrame version of the table.)
+        shared_samples = get_sample_ids(filtered_table).join(
+            sample_metadata_df.index, how="inner"
+        )
+        filtered_metadata = sample_metadata_df.T.reindex(
+            columns=shared_samples
+        ).T
+        print("Removed {} empty sample(s).".format(sample_diff))
+    else:
+        logging.debug("Couldn't find any empty samples.")
+
+    if feature_diff > 0:
+        shared_features = get_feature_ids(filtered_table).join(
+            feature_ranks_df.index, how="inner"
+        )
+        filtered_ranks = feature_ranks_df.reindex(shared_features)
+        print("Removed {} empty feature(s).".format(feature_diff))
+    else:
+        logging.debug("Couldn't find any empty features.")
+
+    return filtered_table, filtered_metadata, filtered_ranks
+
+
+def print_dropped_message(
+    dropped_item_ct, item_name, df_name, filter_basis_name
+):
+    """Prints a message if dropped_item_ct is greater than 0.
+
+    Parameters
+    ----------
+    dropped_item_ct: int
+         The number of items that were dropped.
+
+    item_name: str
+         The name of the "thing" that was dropped. In practice, this is
+         either "sample" or "feature".
+
+    df_name: str
+         The name of the dataset these items were dropped from.
+
+    filter_basis_name: str
+         The name of the other dataset which caused these items to be
+         dropped. For example, if we're checking to see if samples were
+         dropped from the sample metadata file due to to samples not being
+         in the BIOM table, df_name could be "sample metadata file" and
+         filter_basis_name could be "BIOM table".
+    """
+    if dropped_item_ct > 0:
+        print(
+            "{} {}(s) in the {} were not present in the {}.".format(
+                dropped_item_ct, item_name, df_name, filter_basis_name
+            )
+        )
+        print(
+            "These {}(s) have been removed from the "
+            "visualization.".format(item_name)
+        )
+
+
+def match_table_and_data(table, feature_ranks, sample_metadata):
+    """Matches feature rankings and then sample metadata to a biom.Table.
+
+    The input table might contain features or samples that are not included
+    in feature_ranks or sample_metadata, respectively -- this is totally
+    fine. The opposite, though, is where things get to be a problem: if any
+    of the features in feature_ranks are not present in the table, or if
+    all of the samples in sample_metadata are not in the table, then this
+    will raise errors.
+
+    The feature and sample IDs are matched up using the same pandas logic
+    used by DataFrame.align(), so the output table's features and samples
+    are in the same order as they would be if we had aligned a DataFrame
+    version of the table with the feature ranks and sample metadata.
+
+    Returns
+    -------
+
+    (m_table, m_feature_ranks, m_sample_metadata):
+    (biom.Table, pd.DataFrame, pd.DataFrame)
+        m_feature_ranks contains the same features as feature_ranks, but
+        reordered so that its features are in the same order as m_table's
+        features. So code further down the pipeline can safely match up the
+        table and feature ranks by position.
+
+    Raises
+    ------
+
+    If any of the features described in feature_ranks are not present in
+    the table, this will raise a ValueError.
+
+    If all of the samples described in sample_metadata are not present
+    in the table, this will raise a ValueError.
+    """
+    logging.debug("Starting matching table with feature ranks.")
+    table_feature_ids = get_feature_ids(table)
+    shared_features = table_feature_ids.join(feature_ranks.index, how="inner")
+    logging.debug("Matching table with feature ranks done.")
+    # Ensure that every ranked feature was present in the BIOM table. Raise an
+    # error if this isn't the case.
+    if len(shared_features) < feature_ranks.shape[0]:
+        unsupported_feature_ct = feature_ranks.shape[0] - len(shared_features)
+        # making this error message as pretty as possible
+        word = "were"
+        if unsupported_feature_ct == 1:
+            word = "was"
+        raise ValueError(
+            "Of the {} ranked features, {} {} not present in "
+            "the input BIOM table.".format(
+                feature_ranks.shape[0], unsupported_feature_ct, word
+            )
+        )
+    dropped_feature_ct = len(table_feature_ids) - len(shared_features)
+    print_dropped_message(
+        dropped_feature_ct, "feature", "BIOM table", "feature rankings"
+    )
+
+    logging.debug("Starting matching table with sample metadata.")
+    table_sample_ids = get_sample_ids(table)
+    shared_samples = table_sample_ids.join(sample_metadata.index, how="inner")
+    # Allow for dropped samples (e.g. negative controls), but ensure that at
+    # least one sample is supported by the BIOM table.
+    if len(shared_samples) < 1:
+        raise ValueError(
+            "No samples are shared between the sample metadata file and BIOM "
+            "table."
+        )
+    # The sample metadata is transposed and then transposed back. This isn't
+    # needed for matching, but it means that the output metadata's column
+    # dtypes are the same as they were back when we matched the sample
+    # metadata with a DataFrame version of the table.
+    m_sample_metadata = sample_metadata.T.reindex(columns=shared_samples).T
+    logging.debug("Matching table with sample metadata done.")
+    print_dropped_message(
+        len(sample_metadata.index) - len(shared_samples),
+        "sample",
+        "sample metadata file",
+        "BIOM table",
+    )
+    dropped_sample_ct = len(table_sample_ids) - len(shared_samples)
+    print_dropped_message(
+        dropped_sample_ct, "sample", "BIOM table", "sample metadata file"
+    )
+
+    # Only bother subsetting the table if we actually need to
+    if dropped_feature_ct > 0 or dropped_sample_ct > 0:
+        feature_positions = None
+        sample_positions = None
+        if dropped_feature_ct > 0:
+            feature_positions = table_feature_ids.get_indexer(shared_features)
+        if dropped_sample_ct > 0:
+            sample_positions = table_sample_ids.get_indexer(shared_samples)
+        m_table = subset_table(table, feature_positions, sample_positions)
+    else:
+        m_table = table
+
+    m_feature_ranks = feature_ranks.reindex(shared_features)
+    return m_table, m_feature_ranks, m_sample_metadata
+
+
+def add_sample_presence_count(feature_data, table):
+    """Adds a "qurro_spc" column to a DataFrame of feature information.
+
+    The value in this column is the number of samples a feature is present
+    in: that is, the number of positive entries in the feature's row of the
+    table's sparse matrix.
+
+    The table should only contain samples that will be used in the Qurro
+    visualization (i.e. it should be the output of all the matching,
+    filtering, removing empty, etc. steps), since the presence of
+    irrelevant samples will result in inaccurate SPC values being computed.
+
+    Raises a ValueError if feature_data already contains a column named
+    "qurro_spc". (Assuming you've already called
+    _df_utils.check_column_names() on this data this shouldn't be a
+    problem, but this checks anyway.)
+    """
+    matrix = to_csr(table.matrix_data)
+    row_positions = np.repeat(
+        np.arange(matrix.shape[0]), np.diff(matrix.indptr)
+    )
+    spc = np.bincount(
+        row_positions[matrix.data > 0], minlength=matrix.shape[0]
+    )
+    # (Sample presence counts have historically been floats, so we keep
+    # them as floats here.)
+    spc_series = pd.Series(
+        spc.astype(float), index=get_feature_ids(table), name="qurro_spc"
+    )
+    return feature_data.merge(
+        spc_series,
+        how="left",
+        left_index=True,
+        right_index=True,
+        suffixes=(False, False),
+    )
+
+
+def get_value_range(table):
+    """Returns the (minimum, maximum) values in a biom.Table.
+
+    This accounts for the implicit zeros in the sparse matrix underlying the
+    table, so (for example) a table without any negative values and with at
+    least one zero entry will always have a minimum value of 0.
+    """
+    matrix = table.matrix_data
+    values = matrix.data
+    if len(values) < matrix.shape[0] * matrix.shape[1]:
+        values = np.append(values, 0)
+    return values.min(), values.max()
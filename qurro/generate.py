@@ -21,21 +21,26 @@ import logging
 import pandas as pd
 import altair as alt
 from qurro._rank_utils import filter_unextreme_features
+from qurro._profile_utils import StageProfiler
+from qurro._count_utils import sparse_count_dict, write_binary_counts
 from qurro._json_utils import (
-    replace_js_json_definitions,
+    write_js_json_definitions,
     check_json_dataset_names,
 )
 from qurro._df_utils import (
     replace_nan,
     validate_df,
     check_column_names,
-    biom_table_to_sparse_df,
     vibe_check,
+    merge_feature_metadata,
+)
+from qurro._table_utils import (
+    validate_table,
     remove_empty_samples_and_features,
     match_table_and_data,
-    merge_feature_metadata,
-    sparsify_count_dict,
     add_sample_presence_count,
+    get_feature_ids,
+    get_sample_ids,
 )
 
 
@@ -47,6 +52,8 @@ def process_and_generate(
     output_dir,
     feature_metadata=None,
     extreme_feature_count=None,
+    count_format="json",
+    profiler=None,
 ):
     """Just calls process_input() and gen_visualization()."""
     U, V, ranking_ids, feature_metadata_cols, processed_table = process_input(
@@ -55,6 +62,7 @@ def process_and_generate(
         biom_table,
         feature_metadata,
         extreme_feature_count,
+        profiler=profiler,
     )
     return gen_visualization(
         V,
@@ -64,6 +72,8 @@ def process_and_generate(
         processed_table,
         U,
         output_dir,
+        count_format=count_format,
+        profiler=profiler,
     )
 
 
@@ -73,6 +83,7 @@ def process_input(
     biom_table,
     feature_metadata=None,
     extreme_feature_count=None,
+    profiler=None,
 ):
     """Validates/processes the input files and parameter(s) to Qurro.
 
@@ -86,8 +97,10 @@ def process_input(
        missing values are represented consistently with a None (which
        will be represented as a null in JSON/JavaScript).
 
-    3. Converts the BIOM table to a DataFrame by calling
-       biom_table_to_sparse_df().
+    3. Calls validate_table() on the BIOM table. Note that we don't convert
+       the BIOM table to a DataFrame: all of the subsequent processing of the
+       table is done on the sparse matrix underlying it (see
+       _table_utils.py).
 
     4. Runs vibe_check() on the feature ranks and BIOM table to ensure
        that numbers are within the range of safe IEEE 754 numbers for
@@ -106,6 +119,9 @@ def process_input(
     8. Calls merge_feature_metadata() on the feature ranks and feature
        metadata. (If feature metadata is None, nothing will be done.)
 
+    If a StageProfiler is passed as the profiler parameter, the resources
+    used by each of these steps will be recorded using it.
+
     Returns
     -------
     output_metadata: pd.DataFrame
@@ -122,64 +138,79 @@ def process_input(
     feature_metadata_cols: list
          The feature metadata columns' names in output_ranks.
 
-    output_table: pd.DataFrame
+    output_table: biom.Table
          The BIOM table, post matching with the feature ranks and sample
          metadata and with empty samples removed.
     """
 
-    logging.debug("Starting processing input.")
+    if profiler is None:
+        profiler = StageProfiler(enabled=False)
 
-    validate_df(feature_ranks, "feature ranks", 2, 1)
-    validate_df(sample_metadata, "sample metadata", 1, 1)
-    if feature_metadata is not None:
-        # It's cool if there aren't any features actually described in the
-        # feature metadata (hence why we pass in 0 as the minimum # of rows in
-        # the feature metadata DataFrame), but we still pass it to
-        # validate_df() in order to ensure that:
-        #   1) there's at least one feature metadata column (because
-        #      otherwise the feature metadata is useless)
-        #   2) column names are unique
-        validate_df(feature_metadata, "feature metadata", 0, 1)
+    logging.debug("Starting processing input.")
 
-    check_column_names(sample_metadata, feature_ranks, feature_metadata)
+    with profiler.stage("validate"):
+        validate_df(feature_ranks, "feature ranks", 2, 1)
+        validate_df(sample_metadata, "sample metadata", 1, 1)
+        if feature_metadata is not None:
+            # It's cool if there aren't any features actually described in
+            # the feature metadata (hence why we pass in 0 as the minimum # of
+            # rows in the feature metadata DataFrame), but we still pass it to
+            # validate_df() in order to ensure that:
+            #   1) there's at least one feature metadata column (because
+            #      otherwise the feature metadata is useless)
+            #   2) column names are unique
+            validate_df(feature_metadata, "feature metadata", 0, 1)
+
+        check_column_names(sample_metadata, feature_ranks, feature_metadata)
 
     # Replace NaN values (which both _metadata_utils.read_metadata_file() and
     # qiime2.Metadata use to represent missing values, i.e. ""s) with None --
     # this is generally easier for us to handle in the JS side of things (since
-    # it'll just be consistently converted to null by json.dumps()).
-    sample_metadata = replace_nan(sample_metadata)
-    if feature_metadata is not None:
-        feature_metadata = replace_nan(feature_metadata)
+    # it'll just be consistently converted to null in the JSONs we write).
+    with profiler.stage("replace_nan"):
+        sample_metadata = replace_nan(sample_metadata)
+        if feature_metadata is not None:
+            feature_metadata = replace_nan(feature_metadata)
 
-    table = biom_table_to_sparse_df(biom_table)
+    with profiler.stage("validate_table"):
+        validate_table(biom_table)
 
     # Check that the solely-numeric data only contains "safe" numbers
-    vibe_check(feature_ranks, table)
+    with profiler.stage("vibe_check"):
+        vibe_check(feature_ranks, biom_table)
 
     # Match up the table with the feature ranks and sample metadata.
-    m_table, m_sample_metadata = match_table_and_data(
-        table, feature_ranks, sample_metadata
-    )
+    with profiler.stage("match"):
+        m_table, m_feature_ranks, m_sample_metadata = match_table_and_data(
+            biom_table, feature_ranks, sample_metadata
+        )
 
     # Note that although we always call filter_unextreme_features(), filtering
     # isn't necessarily always done (whether or not depends on the value of
     # extreme_feature_count and the contents of the table/ranks).
-    filtered_table, filtered_ranks = filter_unextreme_features(
-        m_table, feature_ranks, extreme_feature_count
-    )
+    with profiler.stage("filter_unextreme_features"):
+        filtered_table, filtered_ranks = filter_unextreme_features(
+            m_table, m_feature_ranks, extreme_feature_count
+        )
 
     # Filter now-empty samples (and empty features) from the BIOM table.
-    output_table, output_metadata, u_ranks = remove_empty_samples_and_features(
-        filtered_table, m_sample_metadata, filtered_ranks
-    )
+    with profiler.stage("remove_empty_samples_and_features"):
+        (
+            output_table,
+            output_metadata,
+            u_ranks,
+        ) = remove_empty_samples_and_features(
+            filtered_table, m_sample_metadata, filtered_ranks
+        )
 
     # Save a list of ranking IDs (before we add in feature metadata)
     # TODO: just have merge_feature_metadata() give us this?
     ranking_ids = u_ranks.columns
 
-    output_ranks, feature_metadata_cols = merge_feature_metadata(
-        u_ranks, feature_metadata
-    )
+    with profiler.stage("merge_feature_metadata"):
+        output_ranks, feature_metadata_cols = merge_feature_metadata(
+            u_ranks, feature_metadata
+        )
 
     logging.debug("Finished input processing.")
     return (
@@ -191,7 +222,7 @@ def process_input(
     )
 
 
-def gen_rank_plot(V, rank_type, ranking_ids, feature_metadata_cols, table_sdf):
+def gen_rank_plot(V, rank_type, ranking_ids, feature_metadata_cols, table):
     """Uses Altair to generate a JSON Vega-Lite spec for the rank plot.
 
     Parameters
@@ -217,12 +248,12 @@ def gen_rank_plot(V, rank_type, ranking_ids, feature_metadata_cols, table_sdf):
         IDs of the "feature metadata" columns in V (if there wasn't any
         feature metadata provided, this can just be an empty list).
 
-    table_sdf: pd.DataFrame
-        A representation of the input BIOM table containing count data. This
-        is used to calculate qurro_spc (the number of samples a feature is
-        present in) for each feature in V. This should ONLY contain samples
-        that will be used in the Qurro visualization -- the presence of extra
-        samples will mess up _df_utils.add_sample_presence_count().
+    table: biom.Table
+        The input BIOM table containing count data. This is used to calculate
+        qurro_spc (the number of samples a feature is present in) for each
+        feature in V. This should ONLY contain samples that will be used in
+        the Qurro visualization -- the presence of extra samples will mess up
+        _table_utils.add_sample_presence_count().
 
     Returns
     -------
@@ -257,7 +288,7 @@ def gen_rank_plot(V, rank_type, ranking_ids, feature_metadata_cols, table_sdf):
 
     # Add a "qurro_spc" column indicating how many samples each feature is
     # present in.
-    rank_data = add_sample_presence_count(rank_data, table_sdf)
+    rank_data = add_sample_presence_count(rank_data, table)
 
     # Replace "index" with "Feature ID". looks nicer in the visualization :)
     rank_data.rename_axis("Feature ID", axis="index", inplace=True)
@@ -471,9 +502,28 @@ def gen_visualization(
     processed_table,
     df_sample_metadata,
     output_dir,
+    count_format="json",
+    profiler=None,
 ):
     """Creates a Qurro visualization from already-processed-and-validated data.
 
+    Parameters
+    ----------
+
+    count_format: str
+        Either "json" or "binary". If "json", the feature counts are embedded
+        in main.js as a sparse JSON object (the default). If "binary", the
+        counts are written to a separate binary file (see
+        qurro._count_utils.write_binary_counts()) and only a small descriptor
+        of this file is embedded in main.js. The binary format is much
+        smaller and faster to load for large tables, but the resulting
+        visualization has to be viewed through a web server (browsers will
+        generally refuse to fetch() files from file:// URLs).
+
+    profiler: StageProfiler or None
+        If this is a StageProfiler, the resources used by each step of
+        generating the visualization will be recorded using it.
+
     Returns
     -------
 
@@ -482,17 +532,33 @@ def gen_visualization(
          needed when calling q2templates.render().
     """
 
+    if profiler is None:
+        profiler = StageProfiler(enabled=False)
+
     # https://altair-viz.github.io/user_guide/faq.html#disabling-maxrows
     alt.data_transformers.enable("default", max_rows=None)
 
     logging.debug("Generating rank plot JSON.")
-    rank_plot_json = gen_rank_plot(
-        V, rank_type, ranking_ids, feature_metadata_cols, processed_table
-    )
+    with profiler.stage("gen_rank_plot"):
+        rank_plot_json = gen_rank_plot(
+            V, rank_type, ranking_ids, feature_metadata_cols, processed_table
+        )
     logging.debug("Generating sample plot JSON.")
-    sample_plot_json = gen_sample_plot(df_sample_metadata)
-    logging.debug("Generating count data JSON.")
-    count_json = sparsify_count_dict(processed_table.T.to_dict())
+    with profiler.stage("gen_sample_plot"):
+        sample_plot_json = gen_sample_plot(df_sample_metadata)
+    if count_format == "json":
+        logging.debug("Generating count data JSON.")
+        with profiler.stage("gen_count_json"):
+            count_json = sparse_count_dict(
+                processed_table.matrix_data,
+                get_feature_ids(processed_table),
+                get_sample_ids(processed_table),
+            )
+    elif count_format != "binary":
+        raise ValueError(
+            "Unrecognized count format {}: must be either json or "
+            "binary.".format(count_format)
+        )
     logging.debug("Finished generating all JSONs.")
 
     # Copy support_files/ for the Qurro visualization to the output directory
@@ -510,31 +576,47 @@ def gen_visualization(
     # running as a QIIME 2 plugin, output_dir already exists and we need to
     # write stuff to it -- this is because output_dir is actually a temporary
     # folder that QIIME 2 creates.)
-    if sys.version_info >= (3, 8):
-        # distutils is deprecated, so this is the future-proof solution:
-        # https://stackoverflow.com/a/73439464/10730311
-        from shutil import copytree
-
-        copytree(support_files_loc, output_dir, dirs_exist_ok=True)
-    else:
-        # The dirs_exist_ok flag for shutil.copytree() was only added in
-        # Python 3.8, so -- for older versions of Python -- we can use the
-        # original solution for this, using distutils.
-        # (Based on emperor.core.copy_support_files().)
-        from distutils.dir_util import copy_tree
-
-        copy_tree(support_files_loc, output_dir)
+    with profiler.stage("copy_support_files"):
+        if sys.version_info >= (3, 8):
+            # distutils is deprecated, so this is the future-proof solution:
+            # https://stackoverflow.com/a/73439464/10730311
+            from shutil import copytree
+
+            copytree(support_files_loc, output_dir, dirs_exist_ok=True)
+        else:
+            # The dirs_exist_ok flag for shutil.copytree() was only added in
+            # Python 3.8, so -- for older versions of Python -- we can use the
+            # original solution for this, using distutils.
+            # (Based on emperor.core.copy_support_files().)
+            from distutils.dir_util import copy_tree
+
+            copy_tree(support_files_loc, output_dir)
 
     index_path = os.path.join(output_dir, "index.html")
 
+    if count_format == "binary":
+        # This has to be done after copying support_files/, since output_dir
+        # might not have existed before then
+        logging.debug("Writing binary count data.")
+        with profiler.stage("write_binary_counts"):
+            count_json = write_binary_counts(
+                processed_table.matrix_data,
+                get_feature_ids(processed_table),
+                get_sample_ids(processed_table),
+                output_dir,
+            )
+
     # Write the plot and count JSONs to main.js so that they're loaded when
-    # this Qurro visualization starts up
-    exit_code = replace_js_json_definitions(
-        os.path.join(output_dir, "main.js"),
-        rank_plot_json,
-        sample_plot_json,
-        count_json,
-    )
+    # this Qurro visualization starts up. (We just copied over a fresh main.js
+    # from support_files/, so there's no need to compare these JSONs with
+    # whatever's currently in main.js -- we know they're just placeholders.)
+    with profiler.stage("write_main_js"):
+        exit_code = write_js_json_definitions(
+            os.path.join(output_dir, "main.js"),
+            rank_plot_json,
+            sample_plot_json,
+            count_json,
+        )
     if exit_code != 0:
         raise ValueError("Wasn't able to replace JSONs and write to main.js.")
 
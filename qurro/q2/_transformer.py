@@ -1,25 +1,43 @@
 #!/usr/bin/env python
 
+import numpy as np
 import pandas as pd
 import qiime2
+from qurro._metadata_utils import get_q2_comment_lines
 from qurro.q2._type import LogRatiosFormat
 from qurro.q2.plugin_setup import plugin
 
+# Columns of Qarcoal's output that we know are numeric (see
+# qurro.qarcoal.qarcoal())
+NUMERIC_LOG_RATIO_COLUMNS = ("Num_Sum", "Denom_Sum", "log_ratio")
+
 
-# taken from q2-types/sample_data/_transformer.py
-# https://github.com/qiime2/q2-types/blob/dc75cdeeb5e5535bc3c8bc703d06ef0adc1b58f9/q2_types/sample_data/_transformer.py#L18-L28
 def _read_log_ratios(fh):
-    # Using `dtype=object` and `set_index` to avoid type casting/inference
-    # of any columns
-    # want to keep index name as "Sample-ID"
-    df = pd.read_csv(fh, sep="\t", header=0, dtype=object)
-    df.set_index(df.columns[0], drop=True, append=False, inplace=True)
-    # df.index.name = None
-    # casting of columns adapted from SO post:
-    # https://stackoverflow.com/a/36814203/3424666
-    cols = df.columns
-    df[cols] = df[cols].apply(pd.to_numeric, errors="ignore")
-    return df
+    """Reads a log-ratio TSV file into a DataFrame.
+
+    This is based on q2-types/sample_data/_transformer.py
+    (https://github.com/qiime2/q2-types/blob/dc75cdeeb5e5535bc3c8bc703d06ef0adc1b58f9/q2_types/sample_data/_transformer.py#L18-L28),
+    but the file is parsed in a single pass: the first column (sample IDs)
+    is used as the index and kept as strings, the known numeric columns of
+    Qarcoal's output are parsed as floats, and the types of any other
+    columns (e.g. the log-ratio columns of qarcoal_batch()'s output) are
+    inferred by pandas while parsing. "#q2:" comment directives (which are
+    included in files written from a qiime2.Metadata) are skipped.
+    """
+    header = fh.readline().rstrip("\r\n").split("\t")
+    fh.seek(0)
+    dtypes = {header[0]: str}
+    for col in NUMERIC_LOG_RATIO_COLUMNS:
+        if col in header[1:]:
+            dtypes[col] = np.float64
+    return pd.read_csv(
+        fh,
+        sep="\t",
+        header=0,
+        index_col=0,
+        dtype=dtypes,
+        skiprows=get_q2_comment_lines(fh),
+    )
 
 
 @plugin.register_transformer
@@ -9,6 +9,7 @@ import logging
 import q2templates
 from qurro.generate import process_and_generate
 from qurro._df_utils import escape_columns
+from qurro._profile_utils import StageProfiler
 
 
 def create_q2_visualization(
@@ -19,7 +20,9 @@ def create_q2_visualization(
     sample_metadata,
     feature_metadata,
     extreme_feature_count,
+    count_format,
     debug,
+    profile,
 ):
 
     # Same thing as in the standalone version of Qurro -- only show debug
@@ -27,32 +30,47 @@ def create_q2_visualization(
     # inspired by https://stackoverflow.com/a/14098306/10730311.
     if debug:
         logging.basicConfig(level=logging.DEBUG)
+    profiler = StageProfiler(enabled=profile)
     logging.debug("Starting create_q2_visualization().")
-    df_feature_metadata = None
-    if feature_metadata is not None:
-        df_feature_metadata = escape_columns(
-            feature_metadata.to_dataframe(), "feature metadata"
-        )
-    df_sample_metadata = escape_columns(
-        sample_metadata.to_dataframe(), "sample metadata"
-    )
-    logging.debug("Converted metadata to DataFrames.")
+    # Make sure that tracemalloc gets stopped even if something goes wrong
+    # while generating the visualization
+    try:
+        with profiler.stage("read_metadata"):
+            df_feature_metadata = None
+            if feature_metadata is not None:
+                df_feature_metadata = feature_metadata.to_dataframe()
+            df_sample_metadata = sample_metadata.to_dataframe()
+        logging.debug("Converted metadata to DataFrames.")
 
-    feature_ranks = escape_columns(feature_ranks, "feature ranks")
+        with profiler.stage("escape"):
+            if df_feature_metadata is not None:
+                df_feature_metadata = escape_columns(
+                    df_feature_metadata, "feature metadata"
+                )
+            df_sample_metadata = escape_columns(
+                df_sample_metadata, "sample metadata"
+            )
+            feature_ranks = escape_columns(feature_ranks, "feature ranks")
 
-    index_path = process_and_generate(
-        feature_ranks,
-        rank_type,
-        df_sample_metadata,
-        table,
-        output_dir,
-        df_feature_metadata,
-        extreme_feature_count,
-    )
-    # render the visualization using q2templates.render().
-    # TODO: do we need to specify plot_name in the context in this way? I'm not
-    # sure where it is being used in the first place, honestly.
-    plot_name = output_dir.split("/")[-1]
-    q2templates.render(
-        index_path, output_dir, context={"plot_name": plot_name}
-    )
+        index_path = process_and_generate(
+            feature_ranks,
+            rank_type,
+            df_sample_metadata,
+            table,
+            output_dir,
+            df_feature_metadata,
+            extreme_feature_count,
+            count_format,
+            profiler=profiler,
+        )
+        # render the visualization using q2templates.render().
+        # TODO: do we need to specify plot_name in the context in this way?
+        # I'm not sure where it is being used in the first place, honestly.
+        plot_name = output_dir.split("/")[-1]
+        with profiler.stage("render"):
+            q2templates.render(
+                index_path, output_dir, context={"plot_name": plot_name}
+            )
+        profiler.write_report(output_dir)
+    finally:
+        profiler.stop()
@@ -20,7 +20,9 @@ def differential_plot(
     sample_metadata: qiime2.Metadata,
     feature_metadata: qiime2.Metadata = None,
     extreme_feature_count: int = None,
+    count_format: str = "json",
     debug: bool = False,
+    profile: bool = False,
 ) -> None:
     """Generates a Qurro visualization using differentials.
 
@@ -37,7 +39,9 @@ def differential_plot(
         sample_metadata,
         feature_metadata,
         extreme_feature_count,
+        count_format,
         debug,
+        profile,
     )
 
 
@@ -48,7 +52,9 @@ def loading_plot(
     sample_metadata: qiime2.Metadata,
     feature_metadata: qiime2.Metadata = None,
     extreme_feature_count: int = None,
+    count_format: str = "json",
     debug: bool = False,
+    profile: bool = False,
 ) -> None:
     """Generates a Qurro visualization using feature loadings in a biplot."""
 
@@ -60,5 +66,7 @@ def loading_plot(
         sample_metadata,
         feature_metadata,
         extreme_feature_count,
+        count_format,
         debug,
+        profile,
     )
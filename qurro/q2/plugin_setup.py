@@ -12,16 +12,26 @@ import importlib
 import qiime2.plugin
 import qiime2.sdk
 from qurro import __version__
-from qurro.qarcoal import qarcoal
+from qurro.qarcoal import qarcoal, qarcoal_batch
 from ._visualizers import differential_plot, loading_plot
 from qurro._parameter_descriptions import (
     TABLE,
     EXTREME_FEATURE_COUNT,
+    COUNT_FORMAT,
     DEBUG,
+    PROFILE,
     Q2_SAMPLE_METADATA,
     Q2_FEATURE_METADATA,
 )
-from qiime2.plugin import Metadata, Properties, Int, Bool, Str, Citations
+from qiime2.plugin import (
+    Metadata,
+    Properties,
+    Int,
+    Bool,
+    Str,
+    Choices,
+    Citations,
+)
 from ._type import LogRatios, LogRatiosDirFmt, LogRatiosFormat
 from qurro import _qarcoal_param_descriptions as QPD
 from q2_types.feature_data import Taxonomy
@@ -67,18 +77,22 @@ params = {
     "sample_metadata": Metadata,
     "feature_metadata": Metadata,
     "extreme_feature_count": Int,
+    "count_format": Str % Choices({"json", "binary"}),
     "debug": Bool,
+    "profile": Bool,
 }
 
 param_descs = {
     "sample_metadata": Q2_SAMPLE_METADATA,
     "feature_metadata": Q2_FEATURE_METADATA,
     "extreme_feature_count": EXTREME_FEATURE_COUNT,
+    "count_format": COUNT_FORMAT,
     "debug": DEBUG
     + (
         " Note that you'll also need to use the --verbose option to see these "
         "messages."
     ),
+    "profile": PROFILE,
 }
 
 short_desc = "Generate a Qurro visualization from feature {}s"
@@ -148,6 +162,38 @@ plugin.methods.register_function(
     name="Compute feature log-ratios based on textual taxonomy searching.",
 )
 
+qarcoal_batch_params = {
+    "queries": Metadata,
+    "samples_to_use": Metadata,
+    "allow_shared_features": Bool,
+}
+
+qarcoal_batch_param_descs = {
+    "queries": QPD.QARCOAL_QUERIES,
+    "samples_to_use": QPD.QARCOAL_SMP_TO_USE,
+    "allow_shared_features": QPD.QARCOAL_SHARED_FEAT,
+}
+
+plugin.methods.register_function(
+    function=qarcoal_batch,
+    inputs={
+        "table": FeatureTable[Frequency],
+        "taxonomy": FeatureData[Taxonomy],
+    },
+    parameters=qarcoal_batch_params,
+    parameter_descriptions=qarcoal_batch_param_descs,
+    input_descriptions={
+        "table": QPD.QARCOAL_TBL,
+        "taxonomy": QPD.QARCOAL_TAXONOMY,
+    },
+    outputs=[("qarcoal_log_ratios", SampleData[LogRatios])],
+    description=QPD.QARCOAL_BATCH_DESC,
+    name=(
+        "Compute many feature log-ratios based on textual taxonomy "
+        "searching."
+    ),
+)
+
 
 # this line may be necessary to register transformers
 # found in songbird's plugin_setup file as well as Q2 forum post
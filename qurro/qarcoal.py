@@ -12,71 +12,259 @@
 import biom
 import numpy as np
 import pandas as pd
+import scipy.sparse
 from qiime2 import Metadata
+from qurro._table_utils import get_feature_ids, get_sample_ids
 
+# Characters with special meanings in regular expressions. Search strings
+# without any of these characters just match themselves.
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
 
-def filter_and_join_taxonomy(feat_table, taxonomy, num_string, denom_string):
-    """Perform taxonomy searching and join with feature table.
+
+class TaxonomyIndex:
+    """Index of the taxonomy strings of some features, for fast searching.
+
+    Many features usually share the same Taxon, so each distinct Taxon is
+    only stored (and searched through) once.
+
+    Calling index_tokens() (which lookup() does automatically) also splits
+    each distinct Taxon into its rank-level tokens (e.g.
+    "k__Bacteria; p__Firmicutes" is split into the tokens "k__Bacteria" and
+    "p__Firmicutes") and builds a sorted inverted index of these tokens. This
+    lets us find features by these tokens without rescanning every Taxon.
+    Building this takes a few times longer than scanning through every
+    distinct Taxon once, so it's only worth it if an index is going to be
+    searched many times.
+    """
+
+    def __init__(self, feature_ids, taxonomy):
+        """Indexes the taxonomy of some features.
+
+        Parameters:
+        -----------
+            feature_ids: pd.Index of the features in the feature table. Only
+                features present in both feature_ids and the taxonomy will
+                be indexed.
+            taxonomy: pd.DataFrame of features x [Taxon, ...]
+        """
+        taxa = taxonomy["Taxon"].dropna()
+        taxa = taxa[taxa.index.isin(feature_ids)]
+        # features are kept in the same order as in the taxonomy
+        self.feature_ids = taxa.index
+        # self.taxon_codes[i] is the position in self.taxa of the Taxon of
+        # the i-th feature
+        self.taxon_codes, unique_taxa = pd.factorize(taxa)
+        self.taxa = pd.Series(unique_taxa, dtype=object)
+        self._tokens = None
+
+    def index_tokens(self):
+        """Creates the inverted index of rank-level tokens, if needed.
+
+        The sorted, distinct tokens are stored in self._tokens. The
+        occurrences of the i-th token are given by
+        self._entry_taxa[self._token_indptr[i]:self._token_indptr[i + 1]]
+        (positions in self.taxa) and the corresponding entries of
+        self._entry_levels (positions of the token within these taxa).
+        """
+        if self._tokens is not None:
+            return
+        entry_taxa = []
+        entry_levels = []
+        entry_tokens = []
+        for t, taxon in enumerate(self.taxa):
+            # non-string Taxon values are never matched by searches
+            if isinstance(taxon, str):
+                taxon_tokens = taxon.split(";")
+                entry_taxa.extend([t] * len(taxon_tokens))
+                entry_levels.extend(range(len(taxon_tokens)))
+                entry_tokens.extend(token.strip() for token in taxon_tokens)
+        token_codes, tokens = pd.factorize(
+            np.array(entry_tokens, dtype=object), sort=True
+        )
+        # group the entries by token (keeping them in order within tokens)
+        order = np.argsort(token_codes, kind="stable")
+        self._entry_taxa = np.array(entry_taxa, dtype=np.intp)[order]
+        self._entry_levels = np.array(entry_levels, dtype=np.intp)[order]
+        self._token_indptr = np.zeros(len(tokens) + 1, dtype=np.intp)
+        self._token_indptr[1:] = np.cumsum(
+            np.bincount(token_codes, minlength=len(tokens))
+        )
+        self._tokens = np.asarray(tokens, dtype=object)
+
+    def _get_features(self, taxon_mask):
+        """Returns a pd.Index of the features with the given taxa.
+
+        taxon_mask should be a boolean array with the same length as
+        self.taxa.
+        """
+        return self.feature_ids[taxon_mask[self.taxon_codes]]
+
+    def _get_features_with_tokens(self, entry_positions, level=None):
+        """Returns a pd.Index of the features with the given token entries.
+
+        If level isn't None, only entries at this level are used.
+        """
+        if level is not None:
+            entry_positions = entry_positions[
+                self._entry_levels[entry_positions] == level
+            ]
+        taxon_mask = np.zeros(len(self.taxa), dtype=bool)
+        taxon_mask[self._entry_taxa[entry_positions]] = True
+        return self._get_features(taxon_mask)
+
+    def lookup(self, token, level=None, prefix=False):
+        """Finds the features with a given rank-level token in their Taxon.
+
+        Parameters:
+        -----------
+            token: the token to look up (e.g. "g__Bacteroides"). Leading and
+                trailing whitespace doesn't matter.
+            level: if provided, only match this token at this position in
+                each Taxon (e.g. 0 for the first rank, which is usually
+                kingdom or domain). (optional)
+            prefix: if True, match all tokens starting with token rather
+                than just token itself. (optional)
+
+        Returns:
+        --------
+            features: pd.Index of matching feature IDs
+
+        This is a binary search through the sorted tokens, so it doesn't
+        scan through any Taxon values.
+        """
+        self.index_tokens()
+        token = token.strip()
+        start = np.searchsorted(self._tokens, token, side="left")
+        if prefix:
+            # every string starting with token sorts before this
+            end = np.searchsorted(
+                self._tokens, token + "\U0010ffff", side="left"
+            )
+        else:
+            end = np.searchsorted(self._tokens, token, side="right")
+        entry_positions = np.arange(
+            self._token_indptr[start], self._token_indptr[end]
+        )
+        return self._get_features_with_tokens(entry_positions, level)
+
+    def search(self, text):
+        """Finds the features whose Taxon contains a string.
+
+        This matches pandas' Series.str.contains(text): text is treated as
+        a regular expression. If text doesn't contain any regular expression
+        metacharacters, we can skip the overhead of regular expressions. And
+        if the rank-level tokens have been indexed and text can't span
+        multiple tokens (i.e. it also doesn't contain any semicolons or
+        leading or trailing whitespace), then we only need to search through
+        the distinct tokens instead of every distinct Taxon.
+
+        Returns:
+        --------
+            features: pd.Index of matching feature IDs
+        """
+        literal = REGEX_METACHARACTERS.isdisjoint(text)
+        if (
+            literal
+            and self._tokens is not None
+            and ";" not in text
+            and text == text.strip()
+        ):
+            token_positions = [
+                i for i, token in enumerate(self._tokens) if text in token
+            ]
+            entry_positions = np.concatenate(
+                [np.arange(0)]
+                + [
+                    np.arange(self._token_indptr[i], self._token_indptr[i + 1])
+                    for i in token_positions
+                ]
+            )
+            return self._get_features_with_tokens(entry_positions)
+        taxon_mask = self.taxa.str.contains(
+            text, regex=not literal, na=False
+        ).to_numpy(dtype=bool)
+        return self._get_features(taxon_mask)
+
+
+def search_taxonomy(taxonomy_index, num_string, denom_string):
+    """Find the features whose taxonomy matches the numerator/denominator.
 
     Parameters:
     -----------
-        feat_table: pd.DataFrame of features x samples
-        taxonomy: pd.DataFrame of features x [Taxon, ...]
+        taxonomy_index: TaxonomyIndex of the features in the feature table
         num_string: numerator string to search for in taxonomy
         denom_string: denominator string to search for in taxonomy
 
     Returns:
     --------
-        num_df: pd.DataFrame of numerator features x samples
-        denom_df: pd.DataFrame of denominator features x samples
+        num_features: pd.Index of numerator feature IDs
+        denom_features: pd.Index of denominator feature IDs
     """
+    num_features = taxonomy_index.search(num_string)
+    denom_features = taxonomy_index.search(denom_string)
 
-    # drop samples with total 0 features
-    # this is done here as well as later on based on samples w/o
-    # matching features because of some problems with filtering
-    # introducing NAs
-    feat_table_copy = feat_table.loc[:, (feat_table != 0).any(axis=0)]
-
-    # need to keep Taxon temporarily to match up with feature table
-    # can immediately discard non-Taxon columns
-    taxonomy = taxonomy.copy()
-    taxonomy = taxonomy[["Taxon"]]
-
-    # retain only features that are in both feature table and taxonomy
-    # rsuffix provided in unlikely case that a sample is called Taxon
-    taxonomy_joined_df = taxonomy.join(
-        feat_table_copy, how="inner", rsuffix="_q"
-    )
-
-    num_indices = taxonomy_joined_df["Taxon"].str.contains(num_string)
-    denom_indices = taxonomy_joined_df["Taxon"].str.contains(denom_string)
-
-    tax_num_df_with_extra_col = taxonomy_joined_df.loc[num_indices]
-    tax_denom_df_with_extra_col = taxonomy_joined_df.loc[denom_indices]
-
-    # We need to drop the Taxon column because we want the dfs to be numeric
-    # Also, we don't use in-place operations to prevent pandas warnings about
-    # "A value is trying to be set on a copy of a slice from a DataFrame" --
-    # see https://stackoverflow.com/a/33727690
-    tax_num_df = tax_num_df_with_extra_col.drop(columns="Taxon")
-    tax_denom_df = tax_denom_df_with_extra_col.drop(columns="Taxon")
-
-    # if _q suffix was added due to sample called Taxon, change back to Taxon
-    if "Taxon_q" in taxonomy_joined_df:
-        tax_num_df.rename(columns={"Taxon_q": "Taxon"}, inplace=True)
-        tax_denom_df.rename(columns={"Taxon_q": "Taxon"}, inplace=True)
-
-    if tax_num_df.shape[0] == 0:
-        if tax_denom_df.shape[0] == 0:
+    if len(num_features) == 0:
+        if len(denom_features) == 0:
             raise ValueError(
                 "No feature(s) found matching either numerator or "
                 "denominator string!"
             )
         else:
             raise ValueError("No feature(s) found matching numerator string!")
-    if tax_denom_df.shape[0] == 0:
+    if len(denom_features) == 0:
         raise ValueError("No feature(s) found matching denominator string!")
 
+    return num_features, denom_features
+
+
+def get_matching_features(feature_ids, taxonomy, num_string, denom_string):
+    """Find the features whose taxonomy matches the numerator/denominator.
+
+    Parameters:
+    -----------
+        feature_ids: pd.Index of the features in the feature table
+        taxonomy: pd.DataFrame of features x [Taxon, ...]
+        num_string: numerator string to search for in taxonomy
+        denom_string: denominator string to search for in taxonomy
+
+    Returns:
+    --------
+        num_features: pd.Index of numerator feature IDs
+        denom_features: pd.Index of denominator feature IDs
+
+        Only features present in both feature_ids and the taxonomy are
+        included; these are in the same order as in the taxonomy.
+    """
+    return search_taxonomy(
+        TaxonomyIndex(feature_ids, taxonomy), num_string, denom_string
+    )
+
+
+def filter_and_join_taxonomy(feat_table, taxonomy, num_string, denom_string):
+    """Perform taxonomy searching and join with feature table.
+
+    Parameters:
+    -----------
+        feat_table: pd.DataFrame of features x samples
+        taxonomy: pd.DataFrame of features x [Taxon, ...]
+        num_string: numerator string to search for in taxonomy
+        denom_string: denominator string to search for in taxonomy
+
+    Returns:
+    --------
+        num_df: pd.DataFrame of numerator features x samples
+        denom_df: pd.DataFrame of denominator features x samples
+    """
+    num_features, denom_features = get_matching_features(
+        feat_table.index, taxonomy, num_string, denom_string
+    )
+
+    # Selecting the matching features from the feature table directly (rather
+    # than joining the whole table onto the taxonomy) means that we don't
+    # have to worry about samples and taxonomy columns with the same names
+    tax_num_df = feat_table.loc[num_features]
+    tax_denom_df = feat_table.loc[denom_features]
+
     # drop columns (samples) in which no feature(s) matching string is present
     tax_num_df = tax_num_df.loc[:, (tax_num_df != 0).any(axis=0)]
     tax_denom_df = tax_denom_df.loc[:, (tax_denom_df != 0).any(axis=0)]
@@ -130,44 +318,210 @@ def qarcoal(
 
             Sample-ID    Num_Sum    Denom_Sum   log_ratio
                    S1          7           15   -0.762140
+
+    Notes:
+    ------
+        The table is never converted to a DataFrame: we only sum up the rows
+        of its sparse matrix that correspond to numerator and denominator
+        features, so this works on very large tables.
     """
 
     # biom table is features x samples
     if samples_to_use is not None:
         filt_samples = set(samples_to_use.to_dataframe().index)
-        feat_table = table.filter(filt_samples, axis="sample", inplace=False)
-        feat_table = feat_table.to_dataframe()
-    else:
-        feat_table = table.to_dataframe()
+        table = table.filter(filt_samples, axis="sample", inplace=False)
+
+    matrix = table.matrix_data
 
     # raise error if there are any negative counts in the feature table
-    if feat_table.lt(0).any().any():
+    if (matrix.data < 0).any():
         raise ValueError("Feature table has negative counts!")
 
-    tax_num_df, tax_denom_df = filter_and_join_taxonomy(
-        feat_table,
-        taxonomy,
-        num_string,
-        denom_string,
+    feature_ids = get_feature_ids(table)
+    num_features, denom_features = get_matching_features(
+        feature_ids, taxonomy, num_string, denom_string
     )
 
+    num_sums = np.asarray(
+        matrix[feature_ids.get_indexer(num_features)].sum(axis=0)
+    ).ravel()
+    denom_sums = np.asarray(
+        matrix[feature_ids.get_indexer(denom_features)].sum(axis=0)
+    ).ravel()
+
+    # keep only samples in which both numerator and denominator features are
+    # present (since there aren't any negative counts, a sum is only zero if
+    # all of the counts it sums up are zero)
+    samp_to_keep = (num_sums > 0) & (denom_sums > 0)
+    if not samp_to_keep.any():
+        raise ValueError(
+            "No samples contain both numerator and denominator features!"
+        )
+
     # if shared features are disallowed, check to make sure they don't occur
     # if allowed, can skip this step at user's risk
     if not allow_shared_features:
-        shared_features = set(tax_num_df.index) & set(tax_denom_df.index)
-        if shared_features:
+        if len(num_features.intersection(denom_features)) > 0:
             raise ValueError("Shared features between num and denom!")
 
-    tax_num_sample_sum = tax_num_df.sum(axis=0)
-    tax_denom_sample_sum = tax_denom_df.sum(axis=0)
-
-    comparison_df = pd.DataFrame.from_records(
-        [tax_num_sample_sum, tax_denom_sample_sum],
-        index=["Num_Sum", "Denom_Sum"],
-    ).T
-    comparison_df["log_ratio"] = comparison_df.apply(
-        lambda x: np.log(x.Num_Sum / x.Denom_Sum), axis=1
+    num_sums = num_sums[samp_to_keep]
+    denom_sums = denom_sums[samp_to_keep]
+    comparison_df = pd.DataFrame(
+        {
+            "Num_Sum": num_sums,
+            "Denom_Sum": denom_sums,
+            "log_ratio": np.log(num_sums / denom_sums),
+        },
+        index=pd.Index(get_sample_ids(table)[samp_to_keep], name="Sample-ID"),
     )
-    comparison_df.index.name = "Sample-ID"
 
     return comparison_df
+
+
+def qarcoal_batch(
+    table: biom.Table,
+    taxonomy: pd.DataFrame,
+    queries: Metadata,
+    samples_to_use: Metadata = None,
+    allow_shared_features: bool = False,
+) -> pd.DataFrame:
+    """Calculate sample-wise log-ratios for many taxonomy searches at once.
+
+    This is equivalent to calling qarcoal() once for each query, but the
+    table is only filtered and checked once, and the feature counts for all
+    of the queries are summed up together.
+
+    Parameters:
+    -----------
+        table: biom file with which to calculate log ratios
+        taxonomy: pd.DataFrame with taxonomy information (should have Taxon
+            column in which features will be searched)
+        queries: Q2 Metadata file describing the log-ratios to compute.
+            Each ID is the name of a log-ratio, and the num_string and
+            denom_string columns contain the numerator and denominator
+            strings to search for in taxonomy. Every query must have both
+            a num_string and a denom_string.
+        samples_to_use: Q2 Metadata file with samples to use.
+            If provided, feature table will be filtered to only consider
+            samples present in this file. (optional)
+        allow_shared_features: bool denoting handling of shared features
+            between numerator and denominator. If False, an error is raised
+            if features are shared between numerator and denominator for
+            any query. If True, will allow shared features without throwing
+            an error.
+    Returns:
+    --------
+        log_ratio_df: pd DataFrame in the form:
+
+            Sample-ID    query1       query2
+                   S1    -0.762140    1.203973
+                   S2    NaN          0.405465
+
+        A sample's log-ratio for a query is NaN if the sample doesn't
+        contain both numerator and denominator features for this query.
+        Samples without any defined log-ratios are not included.
+
+        Each query is checked in the same way (and in the same order) as
+        qarcoal() checks its inputs; if any query fails a check, an error
+        naming that query is raised.
+    """
+    queries_df = queries.to_dataframe()
+    for col in ("num_string", "denom_string"):
+        if col not in queries_df.columns:
+            raise ValueError(
+                "Queries file doesn't have a {} column.".format(col)
+            )
+    if len(queries_df.index) == 0:
+        raise ValueError("Queries file doesn't contain any queries.")
+
+    if samples_to_use is not None:
+        filt_samples = set(samples_to_use.to_dataframe().index)
+        table = table.filter(filt_samples, axis="sample", inplace=False)
+
+    matrix = table.matrix_data
+
+    # raise error if there are any negative counts in the feature table
+    if (matrix.data < 0).any():
+        raise ValueError("Feature table has negative counts!")
+
+    # Create indicator matrices of queries x features, where entry (q, f) is
+    # 1 if feature f is in the numerator (or denominator) of query q
+    feature_ids = get_feature_ids(table)
+    taxonomy_index = TaxonomyIndex(feature_ids, taxonomy)
+    # we're going to search this many times, so index its tokens
+    taxonomy_index.index_tokens()
+    num_rows, num_cols = [], []
+    denom_rows, denom_cols = [], []
+    has_shared_features = []
+    for q, (name, query) in enumerate(queries_df.iterrows()):
+        try:
+            for col in ("num_string", "denom_string"):
+                if pd.isna(query[col]):
+                    raise ValueError("No {} given!".format(col))
+            num_features, denom_features = search_taxonomy(
+                taxonomy_index,
+                str(query["num_string"]),
+                str(query["denom_string"]),
+            )
+        except ValueError as error:
+            raise ValueError('Query "{}": {}'.format(name, error))
+        has_shared_features.append(
+            len(num_features.intersection(denom_features)) > 0
+        )
+        num_positions = feature_ids.get_indexer(num_features)
+        num_rows.append(np.full(len(num_positions), q))
+        num_cols.append(num_positions)
+        denom_positions = feature_ids.get_indexer(denom_features)
+        denom_rows.append(np.full(len(denom_positions), q))
+        denom_cols.append(denom_positions)
+
+    shape = (len(queries_df.index), len(feature_ids))
+    num_indicator = _make_indicator_matrix(num_rows, num_cols, shape)
+    denom_indicator = _make_indicator_matrix(denom_rows, denom_cols, shape)
+
+    # Multiplying an indicator matrix by the table sums up the counts of
+    # each query's features in every sample (producing a matrix of
+    # queries x samples)
+    num_sums = (num_indicator @ matrix).toarray()
+    denom_sums = (denom_indicator @ matrix).toarray()
+
+    # log-ratios are only defined for samples in which both numerator and
+    # denominator features are present
+    defined = (num_sums > 0) & (denom_sums > 0)
+    # (these checks are done in the same order as in qarcoal())
+    for name, query_defined, query_has_shared_features in zip(
+        queries_df.index, defined, has_shared_features
+    ):
+        if not query_defined.any():
+            raise ValueError(
+                'Query "{}": No samples contain both numerator and '
+                "denominator features!".format(name)
+            )
+        if query_has_shared_features and not allow_shared_features:
+            raise ValueError(
+                'Query "{}": Shared features between num and '
+                "denom!".format(name)
+            )
+    log_ratios = np.full(num_sums.shape, np.nan)
+    log_ratios[defined] = np.log(num_sums[defined] / denom_sums[defined])
+
+    samp_to_keep = defined.any(axis=0)
+    log_ratio_df = pd.DataFrame(
+        log_ratios[:, samp_to_keep].T,
+        index=pd.Index(get_sample_ids(table)[samp_to_keep], name="Sample-ID"),
+        columns=queries_df.index,
+    )
+    log_ratio_df.columns.name = None
+    return log_ratio_df
+
+
+def _make_indicator_matrix(rows, cols, shape):
+    """Creates a sparse matrix with 1s at the given positions.
+
+    rows and cols should be lists of arrays of row and column positions.
+    """
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    return scipy.sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=shape
+    )
@@ -14,12 +14,15 @@ from qurro._parameter_descriptions import (
     SAMPLE_METADATA,
     FEATURE_METADATA,
     EXTREME_FEATURE_COUNT,
+    COUNT_FORMAT,
     DEBUG,
+    PROFILE,
 )
 from qurro.generate import process_and_generate
 from qurro._rank_utils import read_rank_file
 from qurro._metadata_utils import read_metadata_file
 from qurro._df_utils import escape_columns
+from qurro._profile_utils import StageProfiler
 from qurro.__init__ import __version__
 
 
@@ -56,7 +59,15 @@ from qurro.__init__ import __version__
     type=int,
     help=EXTREME_FEATURE_COUNT,
 )
+@click.option(
+    "--count-format",
+    default="json",
+    show_default=True,
+    type=click.Choice(["json", "binary"]),
+    help=COUNT_FORMAT,
+)
 @click.option("--debug", is_flag=True, help=DEBUG)
+@click.option("--profile", is_flag=True, help=PROFILE)
 @click.version_option(__version__, prog_name="Qurro")
 def plot(
     ranks: str,
@@ -65,7 +76,9 @@ def plot(
     feature_metadata: str,
     output_dir: str,
     extreme_feature_count: int,
+    count_format: str,
     debug: bool,
+    profile: bool,
 ) -> None:
     """Generates a visualization of feature rankings and log-ratios.
 
@@ -82,35 +95,51 @@ def plot(
     if debug:
         logging.basicConfig(level=logging.DEBUG)
 
+    profiler = StageProfiler(enabled=profile)
+
     logging.debug("Starting the standalone Qurro script.")
-    loaded_biom = load_table(table)
-    logging.debug("Loaded BIOM table.")
-    df_sample_metadata = escape_columns(
-        read_metadata_file(sample_metadata), "sample metadata"
-    )
-    feature_ranks, rank_type = read_rank_file(ranks)
+    # Make sure that tracemalloc gets stopped even if something goes wrong
+    # while reading the input files or generating the visualization
+    try:
+        with profiler.stage("load_table"):
+            loaded_biom = load_table(table)
+        logging.debug("Loaded BIOM table.")
+        with profiler.stage("read_sample_metadata"):
+            df_sample_metadata = escape_columns(
+                read_metadata_file(sample_metadata), "sample metadata"
+            )
+        with profiler.stage("read_ranks"):
+            feature_ranks, rank_type = read_rank_file(ranks)
 
-    df_feature_metadata = None
-    if feature_metadata is not None:
-        df_feature_metadata = escape_columns(
-            read_metadata_file(feature_metadata), "feature metadata"
-        )
-    logging.debug("Read in metadata.")
+        df_feature_metadata = None
+        if feature_metadata is not None:
+            with profiler.stage("read_feature_metadata"):
+                df_feature_metadata = escape_columns(
+                    read_metadata_file(feature_metadata), "feature metadata"
+                )
+        logging.debug("Read in metadata.")
 
-    process_and_generate(
-        feature_ranks,
-        rank_type,
-        df_sample_metadata,
-        loaded_biom,
-        output_dir,
-        df_feature_metadata,
-        extreme_feature_count,
-    )
+        process_and_generate(
+            feature_ranks,
+            rank_type,
+            df_sample_metadata,
+            loaded_biom,
+            output_dir,
+            df_feature_metadata,
+            extreme_feature_count,
+            count_format,
+            profiler=profiler,
+        )
+        report_path = profiler.write_report(output_dir)
+    finally:
+        profiler.stop()
     print(
         "Successfully generated a visualization in the folder {}.".format(
             output_dir
         )
     )
+    if report_path is not None:
+        print("Wrote a profiling report to {}.".format(report_path))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+/* This file contains code for loading and querying feature count data. This
+ * data can be written out by Qurro's python code either as a JSON object or in
+ * a binary compressed sparse row (CSR) format (see qurro/_count_utils.py);
+ * either way, it's stored in the browser in CSR format.
+ */
+define(function () {
+    // Maps the "valueType" of a binary count descriptor to the typed array
+    // constructor used to view the count data.
+    var VALUE_TYPE_TO_ARRAY = {
+        uint32: Uint32Array,
+        float64: Float64Array,
+    };
+
+    class CountStore {
+        /* Class representing a feature count table, stored in CSR format
+         * (rows are features and columns are samples).
+         *
+         * featureIDs and sampleIDs should be arrays of IDs, ordered in the
+         * same way as the rows and columns of the table. indptr, indices, and
+         * data should be array-like objects (usually typed arrays) containing
+         * the CSR row pointers, column indices, and nonzero values of the
+         * table. Column indices must be sorted within each row.
+         */
+        constructor(featureIDs, sampleIDs, indptr, indices, data) {
+            if (indptr.length !== featureIDs.length + 1) {
+                throw new Error(
+                    "Count data row pointers don't match the number of " +
+                        "features."
+                );
+            }
+            if (indices.length !== data.length) {
+                throw new Error(
+                    "Count data indices and values have different lengths."
+                );
+            }
+            this.featureIDs = featureIDs;
+            this.sampleIDs = sampleIDs;
+            this.indptr = indptr;
+            this.indices = indices;
+            this.data = data;
+
+            this.featureIndex = CountStore.makeIndex(featureIDs);
+            this.sampleIndex = CountStore.makeIndex(sampleIDs);
+        }
+
+        /* Returns a Map of each ID in an array to its position in the array.
+         */
+        static makeIndex(ids) {
+            var index = new Map();
+            for (var i = 0; i < ids.length; i++) {
+                index.set(ids[i], i);
+            }
+            return index;
+        }
+
+        /* Returns true if an object looks like a binary count descriptor (as
+         * written to main.js by qurro._count_utils.write_binary_counts()),
+         * and false otherwise (e.g. if it's a normal count JSON object).
+         */
+        static isDescriptor(countJSON) {
+            return (
+                countJSON !== undefined &&
+                countJSON !== null &&
+                typeof countJSON.qurro_count_format === "string"
+            );
+        }
+
+        /* Creates a CountStore from a binary count descriptor and an
+         * ArrayBuffer containing the contents of the binary count file.
+         *
+         * The typed arrays used are just views into the buffer, so nothing is
+         * copied here.
+         */
+        static fromBinary(descriptor, buffer) {
+            if (descriptor.qurro_count_format !== "csr") {
+                throw new Error(
+                    "Unrecognized count format: " +
+                        descriptor.qurro_count_format
+                );
+            }
+            var ValueArray = VALUE_TYPE_TO_ARRAY[descriptor.valueType];
+            if (ValueArray === undefined) {
+                throw new Error(
+                    "Unrecognized count value type: " + descriptor.valueType
+                );
+            }
+            var nnz = descriptor.nnz;
+            var data = new ValueArray(buffer, descriptor.dataOffset, nnz);
+            var indptr = new Uint32Array(
+                buffer,
+                descriptor.indptrOffset,
+                descriptor.featureIDs.length + 1
+            );
+            var indices = new Uint32Array(
+                buffer,
+                descriptor.indicesOffset,
+                nnz
+            );
+            return new CountStore(
+                descriptor.featureIDs,
+                descriptor.sampleIDs,
+                indptr,
+                indices,
+                data
+            );
+        }
+
+        /* Creates a CountStore from a count JSON object (mapping feature IDs
+         * to objects that map sample IDs to nonzero counts, as written to
+         * main.js by qurro._count_utils.sparse_count_dict()).
+         *
+         * sampleIDs should be an array of all sample IDs in the
+         * visualization; the table's columns will be in this order. (If the
+         * count JSON contains counts for any other sample IDs, these samples
+         * are added as extra columns after the ones in sampleIDs.)
+         *
+         * Falsy entries in the count JSON are treated as zero counts, and
+         * aren't stored.
+         */
+        static fromJSON(countJSON, sampleIDs) {
+            var featureIDs = Object.keys(countJSON);
+            var allSampleIDs = sampleIDs.slice();
+            var sampleIndex = CountStore.makeIndex(allSampleIDs);
+
+            // First pass: figure out how many nonzero counts each feature
+            // has, so that we know how big the typed arrays need to be
+            var indptr = new Uint32Array(featureIDs.length + 1);
+            var f, sampleCts, sid;
+            for (f = 0; f < featureIDs.length; f++) {
+                sampleCts = countJSON[featureIDs[f]];
+                indptr[f + 1] = indptr[f];
+                for (sid in sampleCts) {
+                    if (sampleCts[sid]) {
+                        indptr[f + 1]++;
+                        if (!sampleIndex.has(sid)) {
+                            sampleIndex.set(sid, allSampleIDs.length);
+                            allSampleIDs.push(sid);
+                        }
+                    }
+                }
+            }
+
+            // Second pass: fill in the column indices and values for each
+            // feature
+            var nnz = indptr[featureIDs.length];
+            var indices = new Uint32Array(nnz);
+            var data = new Float64Array(nnz);
+            var i, rowStart, sorted;
+            for (f = 0; f < featureIDs.length; f++) {
+                sampleCts = countJSON[featureIDs[f]];
+                rowStart = indptr[f];
+                i = rowStart;
+                sorted = true;
+                for (sid in sampleCts) {
+                    if (sampleCts[sid]) {
+                        indices[i] = sampleIndex.get(sid);
+                        data[i] = sampleCts[sid];
+                        if (i > rowStart && indices[i] < indices[i - 1]) {
+                            sorted = false;
+                        }
+                        i++;
+                    }
+                }
+                // Count JSONs usually list samples in the same order as the
+                // sample plot does, so this shouldn't often be needed
+                if (!sorted) {
+                    CountStore.sortRow(indices, data, rowStart, i);
+                }
+            }
+            return new CountStore(
+                featureIDs,
+                allSampleIDs,
+                indptr,
+                indices,
+                data
+            );
+        }
+
+        /* Sorts indices[start:end] (in place), and reorders data[start:end]
+         * in the same way.
+         */
+        static sortRow(indices, data, start, end) {
+            var order = [];
+            for (var i = start; i < end; i++) {
+                order.push(i);
+            }
+            order.sort(function (a, b) {
+                return indices[a] - indices[b];
+            });
+            var sortedIndices = order.map(function (p) {
+                return indices[p];
+            });
+            var sortedData = order.map(function (p) {
+                return data[p];
+            });
+            indices.set(sortedIndices, start);
+            data.set(sortedData, start);
+        }
+
+        /* Fetches the binary count file described by a descriptor and
+         * returns a Promise resolving to a CountStore of its contents.
+         *
+         * The file path in the descriptor is relative to the visualization's
+         * index.html.
+         */
+        static async load(descriptor) {
+            var response = await fetch(descriptor.file);
+            if (!response.ok) {
+                throw new Error(
+                    "Unable to load count data from " +
+                        descriptor.file +
+                        " (HTTP status " +
+                        response.status +
+                        ")."
+                );
+            }
+            var buffer = await response.arrayBuffer();
+            return CountStore.fromBinary(descriptor, buffer);
+        }
+
+        /* Returns true if a sample ID is in this table, and false otherwise.
+         */
+        hasSample(sampleID) {
+            return this.sampleIndex.has(sampleID);
+        }
+
+        /* Returns a Float64Array containing, for each sample in this table
+         * (in the same order as this.sampleIDs), the sum of the counts of
+         * the given features in that sample.
+         *
+         * This only has to look at the nonzero counts of these features, so
+         * it's a lot faster than calling getCount() for every sample and
+         * feature. Feature IDs that aren't in this table are ignored.
+         */
+        sumFeatureCounts(featureIDs) {
+            var sums = new Float64Array(this.sampleIDs.length);
+            var row, i, rowEnd;
+            for (var f = 0; f < featureIDs.length; f++) {
+                row = this.featureIndex.get(featureIDs[f]);
+                if (row !== undefined) {
+                    rowEnd = this.indptr[row + 1];
+                    for (i = this.indptr[row]; i < rowEnd; i++) {
+                        sums[this.indices[i]] += this.data[i];
+                    }
+                }
+            }
+            return sums;
+        }
+
+        /* Returns the count of a feature in a sample.
+         *
+         * If either the feature or the sample isn't in this table, or if the
+         * count of the feature in the sample is zero, this returns 0. This
+         * matches the behavior of RRVDisplay.getCount() on count JSONs.
+         */
+        getCount(featureID, sampleID) {
+            var row = this.featureIndex.get(featureID);
+            var col = this.sampleIndex.get(sampleID);
+            if (row === undefined || col === undefined) {
+                return 0;
+            }
+            // Binary search through the (sorted) column indices of this row
+            var lo = this.indptr[row];
+            var hi = this.indptr[row + 1] - 1;
+            var mid, midCol;
+            while (lo <= hi) {
+                mid = (lo + hi) >>> 1;
+                midCol = this.indices[mid];
+                if (midCol === col) {
+                    return this.data[mid];
+                } else if (midCol < col) {
+                    lo = mid + 1;
+                } else {
+                    hi = mid - 1;
+                }
+            }
+            return 0;
+        }
+    }
+
+    return { CountStore: CountStore };
+});
@@ -0,0 +1,189 @@
+/* This file contains code for summing up feature counts in a Web Worker, so
+ * that computing log-ratios for large datasets doesn't freeze the page.
+ *
+ * If a Web Worker can't be used for whatever reason, the counts are just
+ * summed up on the main thread instead.
+ */
+define(["./count_store"], function (count_store) {
+    /* This function is run inside the Web Worker. It's converted to a string
+     * (along with the CountStore class) to create the worker's code, so it
+     * can't refer to anything outside of itself besides CountStore.
+     *
+     * The worker first receives an "init" message containing count data in
+     * CSR format, and then responds to each "sumFeatureCounts" message with
+     * the summed counts of some lists of features in every sample (as
+     * Float64Arrays, the buffers of which are transferred back to the main
+     * thread rather than copied).
+     */
+    function workerMain() {
+        var countStore;
+        self.onmessage = function (event) {
+            var message = event.data;
+            if (message.type === "init") {
+                countStore = new CountStore(
+                    message.featureIDs,
+                    message.sampleIDs,
+                    message.indptr,
+                    message.indices,
+                    message.data
+                );
+            } else if (message.type === "sumFeatureCounts") {
+                var sums = message.featureIDLists.map(function (featureIDs) {
+                    return countStore.sumFeatureCounts(featureIDs);
+                });
+                self.postMessage(
+                    { requestID: message.requestID, sums: sums },
+                    sums.map(function (s) {
+                        return s.buffer;
+                    })
+                );
+            }
+        };
+    }
+
+    /* Returns a Worker running workerMain(), or null if a Worker can't be
+     * created (e.g. if this browser doesn't support Web Workers).
+     *
+     * We create the Worker from a Blob, rather than from a separate file,
+     * since browsers usually don't allow creating Workers from files when a
+     * page is opened from the local filesystem.
+     */
+    function createWorker() {
+        if (
+            typeof Worker === "undefined" ||
+            typeof Blob === "undefined" ||
+            typeof URL === "undefined"
+        ) {
+            return null;
+        }
+        var source =
+            "var CountStore = " +
+            count_store.CountStore.toString() +
+            ";\n(" +
+            workerMain.toString() +
+            ")();\n";
+        try {
+            var url = URL.createObjectURL(
+                new Blob([source], { type: "text/javascript" })
+            );
+            var worker = new Worker(url);
+            // The Worker has already loaded the URL at this point, so we can
+            // release it
+            URL.revokeObjectURL(url);
+            return worker;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    class CountWorker {
+        /* Class that sums up the counts of features in every sample of a
+         * CountStore, using a Web Worker if possible.
+         *
+         * The Worker gets its own copy of the count data, so countStore can
+         * still be used as normal on the main thread (e.g. for single-feature
+         * log-ratios, which are fast to compute anyway).
+         */
+        constructor(countStore) {
+            this.countStore = countStore;
+            this.pendingRequests = new Map();
+            this.nextRequestID = 0;
+            this.worker = createWorker();
+            if (this.worker !== null) {
+                var countWorker = this;
+                this.worker.onmessage = function (event) {
+                    countWorker.finishRequest(
+                        event.data.requestID,
+                        event.data.sums
+                    );
+                };
+                // If anything goes wrong in the Worker (e.g. the code we
+                // gave it doesn't work in this browser), just stop using it
+                this.worker.onerror = function (event) {
+                    event.preventDefault();
+                    countWorker.terminate();
+                };
+                var indptr = countStore.indptr.slice();
+                var indices = countStore.indices.slice();
+                var data = countStore.data.slice();
+                this.worker.postMessage(
+                    {
+                        type: "init",
+                        featureIDs: countStore.featureIDs,
+                        sampleIDs: countStore.sampleIDs,
+                        indptr: indptr,
+                        indices: indices,
+                        data: data,
+                    },
+                    [indptr.buffer, indices.buffer, data.buffer]
+                );
+            }
+        }
+
+        /* Returns true if this is using a Web Worker, and false if counts are
+         * being summed on the main thread.
+         */
+        usingWorker() {
+            return this.worker !== null;
+        }
+
+        /* Returns a Promise resolving to an array of Float64Arrays: one for
+         * each array of feature IDs in featureIDLists, containing the output
+         * of CountStore.sumFeatureCounts() for these feature IDs.
+         */
+        sumFeatureCounts(featureIDLists) {
+            if (this.worker === null) {
+                return Promise.resolve(this.sumOnMainThread(featureIDLists));
+            }
+            var requestID = this.nextRequestID++;
+            var countWorker = this;
+            var promise = new Promise(function (resolve) {
+                countWorker.pendingRequests.set(requestID, {
+                    featureIDLists: featureIDLists,
+                    resolve: resolve,
+                });
+            });
+            this.worker.postMessage({
+                type: "sumFeatureCounts",
+                requestID: requestID,
+                featureIDLists: featureIDLists,
+            });
+            return promise;
+        }
+
+        sumOnMainThread(featureIDLists) {
+            var countStore = this.countStore;
+            return featureIDLists.map(function (featureIDs) {
+                return countStore.sumFeatureCounts(featureIDs);
+            });
+        }
+
+        finishRequest(requestID, sums) {
+            var request = this.pendingRequests.get(requestID);
+            if (request !== undefined) {
+                this.pendingRequests.delete(requestID);
+                request.resolve(sums);
+            }
+        }
+
+        /* Stops the Web Worker (if there is one). Any requests that the
+         * Worker hadn't finished are finished on the main thread, and all
+         * future requests will be handled on the main thread.
+         */
+        terminate() {
+            if (this.worker !== null) {
+                this.worker.terminate();
+                this.worker = null;
+            }
+            var countWorker = this;
+            this.pendingRequests.forEach(function (request, requestID) {
+                countWorker.finishRequest(
+                    requestID,
+                    countWorker.sumOnMainThread(request.featureIDLists)
+                );
+            });
+        }
+    }
+
+    return { CountWorker: CountWorker };
+});
@@ -7,9 +7,23 @@
 define([
     "./feature_computation",
     "./dom_utils",
+    "./count_store",
+    "./count_worker",
     "vega",
     "vega-embed",
-], function (feature_computation, dom_utils, vega, vegaEmbed) {
+], function (
+    feature_computation,
+    dom_utils,
+    count_store,
+    count_worker,
+    vega,
+    vegaEmbed
+) {
+    // The color and width of the borders drawn around points in the sample
+    // plot when the "Draw borders" checkbox is checked.
+    var SAMPLE_BORDER_COLOR = "#000000";
+    var SAMPLE_BORDER_WIDTH = 0.5;
+
     class RRVDisplay {
         /* Class representing a display in qurro (involving two plots:
          * one bar plot containing feature ranks, and one scatterplot
@@ -49,21 +63,47 @@ define([
             // For selections of potentially many features (not via the rank plot)
             this.topFeatures = undefined;
             this.botFeatures = undefined;
-
-            // Used when looking up a feature's count.
-            this.featureCts = countJSON;
-            // Used when searching through features.
-            // Since we filtered out empty features in the python side of
-            // things, we know that every feature should be represented in the
-            // count JSON's keys.
-            this.featureIDs = Object.keys(this.featureCts);
+            // Maps arrays of features (e.g. this.topFeatures) to the summed
+            // counts of these features in each sample. Filled in by
+            // getFeatureCountSums().
+            this.featureCountSums = new WeakMap();
+            // Like featureCountSums, but maps arrays of features to Sets of
+            // their feature IDs. Filled in by getFeatureIDSet().
+            this.featureIDSets = new WeakMap();
+            // Used to sum up the counts of selected features in a Web Worker
+            // (if possible). Created by getCountWorker().
+            this.countWorker = undefined;
 
             // Just a list of all sample IDs.
             this.sampleIDs = RRVDisplay.identifySampleIDs(samplePlotJSON);
+            // Used when checking if a sample ID is valid.
+            this.sampleIDSet = new Set(this.sampleIDs);
             // Used when letting the user know how many samples are present in
             // the sample plot.
             this.sampleCount = this.sampleIDs.length;
 
+            // Used when looking up a feature's count. If the count data was
+            // written out in a binary format, countJSON just describes where
+            // to find this data; in this case, this.countStore will be set
+            // to a count_store.CountStore in makePlots(). Otherwise, we
+            // convert the count JSON to a CountStore now.
+            if (count_store.CountStore.isDescriptor(countJSON)) {
+                this.countDescriptor = countJSON;
+                this.countStore = undefined;
+                this.featureIDs = countJSON.featureIDs;
+            } else {
+                this.countDescriptor = undefined;
+                this.countStore = count_store.CountStore.fromJSON(
+                    countJSON,
+                    this.sampleIDs
+                );
+                // Used when searching through features.
+                // Since we filtered out empty features in the python side of
+                // things, we know that every feature should be represented in
+                // the count JSON's keys.
+                this.featureIDs = this.countStore.featureIDs;
+            }
+
             // Boolean variable: true if we should exclude x-axis and color
             // sample metadata fields from the exported sample plot TSV, and
             // false if we should include these fields.
@@ -123,7 +163,11 @@ define([
         async makePlots() {
             // Note that this will fail if either makePlot function fails with
             // an error. This should be ok for Qurro's purposes, though.
-            await Promise.all([this.makeRankPlot(), this.makeSamplePlot()]);
+            await Promise.all([
+                this.loadCounts(),
+                this.makeRankPlot(),
+                this.makeSamplePlot(),
+            ]);
 
             this.setUpDOM();
             document
@@ -131,6 +175,22 @@ define([
                 .classList.add("invisible");
         }
 
+        /* Loads binary count data, if this display was created using a
+         * descriptor of binary count data rather than a count JSON.
+         *
+         * If count data was provided as a JSON, this doesn't do anything.
+         */
+        async loadCounts() {
+            if (
+                this.countDescriptor !== undefined &&
+                this.countStore === undefined
+            ) {
+                this.countStore = await count_store.CountStore.load(
+                    this.countDescriptor
+                );
+            }
+        }
+
         setUpDOM() {
             // All DOM elements that we disable/enable when switching to/from
             // "boxplot mode." We disable these when in "boxplot mode" because
@@ -302,23 +362,153 @@ define([
             // Set the y-axis to say "Magnitude: [ranking title]" instead of
             // just "[rank title]". Use of "Magnitude" here is based on
             // discussion in issue #191.
-            this.rankPlotJSON.encoding.y.title =
-                this.rankType + ": " + this.rankPlotJSON.encoding.y.field;
+            this.rankPlotJSON.encoding.y.title = this.getRankPlotYTitle();
             // We can use a closure to allow callback functions to access "this"
             // (and thereby change the properties of instances of the RRVDisplay
             // class). See https://stackoverflow.com/a/5106369/10730311.
             var parentDisplay = this;
             // We specify a "custom" theme which matches with the
             // "custom"-theme tooltip CSS.
-            return vegaEmbed("#rankPlot", this.rankPlotJSON, {
+            return vegaEmbed("#rankPlot", this.getRankPlotEmbedSpec(), {
                 downloadFileName: "rank_plot",
                 tooltip: { theme: "custom" },
+                patch: RRVDisplay.patchRankPlotVegaSpec,
             }).then(function (result) {
                 parentDisplay.rankPlotView = result.view;
                 parentDisplay.addClickEventToRankPlotView(parentDisplay);
             });
         }
 
+        getRankPlotYTitle() {
+            return this.rankType + ": " + this.rankPlotJSON.encoding.y.field;
+        }
+
+        /* Returns a version of this.rankPlotJSON that can be updated in place
+         * using Vega signals (see updateRankPlotSignals()), rather than
+         * having to remake the entire rank plot.
+         *
+         * The main difference is that the current ranking is stored in a
+         * "qurro_rank_field" signal, and the ranking's values are copied
+         * into a "qurro_rank_value" field (which is what the rank plot
+         * actually sorts by and shows on the y-axis). Changing the
+         * qurro_rank_field signal thus updates the rank plot to show a
+         * different ranking. The y-axis title and the color scale's range
+         * are also stored in signals; these are hooked up to the plot by
+         * patchRankPlotVegaSpec().
+         *
+         * this.rankPlotJSON itself is left unchanged (and still describes the
+         * current state of the rank plot), so it can still be exported, etc.
+         * The datasets aren't copied.
+         */
+        getRankPlotEmbedSpec() {
+            var spec = Object.assign({}, this.rankPlotJSON);
+            spec.params = (this.rankPlotJSON.params || []).concat([
+                {
+                    name: "qurro_rank_field",
+                    value: this.rankPlotJSON.encoding.y.field,
+                },
+                {
+                    name: "qurro_rank_title",
+                    value: this.rankPlotJSON.encoding.y.title,
+                },
+                {
+                    name: "qurro_rank_colors",
+                    value: this.rankPlotJSON.encoding.color.scale.range,
+                },
+                {
+                    name: "qurro_feature_count",
+                    value: this.rankPlotJSON.datasets[
+                        this.rankPlotJSON.data.name
+                    ].length,
+                },
+            ]);
+            // NOTE that, like updateRankField(), this assumes that the rank
+            // plot only has one transform: a "rank" window transform.
+            var windowTransform = Object.assign(
+                {},
+                this.rankPlotJSON.transform[0],
+                {
+                    sort: [
+                        {
+                            field: "qurro_rank_value",
+                            order: this.rankPlotJSON.transform[0].sort[0].order,
+                        },
+                    ],
+                }
+            );
+            spec.transform = [
+                {
+                    calculate: "datum[qurro_rank_field]",
+                    as: "qurro_rank_value",
+                },
+                windowTransform,
+            ];
+            spec.encoding = Object.assign({}, this.rankPlotJSON.encoding, {
+                y: Object.assign({}, this.rankPlotJSON.encoding.y, {
+                    field: "qurro_rank_value",
+                    stack: null,
+                }),
+            });
+            return spec;
+        }
+
+        /* Given the Vega spec that Vega-Lite compiles the output of
+         * getRankPlotEmbedSpec() to, uses the qurro_rank_title and
+         * qurro_rank_colors signals for the rank plot's y-axis title and
+         * color scale range. (Vega-Lite doesn't support using signals for
+         * these, but Vega does.)
+         *
+         * This also sets the domain of the rank plot's x-axis to just be the
+         * numbers from 1 to the number of features. This is always the
+         * domain of the x-axis (since the x-axis just shows each feature's
+         * position in the current ranking), and using a fixed domain means
+         * that Vega doesn't have to recompute the domain and x-axis labels
+         * whenever the ranking changes.
+         */
+        static patchRankPlotVegaSpec(vegaSpec) {
+            var i;
+            for (i = 0; i < vegaSpec.axes.length; i++) {
+                if (
+                    vegaSpec.axes[i].scale === "y" &&
+                    typeof vegaSpec.axes[i].title === "string"
+                ) {
+                    vegaSpec.axes[i].title = { signal: "qurro_rank_title" };
+                }
+            }
+            for (i = 0; i < vegaSpec.scales.length; i++) {
+                if (vegaSpec.scales[i].name === "color") {
+                    vegaSpec.scales[i].range = { signal: "qurro_rank_colors" };
+                } else if (vegaSpec.scales[i].name === "x") {
+                    vegaSpec.scales[i].domain = {
+                        signal: "sequence(1, qurro_feature_count + 1)",
+                    };
+                }
+            }
+            return vegaSpec;
+        }
+
+        /* Updates the rank plot in place by setting the values of some of
+         * its signals (e.g. {qurro_rank_field: "Rank 1"}).
+         *
+         * This is a lot faster than remaking the rank plot, since Vega
+         * only has to re-run the parts of the plot that depend on these
+         * signals (rather than re-parsing the entire spec and re-ingesting
+         * all of the data).
+         *
+         * If the rank plot doesn't exist yet, this doesn't do anything (the
+         * signals' values will be set from this.rankPlotJSON when the rank
+         * plot is made).
+         */
+        async updateRankPlotSignals(signals) {
+            if (this.rankPlotView === undefined) {
+                return;
+            }
+            for (var signalName in signals) {
+                this.rankPlotView.signal(signalName, signals[signalName]);
+            }
+            await this.rankPlotView.runAsync();
+        }
+
         addClickEventToRankPlotView(display) {
             // Set callbacks to let users make selections in the ranks plot
             display.rankPlotView.addEventListener("click", function (e, i) {
@@ -400,6 +590,23 @@ define([
                     "#008080",
                 ]);
             }
+            this.updateSamplePlotFieldInfo();
+            this.samplePlotStructure = this.getSamplePlotStructure();
+
+            var parentDisplay = this;
+            return vegaEmbed("#samplePlot", this.getSamplePlotEmbedSpec(), {
+                downloadFileName: "sample_plot",
+                patch: RRVDisplay.patchSamplePlotVegaSpec,
+            }).then(function (result) {
+                parentDisplay.samplePlotView = result.view;
+            });
+        }
+
+        /* Updates the tooltips and filters of this.samplePlotJSON, as well as
+         * the dropped sample information shown on the page, based on the
+         * sample plot's current x-axis and color fields/encodings.
+         */
+        updateSamplePlotFieldInfo() {
             this.updateSamplePlotTooltips();
             this.updateSamplePlotFilters();
 
@@ -409,13 +616,182 @@ define([
                 this.droppedSamples,
                 this.sampleCount
             );
+        }
 
-            var parentDisplay = this;
-            return vegaEmbed("#samplePlot", this.samplePlotJSON, {
-                downloadFileName: "sample_plot",
-            }).then(function (result) {
-                parentDisplay.samplePlotView = result.view;
+        /* Returns a string describing the parts of this.samplePlotJSON that
+         * can't be changed in the sample plot using signals: the x-axis and
+         * color scale types, the mark type (i.e. whether or not boxplots are
+         * being drawn), and whether or not jitter is being used. Changing
+         * any of these changes the structure of the Vega spec that Vega-Lite
+         * generates, so the sample plot has to be remade.
+         */
+        getSamplePlotStructure() {
+            return JSON.stringify([
+                this.samplePlotJSON.encoding.x.type,
+                this.samplePlotJSON.encoding.color.type,
+                this.samplePlotJSON.mark.type,
+                this.samplePlotJSON.encoding.xOffset !== undefined,
+            ]);
+        }
+
+        /* Returns an object mapping the names of the sample plot's signals
+         * (see getSamplePlotEmbedSpec()) to their values, based on the
+         * current state of this.samplePlotJSON.
+         */
+        getSamplePlotSignals() {
+            return {
+                qurro_x_field: this.samplePlotJSON.encoding.x.field,
+                qurro_color_field: this.samplePlotJSON.encoding.color.field,
+                qurro_category_scheme: this.samplePlotJSON.config.range
+                    .category.scheme,
+                qurro_ramp_scheme: this.samplePlotJSON.config.range.ramp
+                    .scheme,
+                qurro_borders: this.samplePlotJSON.mark.stroke !== undefined,
+            };
+        }
+
+        /* Returns a version of this.samplePlotJSON that can be updated in
+         * place using Vega signals (see updateSamplePlot()), like
+         * getRankPlotEmbedSpec() does for the rank plot.
+         *
+         * The current x-axis and color fields are stored in the
+         * "qurro_x_field" and "qurro_color_field" signals, and each sample's
+         * values for these fields are copied into the "qurro_x_value" and
+         * "qurro_color_value" fields (which are what the sample plot actually
+         * uses). The color schemes and whether or not to draw borders around
+         * points are also stored in signals. (See getSamplePlotSignals().)
+         *
+         * Like with the rank plot, this.samplePlotJSON is left unchanged, and
+         * the datasets aren't copied.
+         */
+        getSamplePlotEmbedSpec() {
+            var spec = Object.assign({}, this.samplePlotJSON);
+            var signals = this.getSamplePlotSignals();
+            spec.params = (this.samplePlotJSON.params || []).concat(
+                Object.keys(signals).map(function (signalName) {
+                    return { name: signalName, value: signals[signalName] };
+                })
+            );
+            var encoding = this.samplePlotJSON.encoding;
+            spec.transform = [
+                { calculate: "datum[qurro_x_field]", as: "qurro_x_value" },
+                {
+                    calculate: "datum[qurro_color_field]",
+                    as: "qurro_color_value",
+                },
+                {
+                    filter: RRVDisplay.getSamplePlotFilterString(
+                        "datum.qurro_x_value",
+                        "datum.qurro_color_value",
+                        encoding.x.type,
+                        encoding.color.type
+                    ),
+                },
+                { calculate: "random()", as: "qurro_jitter" },
+            ];
+            spec.encoding = Object.assign({}, encoding, {
+                x: Object.assign({}, encoding.x, { field: "qurro_x_value" }),
+                color: Object.assign({}, encoding.color, {
+                    field: "qurro_color_value",
+                }),
+                tooltip: RRVDisplay.getSamplePlotTooltips(
+                    "qurro_x_value",
+                    encoding.x.type,
+                    "qurro_color_value",
+                    encoding.color.type
+                ),
             });
+            // Borders can only be drawn around points when we aren't in
+            // boxplot mode (see changeSamplePlotToBoxplot()).
+            if (this.samplePlotJSON.mark.type === "circle") {
+                var borderColor =
+                    "qurro_borders ? " +
+                    vega.stringValue(SAMPLE_BORDER_COLOR) +
+                    " : null";
+                var borderWidth =
+                    "qurro_borders ? " + SAMPLE_BORDER_WIDTH + " : 0";
+                spec.mark = Object.assign({}, this.samplePlotJSON.mark, {
+                    stroke: { expr: borderColor },
+                    strokeWidth: { expr: borderWidth },
+                });
+                spec.encoding.color.legend = {
+                    symbolStrokeColor: { expr: borderColor },
+                    symbolStrokeWidth: { expr: borderWidth },
+                };
+            }
+            return spec;
+        }
+
+        /* Given the Vega spec that Vega-Lite compiles the output of
+         * getSamplePlotEmbedSpec() to, hooks up the sample plot's axis
+         * title, legend title, tooltips, and color scheme to the
+         * corresponding signals (Vega-Lite doesn't support using signals for
+         * these, but Vega does).
+         */
+        static patchSamplePlotVegaSpec(vegaSpec) {
+            var i;
+            for (i = 0; i < vegaSpec.axes.length; i++) {
+                if (vegaSpec.axes[i].title === "qurro_x_value") {
+                    vegaSpec.axes[i].title = { signal: "qurro_x_field" };
+                }
+            }
+            var legends = vegaSpec.legends || [];
+            for (i = 0; i < legends.length; i++) {
+                if (legends[i].title === "qurro_color_value") {
+                    legends[i].title = { signal: "qurro_color_field" };
+                }
+            }
+            for (i = 0; i < vegaSpec.scales.length; i++) {
+                if (vegaSpec.scales[i].name === "color") {
+                    if (vegaSpec.scales[i].range === "category") {
+                        vegaSpec.scales[i].range = {
+                            scheme: { signal: "qurro_category_scheme" },
+                        };
+                    } else if (vegaSpec.scales[i].range === "ramp") {
+                        vegaSpec.scales[i].range = {
+                            scheme: { signal: "qurro_ramp_scheme" },
+                        };
+                    }
+                }
+            }
+            // Vega-Lite labels tooltip entries with the names of the fields
+            // they show, so we rename the qurro_x_value and qurro_color_value
+            // entries to the actual fields these values are from. (Boxplots
+            // are made up of multiple marks with different tooltips, so we
+            // have to go through all of the marks to do this.)
+            var update;
+            for (i = 0; i < vegaSpec.marks.length; i++) {
+                update = (vegaSpec.marks[i].encode || {}).update || {};
+                if (update.tooltip !== undefined && update.tooltip.signal) {
+                    update.tooltip = {
+                        signal:
+                            "qurroSampleTooltip(" +
+                            update.tooltip.signal +
+                            ", qurro_x_field, qurro_color_field)",
+                    };
+                }
+            }
+            return vegaSpec;
+        }
+
+        /* Given a tooltip object generated by Vega-Lite for the sample plot,
+         * returns a copy of it with the "qurro_x_value" and
+         * "qurro_color_value" keys renamed to the current x-axis and color
+         * fields. This is available in Vega expressions as
+         * qurroSampleTooltip().
+         */
+        static renameSamplePlotTooltipKeys(tooltip, xField, colorField) {
+            var renamed = {};
+            for (var key in tooltip) {
+                if (key === "qurro_x_value") {
+                    renamed[xField] = tooltip[key];
+                } else if (key === "qurro_color_value") {
+                    renamed[colorField] = tooltip[key];
+                } else {
+                    renamed[key] = tooltip[key];
+                }
+            }
+            return renamed;
         }
 
         /* Finds the invalid sample IDs for a given encoding, updates the
@@ -468,25 +844,30 @@ define([
             }
         }
 
-        updateRankColorMulti(rankRow) {
-            var inTop = false;
-            var inBot = false;
-            for (var i = 0; i < this.topFeatures.length; i++) {
-                if (
-                    this.topFeatures[i]["Feature ID"] === rankRow["Feature ID"]
-                ) {
-                    inTop = true;
-                    break;
-                }
-            }
-            for (var j = 0; j < this.botFeatures.length; j++) {
-                if (
-                    this.botFeatures[j]["Feature ID"] === rankRow["Feature ID"]
-                ) {
-                    inBot = true;
-                    break;
+        /* Returns a Set of the feature IDs in an array of features (e.g.
+         * this.topFeatures).
+         *
+         * Like with getFeatureCountSums(), the Set for an array of features
+         * is cached until that array is garbage collected -- so classifying
+         * every feature in the rank plot only requires creating these Sets
+         * once.
+         */
+        getFeatureIDSet(features) {
+            var featureIDSet = this.featureIDSets.get(features);
+            if (featureIDSet === undefined) {
+                featureIDSet = new Set();
+                for (var f = 0; f < features.length; f++) {
+                    featureIDSet.add(features[f]["Feature ID"]);
                 }
+                this.featureIDSets.set(features, featureIDSet);
             }
+            return featureIDSet;
+        }
+
+        updateRankColorMulti(rankRow) {
+            var featureID = rankRow["Feature ID"];
+            var inTop = this.getFeatureIDSet(this.topFeatures).has(featureID);
+            var inBot = this.getFeatureIDSet(this.botFeatures).has(featureID);
             if (inTop) {
                 if (inBot) {
                     return "Both";
@@ -507,12 +888,46 @@ define([
             // being used, and that it's a "rank" window transform. (This is a
             // reasonable assumption, since we generate the rank plot.)
             this.rankPlotJSON.transform[0].sort[0].field = newRank;
-            await this.remakeRankPlot();
+            this.rankPlotJSON.encoding.y.title = this.getRankPlotYTitle();
+            // Also reset any panning/zooming done in the rank plot, since
+            // the old ranking's y-axis domain probably won't make sense for
+            // the new ranking
+            var signals = this.getRankPlotZoomResetSignals();
+            signals.qurro_rank_field = newRank;
+            signals.qurro_rank_title = this.rankPlotJSON.encoding.y.title;
+            await this.updateRankPlotSignals(signals);
         }
 
-        async remakeRankPlot() {
-            this.destroy(true, false, false);
-            await this.makeRankPlot(true);
+        /* Returns an object mapping the names of the signals that store the
+         * rank plot's current pan/zoom extents to null.
+         *
+         * Setting these signals to null resets the rank plot's pan/zoom
+         * state (this is what Vega-Lite does when a plot with scales bound to
+         * an interval selection is double-clicked). These signals are named
+         * by Vega-Lite as [selection name]_[field name].
+         */
+        getRankPlotZoomResetSignals() {
+            return RRVDisplay.getZoomResetSignals(this.rankPlotJSON, [
+                "qurro_x",
+                "qurro_rank_value",
+            ]);
+        }
+
+        /* Returns an object mapping the names of the signals that store a
+         * plot's pan/zoom extents along the given fields to null. plotJSON
+         * should be the plot's Vega-Lite spec.
+         */
+        static getZoomResetSignals(plotJSON, fields) {
+            var signals = {};
+            var params = plotJSON.params || [];
+            for (var i = 0; i < params.length; i++) {
+                if (params[i].bind === "scales") {
+                    for (var f = 0; f < fields.length; f++) {
+                        signals[params[i].name + "_" + fields[f]] = null;
+                    }
+                }
+            }
+            return signals;
         }
 
         /* Returns a reasonable rank plot width to use for the "constant
@@ -613,11 +1028,16 @@ define([
             }
         }
 
-        /* Remakes the rank plot with the specified bar width (in pixels).
+        /* Updates the rank plot to use the specified bar width (in pixels).
          *
          * If newBarSize < 1, this also makes the barSizeWarning element
          * visible. (If newBarSize >= 1, this will make the barSizeWarning
          * element invisible.)
+         *
+         * The bar width is set using the "x_step" signal that Vega-Lite
+         * creates for the rank plot's width (based on
+         * this.rankPlotJSON.width.step), so the rank plot doesn't need to be
+         * remade.
          */
         async updateRankPlotBarSize(newBarSize, callRemakeRankPlot) {
             this.rankPlotJSON.width.step = newBarSize;
@@ -631,7 +1051,7 @@ define([
                     .classList.add("invisible");
             }
             if (callRemakeRankPlot) {
-                await this.remakeRankPlot();
+                await this.updateRankPlotSignals({ x_step: newBarSize });
             }
         }
 
@@ -779,6 +1199,10 @@ define([
             // TODO: abstract below stuff to a helper function for use by
             // regenerateFromAutoSelection() and RegenerateFromFiltering()
             this.updateFeaturesDisplays();
+            await this.loadFeatureCountSums([
+                this.topFeatures,
+                this.botFeatures,
+            ]);
             await this.updateLogRatio(
                 this.updateBalanceMulti,
                 this.updateRankColorMulti
@@ -814,6 +1238,10 @@ define([
                 botSearchType
             );
             this.updateFeaturesDisplays();
+            await this.loadFeatureCountSums([
+                this.topFeatures,
+                this.botFeatures,
+            ]);
             await this.updateLogRatio(
                 this.updateBalanceMulti,
                 this.updateRankColorMulti
@@ -952,24 +1380,27 @@ define([
         }
 
         updateSamplePlotTooltips() {
+            this.samplePlotJSON.encoding.tooltip = RRVDisplay.getSamplePlotTooltips(
+                this.samplePlotJSON.encoding.x.field,
+                this.samplePlotJSON.encoding.x.type,
+                this.samplePlotJSON.encoding.color.field,
+                this.samplePlotJSON.encoding.color.type
+            );
+        }
+
+        static getSamplePlotTooltips(xField, xType, colorField, colorType) {
             // NOTE: this should be safe from duplicate entries within
             // tooltips so long as you don't change the field titles
             // displayed.
-            this.samplePlotJSON.encoding.tooltip = [
+            return [
                 { type: "nominal", field: "Sample ID" },
                 {
                     type: "quantitative",
                     field: "qurro_balance",
                     title: "Current Natural Log-Ratio",
                 },
-                {
-                    type: this.samplePlotJSON.encoding.x.type,
-                    field: this.samplePlotJSON.encoding.x.field,
-                },
-                {
-                    type: this.samplePlotJSON.encoding.color.type,
-                    field: this.samplePlotJSON.encoding.color.field,
-                },
+                { type: xType, field: xField },
+                { type: colorType, field: colorField },
             ];
         }
 
@@ -1002,9 +1433,30 @@ define([
                 "datum[" +
                 vega.stringValue(this.samplePlotJSON.encoding.color.field) +
                 "]";
-            var xType = this.samplePlotJSON.encoding.x.type;
-            var colorType = this.samplePlotJSON.encoding.color.type;
+            var filterString = RRVDisplay.getSamplePlotFilterString(
+                datumXField,
+                datumColorField,
+                this.samplePlotJSON.encoding.x.type,
+                this.samplePlotJSON.encoding.color.type
+            );
+
+            this.samplePlotJSON.transform = [
+                { filter: filterString },
+                { calculate: "random()", as: "qurro_jitter" },
+            ];
+        }
 
+        /* Returns a Vega expression that is true for samples that can be
+         * shown in the sample plot, given expressions for a sample's x-axis
+         * and color values (e.g. 'datum["Metadata1"]') and the x-axis and
+         * color encoding types.
+         */
+        static getSamplePlotFilterString(
+            datumXField,
+            datumColorField,
+            xType,
+            colorType
+        ) {
             var filterString = "datum.qurro_balance != null";
             // NOTE: if the current x and color fields are the same, there will
             // be some redundancy in filterString. Might be worth addressing
@@ -1020,11 +1472,7 @@ define([
                 filterString +=
                     " && isFinite(toNumber(" + datumColorField + "))";
             }
-
-            this.samplePlotJSON.transform = [
-                { filter: filterString },
-                { calculate: "random()", as: "qurro_jitter" },
-            ];
+            return filterString;
         }
 
         /* Update color so that color encoding matches the x-axis encoding
@@ -1055,7 +1503,44 @@ define([
                     "colorField"
                 ).value;
             }
-            await this.remakeSamplePlot();
+            await this.updateSamplePlot();
+        }
+
+        /* Updates the sample plot to match this.samplePlotJSON.
+         *
+         * If only the x-axis/color fields, color schemes, or borders have
+         * changed since the sample plot was made, this just updates the
+         * sample plot's signals (so Vega doesn't have to re-parse anything
+         * or re-ingest the sample data). Otherwise, this remakes the sample
+         * plot (see getSamplePlotStructure()).
+         */
+        async updateSamplePlot() {
+            if (this.getSamplePlotStructure() !== this.samplePlotStructure) {
+                await this.remakeSamplePlot();
+                return;
+            }
+            this.updateSamplePlotFieldInfo();
+            var signals = this.getSamplePlotSignals();
+            // If the x-axis field changed, reset any panning/zooming done
+            // along the x-axis (the old field's domain probably won't make
+            // sense for the new field). Only quantitative x-axes can be
+            // panned/zoomed.
+            if (
+                this.samplePlotJSON.encoding.x.type === "quantitative" &&
+                signals.qurro_x_field !==
+                    this.samplePlotView.signal("qurro_x_field")
+            ) {
+                Object.assign(
+                    signals,
+                    RRVDisplay.getZoomResetSignals(this.samplePlotJSON, [
+                        "qurro_x_value",
+                    ])
+                );
+            }
+            for (var signalName in signals) {
+                this.samplePlotView.signal(signalName, signals[signalName]);
+            }
+            await this.samplePlotView.runAsync();
         }
 
         async remakeSamplePlot() {
@@ -1160,10 +1645,10 @@ define([
                 );
             }
             this.samplePlotJSON.config.range[scaleRangeType].scheme = newScheme;
-            // Only remake the sample plot if the new color scheme would effect
+            // Only update the sample plot if the new color scheme would effect
             // the currently displayed colors in the sample plot.
             if (changesCurrentPlot) {
-                await this.remakeSamplePlot();
+                await this.updateSamplePlot();
             }
         }
 
@@ -1174,7 +1659,10 @@ define([
             this.rankPlotJSON.encoding.color.scale.range[1] = newColorScheme[0];
             this.rankPlotJSON.encoding.color.scale.range[2] = newColorScheme[1];
             this.rankPlotJSON.encoding.color.scale.range[3] = newColorScheme[2];
-            await this.remakeRankPlot();
+            // Vega expects signals to be set to new objects, rather than
+            // modified versions of their old values, so we pass a copy
+            var newRange = this.rankPlotJSON.encoding.color.scale.range.slice();
+            await this.updateRankPlotSignals({ qurro_rank_colors: newRange });
         }
 
         /* Changes the scale type of either the x-axis or colorization in the
@@ -1211,7 +1699,7 @@ define([
                     "colorScale"
                 ).value;
             }
-            await this.remakeSamplePlot();
+            await this.updateSamplePlot();
         }
 
         async updateSamplePlotBoxplot() {
@@ -1235,7 +1723,7 @@ define([
             } else {
                 this.removeSamplePlotBorders();
             }
-            await this.remakeSamplePlot();
+            await this.updateSamplePlot();
         }
 
         /* Same deal, but for jitter. Can't believe this took my entire phd to
@@ -1248,7 +1736,7 @@ define([
                 } else {
                     this.removeSamplePlotJitter();
                 }
-                await this.remakeSamplePlot();
+                await this.updateSamplePlot();
             }
         }
 
@@ -1263,11 +1751,11 @@ define([
         }
 
         addSamplePlotBorders() {
-            this.samplePlotJSON.mark.stroke = "#000000";
-            this.samplePlotJSON.mark.strokeWidth = 0.5;
+            this.samplePlotJSON.mark.stroke = SAMPLE_BORDER_COLOR;
+            this.samplePlotJSON.mark.strokeWidth = SAMPLE_BORDER_WIDTH;
             this.samplePlotJSON.encoding.color.legend = {
-                symbolStrokeColor: "#000000",
-                symbolStrokeWidth: 0.5,
+                symbolStrokeColor: SAMPLE_BORDER_COLOR,
+                symbolStrokeWidth: SAMPLE_BORDER_WIDTH,
             };
         }
 
@@ -1295,8 +1783,8 @@ define([
 
         /* Changes the sample plot JSON and DOM elements to get ready for
          * switching to "boxplot mode." If callRemakeSamplePlot is truthy, this
-         * will actually call this.remakeSamplePlot(); otherwise, this won't do
-         * anything.
+         * will actually call this.updateSamplePlot() (which will remake the
+         * sample plot); otherwise, this won't do anything.
          *
          * callRemakeSamplePlot should be false if this is called in the
          * middle of remaking the sample plot, anyway -- e.g. if the user
@@ -1319,7 +1807,7 @@ define([
             dom_utils.changeElementsEnabled(this.boxplotDisabledEles, false);
             this.setColorForBoxplot();
             if (callRemakeSamplePlot) {
-                await this.remakeSamplePlot();
+                await this.updateSamplePlot();
             }
         }
 
@@ -1346,7 +1834,7 @@ define([
             // changed while boxplot mode was going on (as well as at the
             // start of boxplot mode), in setColorForBoxplot().
             if (callRemakeSamplePlot) {
-                await this.remakeSamplePlot();
+                await this.updateSamplePlot();
             }
         }
 
@@ -1364,56 +1852,24 @@ define([
         }
 
         /* Checks if a sample ID is actually supported by the count data we
-         * have. We do this by just looking at all the samples with count data
-         * for a feature ID, and checking to make sure that the sample ID is
-         * one of those.
-         *
-         * (This function makes the assumption that each feature will have the
-         * same number of samples associated with it -- this is why we only
-         * bother checking a single feature here. This is a safe assumption,
-         * since we construct the feature count JSON from a BIOM table on the
-         * python side of things.)
+         * have. Since the count data is matched with the sample plot's
+         * samples on the python side of things, we just check that the
+         * sample ID is one of the sample plot's samples (using a Set, so this
+         * doesn't have to scan through all of the sample IDs).
          */
         validateSampleID(sampleID) {
-            if (!this.sampleIDs.includes(sampleID)) {
+            if (!this.sampleIDSet.has(sampleID)) {
                 throw new Error("Invalid sample ID: " + sampleID);
             }
         }
 
-        /* Gets count data from the featureCts object. This uses a sparse
-         * storage method, so only samples with a nonzero count for a given
-         * feature are contained in that feature's entry.
-         *
-         * So, if the "entry" for a sample for a feature in featureCts is falsy
-         * (i.e. undefined, but could also be false, 0, "", null, or NaN --
-         * none of these should ever occur in the count JSON but if they do
-         * that should also be indicative of a zero count [1]), then we
-         * consider that sample's count to be 0. Otherwise, we just return the
-         * entry.
+        /* Gets the count of a feature in a sample from this.countStore.
          *
-         * [1] See https://developer.mozilla.org/en-US/docs/Glossary/Truthy
+         * The count data is stored sparsely, so only nonzero counts are
+         * actually stored; if a count isn't stored, it's zero.
          */
         getCount(featureID, sampleID) {
-            var putativeCount = this.featureCts[featureID][sampleID];
-            if (putativeCount) {
-                return putativeCount;
-            } else {
-                return 0;
-            }
-        }
-
-        /* Given a "row" of the sample plot's JSON for a sample, and given an array of
-         * features, return the sum of the sample's abundances for those particular features.
-         * TODO: add option to do log geometric means
-         */
-        sumAbundancesForSampleFeatures(sampleRow, features) {
-            var sampleID = sampleRow["Sample ID"];
-            this.validateSampleID(sampleID);
-            var abundance = 0;
-            for (var t = 0; t < features.length; t++) {
-                abundance += this.getCount(features[t]["Feature ID"], sampleID);
-            }
-            return abundance;
+            return this.countStore.getCount(featureID, sampleID);
         }
 
         /* Use abundance data to compute the new log-ratio ("balance") values of
@@ -1436,23 +1892,103 @@ define([
             return feature_computation.computeBalance(topCt, botCt);
         }
 
+        /* Returns an array of the feature IDs in an array of features. */
+        static getFeatureIDs(features) {
+            var featureIDs = [];
+            for (var f = 0; f < features.length; f++) {
+                featureIDs.push(features[f]["Feature ID"]);
+            }
+            return featureIDs;
+        }
+
+        /* Returns a Float64Array of the summed counts of an array of features
+         * (e.g. this.topFeatures) in every sample, ordered by the samples'
+         * positions in this.countStore.
+         *
+         * Computing these sums requires going through all of the features'
+         * nonzero counts, so the sums for an array of features are cached
+         * until that array is garbage collected. (This means that the
+         * array shouldn't be modified after this is called on it; the
+         * code that selects features always creates new arrays, though.)
+         *
+         * If the sums for an array of features haven't been computed yet
+         * (e.g. by loadFeatureCountSums()), this computes them on the main
+         * thread.
+         */
+        getFeatureCountSums(features) {
+            var sums = this.featureCountSums.get(features);
+            if (sums === undefined) {
+                sums = this.countStore.sumFeatureCounts(
+                    RRVDisplay.getFeatureIDs(features)
+                );
+                this.featureCountSums.set(features, sums);
+            }
+            return sums;
+        }
+
+        /* Returns this display's count_worker.CountWorker, creating it if
+         * needed. (This can't be done in the constructor, since binary count
+         * data isn't loaded until makePlots() is called.)
+         */
+        getCountWorker() {
+            if (this.countWorker === undefined) {
+                this.countWorker = new count_worker.CountWorker(
+                    this.countStore
+                );
+            }
+            return this.countWorker;
+        }
+
+        /* Computes the summed counts of some arrays of features (e.g.
+         * [this.topFeatures, this.botFeatures]) in every sample, using a Web
+         * Worker if possible. This way, the main thread (and thus the page)
+         * doesn't freeze while these sums are being computed for large
+         * selections of features.
+         *
+         * The sums are cached for use by getFeatureCountSums().
+         */
+        async loadFeatureCountSums(featureArrays) {
+            var arraysToSum = [];
+            for (var a = 0; a < featureArrays.length; a++) {
+                if (
+                    !this.featureCountSums.has(featureArrays[a]) &&
+                    !arraysToSum.includes(featureArrays[a])
+                ) {
+                    arraysToSum.push(featureArrays[a]);
+                }
+            }
+            if (arraysToSum.length > 0) {
+                var sums = await this.getCountWorker().sumFeatureCounts(
+                    arraysToSum.map(RRVDisplay.getFeatureIDs)
+                );
+                for (var s = 0; s < arraysToSum.length; s++) {
+                    this.featureCountSums.set(arraysToSum[s], sums[s]);
+                }
+            }
+        }
+
         /* Like updateBalanceSingle, but considers potentially many features in the
          * numerator and denominator of the log-ratio. For log-ratios generated
          * by textual queries.
+         *
+         * Rather than summing up the counts of all of the selected features
+         * for each sample separately, this uses per-sample sums that are
+         * computed (once per selection) by getFeatureCountSums().
          */
         updateBalanceMulti(sampleRow) {
-            this.validateSampleID(sampleRow["Sample ID"]);
+            var sampleID = sampleRow["Sample ID"];
+            this.validateSampleID(sampleID);
             // NOTE: For multiple features Virus/Staphylococcus:
             // test cases in comparison to first scatterplot in Jupyter
             // Notebook: 1517, 1302.
-            var topCt = this.sumAbundancesForSampleFeatures(
-                sampleRow,
-                this.topFeatures
-            );
-            var botCt = this.sumAbundancesForSampleFeatures(
-                sampleRow,
-                this.botFeatures
-            );
+            var s = this.countStore.sampleIndex.get(sampleID);
+            if (s === undefined) {
+                // This sample doesn't have any counts, so its log-ratio is
+                // undefined
+                return null;
+            }
+            var topCt = this.getFeatureCountSums(this.topFeatures)[s];
+            var botCt = this.getFeatureCountSums(this.botFeatures)[s];
             return feature_computation.computeBalance(topCt, botCt);
         }
 
@@ -1599,6 +2135,11 @@ define([
                 dom_utils.clearDiv("samplePlot");
             }
             if (clearOtherStuff) {
+                // Stop the Web Worker used for summing counts, if present
+                if (this.countWorker !== undefined) {
+                    this.countWorker.terminate();
+                    this.countWorker = undefined;
+                }
                 // Remove the "qiimediscrete" color scheme from Vega
                 vega.scheme("qiimediscrete", undefined);
                 // Clear the bindings of bound DOM elements
@@ -1709,5 +2250,11 @@ define([
         }
     }
 
+    // Used in the sample plot's tooltips; see patchSamplePlotVegaSpec().
+    vega.expressionFunction(
+        "qurroSampleTooltip",
+        RRVDisplay.renameSamplePlotTooltipKeys
+    );
+
     return { RRVDisplay: RRVDisplay };
 });
@@ -18,6 +18,179 @@ define(["./dom_utils"], function (dom_utils) {
         }
     }
 
+    // Maps arrays of feature rows (in practice, the rank plot's dataset) to
+    // Maps of feature fields to text search indices. See getTextIndex().
+    var textIndexCache = new WeakMap();
+
+    /* Returns an index of the text-searchable values of a feature field
+     * (as computed by tryTextSearchable()) for a list of feature rows.
+     *
+     * This is an object with the following properties:
+     *
+     * values: an array of the distinct text-searchable values of this field
+     *     (there are usually a lot fewer of these than features -- e.g. many
+     *     features will share the same taxonomy string).
+     * rowValues: an Int32Array mapping the position of each feature in
+     *     featureRowList to the position of its value in "values" (or -1 if
+     *     this feature's value isn't text-searchable).
+     * valueRows: an array mapping the position of each value in "values"
+     *     to an (ascending) array of the positions of the features with this
+     *     value in featureRowList.
+     * ranks: initially null. getRanksIndex() sets this to a Map from every
+     *     separated text fragment (see textToRankArray()) present in any
+     *     value to an (ascending) array of the positions of the values
+     *     containing this fragment in "values".
+     *
+     * Indices are built the first time a feature field is searched, and
+     * cached after that. (So the features in featureRowList shouldn't be
+     * changed after calling this. This is fine for the rank plot's dataset,
+     * since the fields that can be searched through never change.) If the
+     * number of features in featureRowList changes, the index is rebuilt.
+     */
+    function getTextIndex(featureRowList, featureField) {
+        var indices = textIndexCache.get(featureRowList);
+        if (indices === undefined) {
+            indices = new Map();
+            textIndexCache.set(featureRowList, indices);
+        }
+        var index = indices.get(featureField);
+        if (
+            index !== undefined &&
+            index.rowValues.length === featureRowList.length
+        ) {
+            return index;
+        }
+
+        var values = [];
+        var valueRows = [];
+        var valueToPosition = new Map();
+        var rowValues = new Int32Array(featureRowList.length);
+        var currVal, v;
+        for (var ti = 0; ti < featureRowList.length; ti++) {
+            currVal = tryTextSearchable(featureRowList[ti][featureField]);
+            if (currVal === null) {
+                rowValues[ti] = -1;
+                continue;
+            }
+            v = valueToPosition.get(currVal);
+            if (v === undefined) {
+                v = values.length;
+                valueToPosition.set(currVal, v);
+                values.push(currVal);
+                valueRows.push([]);
+            }
+            rowValues[ti] = v;
+            valueRows[v].push(ti);
+        }
+        index = {
+            values: values,
+            rowValues: rowValues,
+            valueRows: valueRows,
+            ranks: null,
+        };
+        indices.set(featureField, index);
+        return index;
+    }
+
+    /* Sets up (if needed) and returns the "ranks" property of a text index
+     * returned by getTextIndex().
+     */
+    function getRanksIndex(index) {
+        if (index.ranks === null) {
+            var ranks = new Map();
+            var valueRanks, posting;
+            for (var v = 0; v < index.values.length; v++) {
+                valueRanks = textToRankArray(index.values[v]);
+                for (var r = 0; r < valueRanks.length; r++) {
+                    posting = ranks.get(valueRanks[r]);
+                    if (posting === undefined) {
+                        ranks.set(valueRanks[r], [v]);
+                    } else if (posting[posting.length - 1] !== v) {
+                        // (Avoid listing this value twice if it contains
+                        // this fragment multiple times)
+                        posting.push(v);
+                    }
+                }
+            }
+            index.ranks = ranks;
+        }
+        return index.ranks;
+    }
+
+    /* Returns a Uint8Array with an entry for every value in a text index:
+     * this entry is 1 if the value contains the input text, and 0 otherwise.
+     *
+     * If the input text doesn't contain any of the characters that
+     * textToRankArray() splits text at, then a value can only contain the
+     * input text if one of the value's separated text fragments contains
+     * it. Values (e.g. taxonomy strings) usually have a lot of fragments in
+     * common, so in this case we just check each distinct fragment (using
+     * getRanksIndex()) instead of every value.
+     */
+    function findValuesContaining(index, inputText) {
+        var matches = new Uint8Array(index.values.length);
+        var v;
+        if (inputText.length === 0 || /[,;\s]/.test(inputText)) {
+            for (v = 0; v < index.values.length; v++) {
+                if (index.values[v].includes(inputText)) {
+                    matches[v] = 1;
+                }
+            }
+        } else {
+            getRanksIndex(index).forEach(function (posting, rank) {
+                if (rank.includes(inputText)) {
+                    for (var p = 0; p < posting.length; p++) {
+                        matches[posting[p]] = 1;
+                    }
+                }
+            });
+        }
+        return matches;
+    }
+
+    /* Given a list of feature rows, a text index of these features, and the
+     * output of findValuesContaining() (or something like it), returns a list
+     * of the features whose value for the index's feature field is (or,
+     * if negate is truthy, isn't) marked in matches.
+     *
+     * Features without a text-searchable value are never returned. Features
+     * are returned in the same order as in featureRowList.
+     */
+    function getFeaturesWithValues(featureRowList, index, matches, negate) {
+        var filteredFeatures = [];
+        var ti, v;
+        if (negate) {
+            for (ti = 0; ti < featureRowList.length; ti++) {
+                v = index.rowValues[ti];
+                if (v >= 0 && !matches[v]) {
+                    filteredFeatures.push(featureRowList[ti]);
+                }
+            }
+            return filteredFeatures;
+        }
+        var rowPositions = [];
+        var valueCt = 0;
+        for (v = 0; v < matches.length; v++) {
+            if (matches[v]) {
+                valueCt++;
+                for (ti = 0; ti < index.valueRows[v].length; ti++) {
+                    rowPositions.push(index.valueRows[v][ti]);
+                }
+            }
+        }
+        // Each value's rows are already sorted, so we only need to sort if
+        // there are multiple matching values
+        if (valueCt > 1) {
+            rowPositions.sort(function (a, b) {
+                return a - b;
+            });
+        }
+        for (ti = 0; ti < rowPositions.length; ti++) {
+            filteredFeatures.push(featureRowList[rowPositions[ti]]);
+        }
+        return filteredFeatures;
+    }
+
     /* Given a list of feature "rows", a string of input text, and a feature
      * field, returns a list of all features that *do* or *do not* contain that
      * text in the specified feature field.
@@ -37,27 +210,13 @@ define(["./dom_utils"], function (dom_utils) {
         featureField,
         negate
     ) {
-        var filteredFeatures = [];
-        var currVal;
-        var decisionFunc;
-        if (negate) {
-            decisionFunc = function (value) {
-                return !value.includes(inputText);
-            };
-        } else {
-            decisionFunc = function (value) {
-                return value.includes(inputText);
-            };
-        }
-        for (var ti = 0; ti < featureRowList.length; ti++) {
-            currVal = tryTextSearchable(featureRowList[ti][featureField]);
-            if (currVal === null) {
-                continue;
-            } else if (decisionFunc(currVal)) {
-                filteredFeatures.push(featureRowList[ti]);
-            }
-        }
-        return filteredFeatures;
+        var index = getTextIndex(featureRowList, featureField);
+        return getFeaturesWithValues(
+            featureRowList,
+            index,
+            findValuesContaining(index, inputText),
+            negate
+        );
     }
 
     /* Given an operator ("lt", "gt", "lte", or "gte"), returns a comparison
@@ -96,9 +255,75 @@ define(["./dom_utils"], function (dom_utils) {
         }
     }
 
+    // Maps lists of feature rows to Maps of feature fields to numeric indices
+    // of these fields' values (see getNumericIndex()).
+    var numericIndexCache = new WeakMap();
+
+    /* Returns an index of the numeric values of a feature field, for use in
+     * numberBasicFilterFeatures().
+     *
+     * This is an object with two attributes: "values", a Float64Array of all
+     * of the valid numeric values of this field (as determined by
+     * dom_utils.getNumberIfValid()) sorted in ascending order, and
+     * "positions", an Int32Array containing the position in featureRowList of
+     * the feature with each of these values. Features with null or
+     * non-numeric values for this field aren't included in the index.
+     *
+     * Like getSortedOrder(), this is only computed once for a given
+     * featureRowList and featureField; after that, it's cached.
+     */
+    function getNumericIndex(featureRowList, featureField) {
+        var indices = numericIndexCache.get(featureRowList);
+        if (indices === undefined) {
+            indices = new Map();
+            numericIndexCache.set(featureRowList, indices);
+        }
+        var index = indices.get(featureField);
+        if (index === undefined || index.featureCt !== featureRowList.length) {
+            var featureCt = featureRowList.length;
+            var allValues = new Float64Array(featureCt);
+            var positions = [];
+            var currVal, currNum;
+            for (var ti = 0; ti < featureCt; ti++) {
+                currVal = featureRowList[ti][featureField];
+                // This check is basically equivalent to what
+                // RRVDisplay.getInvalidSampleIDs() does. For both sample and
+                // feature metadata values, we know that the input is either a
+                // string/number or a null value.
+                if (currVal !== null) {
+                    // currNum will either be a normal number or NaN, so we
+                    // can just test its validity with !isNaN().
+                    currNum = dom_utils.getNumberIfValid(currVal);
+                    if (!isNaN(currNum)) {
+                        allValues[ti] = currNum;
+                        positions.push(ti);
+                    }
+                }
+            }
+            positions = Int32Array.from(positions);
+            // Break ties using the positions, so that features with the same
+            // value are kept in the order they're in in featureRowList
+            positions.sort(function (a, b) {
+                return allValues[a] - allValues[b] || a - b;
+            });
+            var values = new Float64Array(positions.length);
+            for (var p = 0; p < positions.length; p++) {
+                values[p] = allValues[positions[p]];
+            }
+            index = {
+                featureCt: featureCt,
+                positions: positions,
+                values: values,
+            };
+            indices.set(featureField, index);
+        }
+        return index;
+    }
+
     /* Given a list of feature "rows", a number, a feature field, and an
      * "operator" string, returns a list of all features where the feature's
      * field value is both numeric and compares to the input number properly.
+     * The returned features are in the same order as in featureRowList.
      *
      * Valid values for "operator" are "lt", "gt", "lte", and "gte"
      * (corresponding to the comparison operators <, >, <=, and >=). Passing
@@ -108,6 +333,9 @@ define(["./dom_utils"], function (dom_utils) {
      * As an example: if the input features' field values are "asdf",
      * 3, 5, and 10, the inputNum is 6, and the operator is "lt", then this
      * will return the features with field values of 3 and 5.
+     *
+     * Rather than checking every feature, this binary searches through the
+     * sorted numeric values of this field (see getNumericIndex()).
      */
     function numberBasicFilterFeatures(
         featureRowList,
@@ -117,33 +345,35 @@ define(["./dom_utils"], function (dom_utils) {
     ) {
         // Get a comparison function based on the operator and inputNum
         var compareFunc = operatorToCompareFunc(operator, inputNum);
-        var filteredFeatures = [];
-        var currNum, currVal;
+        var index = getNumericIndex(featureRowList, featureField);
+        var values = index.values;
 
-        // Loop through every feature, checking the particular feature field's
-        // values accordingly
-        for (var ti = 0; ti < featureRowList.length; ti++) {
-            currVal = featureRowList[ti][featureField];
-            // This check is basically equivalent to what
-            // RRVDisplay.getInvalidSampleIDs() does. For both sample and
-            // feature metadata values, we know that the input is either a
-            // string/number or a null value.
-            // If this feature's field value is null, or if it isn't a valid
-            // numerical value, then we won't bother calling compareFunc on it.
-            // Otherwise, we'll try that.
-            if (currVal === null) {
-                continue;
+        // Since the values are sorted, the features that pass compareFunc are
+        // either a prefix (for "lt" and "lte") or a suffix (for "gt" and
+        // "gte") of the sorted features. Find where this prefix ends, or where
+        // this suffix starts.
+        var matchesPrefix = operator === "lt" || operator === "lte";
+        var lo = 0;
+        var hi = values.length;
+        var mid;
+        while (lo < hi) {
+            mid = (lo + hi) >>> 1;
+            if (compareFunc(values[mid]) === matchesPrefix) {
+                lo = mid + 1;
             } else {
-                // currNum will either be a normal number or NaN, so we can
-                // just test its validity with !isNaN().
-                currNum = dom_utils.getNumberIfValid(currVal);
-                // Only do the comparison if currNum isn't NaN (uses boolean
-                // short-circuiting).
-                if (!isNaN(currNum) && compareFunc(currNum)) {
-                    filteredFeatures.push(featureRowList[ti]);
-                }
+                hi = mid;
             }
         }
+        var matchingPositions = matchesPrefix
+            ? index.positions.slice(0, lo)
+            : index.positions.slice(lo);
+
+        // Put the matching features back in their original order
+        matchingPositions.sort();
+        var filteredFeatures = new Array(matchingPositions.length);
+        for (var m = 0; m < matchingPositions.length; m++) {
+            filteredFeatures[m] = featureRowList[matchingPositions[m]];
+        }
         return filteredFeatures;
     }
 
@@ -163,16 +393,17 @@ define(["./dom_utils"], function (dom_utils) {
         if (typeof text !== "string") {
             return [];
         }
-        var initialRankArray = text
-            .trim()
-            .replace(/[,;\s]/g, " ")
-            .split(" ");
-        // Filter out ""s caused by repeated commas or whitespace in the input.
-        // Why we need this: "a b   c".split(" ") produces
-        // ["a", "b", "", "", "c"] and we just want ["a", "b", "c"]
-        return initialRankArray.filter(function (r) {
-            return r !== "";
-        });
+        var rankArray = text.split(/[,;\s]+/);
+        // Remove the ""s caused by separators at the start or end of the
+        // text: e.g. " a;b;".split(/[,;\s]+/) produces ["", "a", "b", ""] and
+        // we just want ["a", "b"]
+        if (rankArray[rankArray.length - 1] === "") {
+            rankArray.pop();
+        }
+        if (rankArray[0] === "") {
+            rankArray.shift();
+        }
+        return rankArray;
     }
 
     /* Returns true if arrayA and arrayB share at least one element.
@@ -206,34 +437,31 @@ define(["./dom_utils"], function (dom_utils) {
      * First, we throw the input text through textToRankArray() above to
      * get a list of separated text fragments in the input.
      *
-     * Next, we go through the features one-by-one. Each feature's value for
-     * the specified feature field will be split up using
-     * textToRankArray(). We then search for exact matches (not just
-     * "does this contain the input text," like in textFilterFeatures(), but
-     * "is this exactly equal to the input text?"), and return a list of
-     * all features where at least one separated text fragment matched the
-     * input text fragment(s).
+     * Next, we look up the features whose values for the specified feature
+     * field, when split up using textToRankArray(), contain an exact match
+     * (not just "does this contain the input text," like in
+     * textFilterFeatures(), but "is this exactly equal to the input text?")
+     * for at least one of the input text fragment(s). Features without a
+     * text-searchable value for this field are never matched.
      */
     function rankFilterFeatures(featureRowList, inputText, featureField) {
         var inputRankArray = textToRankArray(inputText);
         if (inputRankArray.length <= 0) {
             return [];
         }
-        var ranksOfFeatureMetadata;
-        var filteredFeatures = [];
-        for (var ti = 0; ti < featureRowList.length; ti++) {
-            // If the current feature field value is null / otherwise not
-            // text-searchable, tryTextSearchable() returns null (which will cause
-            // textToRankArray() to return [], which will cause
-            // existsIntersection() to return false quickly).
-            ranksOfFeatureMetadata = textToRankArray(
-                tryTextSearchable(featureRowList[ti][featureField])
-            );
-            if (existsIntersection(ranksOfFeatureMetadata, inputRankArray)) {
-                filteredFeatures.push(featureRowList[ti]);
+        var index = getTextIndex(featureRowList, featureField);
+        var ranks = getRanksIndex(index);
+        var matches = new Uint8Array(index.values.length);
+        var posting;
+        for (var r = 0; r < inputRankArray.length; r++) {
+            posting = ranks.get(inputRankArray[r]);
+            if (posting !== undefined) {
+                for (var p = 0; p < posting.length; p++) {
+                    matches[posting[p]] = 1;
+                }
             }
         }
-        return filteredFeatures;
+        return getFeaturesWithValues(featureRowList, index, matches, false);
     }
 
     /* Assumes the text is all lowercase.
@@ -268,23 +496,18 @@ define(["./dom_utils"], function (dom_utils) {
         if (textParts.length <= 0) {
             return [];
         }
-        var filteredFeatures = [];
-        // Check all text parts (the stuff separated by ORs) as being in every
-        // featureField thing.
-        for (var ti = 0; ti < featureRowList.length; ti++) {
-            var currVal = tryTextSearchable(featureRowList[ti][featureField]);
-            if (currVal === null) {
-                continue;
-            } else {
-                for (var pi = 0; pi < textParts.length; pi++) {
-                    if (currVal.includes(textParts[pi])) {
-                        filteredFeatures.push(featureRowList[ti]);
-                        break;
-                    }
-                }
+        // Find the values containing any of the text parts (the stuff
+        // separated by ORs)
+        var index = getTextIndex(featureRowList, featureField);
+        var matches = new Uint8Array(index.values.length);
+        var partMatches;
+        for (var pi = 0; pi < textParts.length; pi++) {
+            partMatches = findValuesContaining(index, textParts[pi]);
+            for (var v = 0; v < matches.length; v++) {
+                matches[v] |= partMatches[v];
             }
         }
-        return filteredFeatures;
+        return getFeaturesWithValues(featureRowList, index, matches, false);
     }
 
     /* Returns list of feature data objects (in the rank plot JSON) based
@@ -415,55 +638,95 @@ define(["./dom_utils"], function (dom_utils) {
         }
     }
 
-    /* Returns list of "n" feature data objects from either the top or bottom
-     * side of the feature rankings.
+    // Maps arrays of feature rows (in practice, the rank plot's dataset) to
+    // Maps of ranking names to the sorted orderings of these features by
+    // these rankings. See getSortedOrder().
+    var sortedOrderCache = new WeakMap();
+
+    /* Returns an Int32Array containing the indices of the features in
+     * featureRowList, sorted in ascending order by the specified ranking.
+     * Features with the same value for this ranking are kept in the order
+     * they're in in featureRowList.
      *
-     * featureRowList is a list of feature rows (same as the other
-     * *FilterFeatures() methods), n is an integer, ranking is a feature
-     * ranking shared by every feature in featureRowList, and useTop is a
-     * boolean value.
+     * This ordering is only computed once for a given featureRowList and
+     * ranking; after that, it's cached. (So featureRowList shouldn't be
+     * reordered after calling this. This is fine for the rank plot's
+     * dataset, since nothing reorders it.)
      *
      * Throws an error if any features don't have the specified ranking.
      */
-    function extremeFilterFeatures(featureRowList, n, ranking, useTop) {
-        // Sort features by the specified ranking in featureRowList
-        var sortedFeatureRowList = featureRowList.sort(
-            // Compare features by their "ranking field" values, i.e. the
-            // literal differential or feature loading values.
-            // (...These should all explicitly be numbers, as guaranteed by our
-            // use of pd.to_numeric() in qurro.generate.gen_rank_plot().)
-            // Comparison function based on spec here (thanks MDN!) --
-            // https://developer.mozilla.org/en-US/docs/Web/JavaScript/Reference/Global_Objects/Array/sort#Description
-            function (feature1, feature2) {
-                var f1r = feature1[ranking];
-                var f2r = feature2[ranking];
-                // Basic validation to ensure that both features have this
+    function getSortedOrder(featureRowList, ranking) {
+        var orderings = sortedOrderCache.get(featureRowList);
+        if (orderings === undefined) {
+            orderings = new Map();
+            sortedOrderCache.set(featureRowList, orderings);
+        }
+        var order = orderings.get(ranking);
+        if (order === undefined || order.length !== featureRowList.length) {
+            var featureCt = featureRowList.length;
+            var values = new Float64Array(featureCt);
+            order = new Int32Array(featureCt);
+            var value;
+            for (var i = 0; i < featureCt; i++) {
+                value = featureRowList[i][ranking];
+                // Basic validation to ensure that every feature has this
                 // ranking, and that it isn't null or whatever (should never
                 // happen in practice due to validation on the python side of
-                // things, but might as well be careful)
-                if (typeof f1r !== "number" || typeof f2r !== "number") {
+                // things, but might as well be careful). The ranking values
+                // should all explicitly be numbers, as guaranteed by our use
+                // of pd.to_numeric() in qurro.generate.gen_rank_plot().
+                if (typeof value !== "number") {
                     throw new Error(
                         ranking +
                             " ranking not present and/or numeric for all features"
                     );
                 }
-                if (f1r < f2r) {
-                    return -1;
-                } else if (f1r > f2r) {
-                    return 1;
-                } else {
-                    return 0;
-                }
+                values[i] = value;
+                order[i] = i;
             }
-        );
-        var featureCt = featureRowList.length;
-        if (useTop) {
-            // get top n features for the given ranking
-            return sortedFeatureRowList.slice(featureCt - n);
-        } else {
-            // get bottom n features for the given ranking
-            return sortedFeatureRowList.slice(0, n);
+            // Sorting the indices (rather than the feature rows themselves)
+            // means that we don't modify featureRowList. Breaking ties using
+            // the indices keeps this sort stable.
+            order.sort(function (a, b) {
+                return values[a] - values[b] || a - b;
+            });
+            orderings.set(ranking, order);
+        }
+        return order;
+    }
+
+    /* Returns list of "n" feature data objects from either the top or bottom
+     * side of the feature rankings. The returned features are sorted in
+     * ascending order by the ranking.
+     *
+     * featureRowList is a list of feature rows (same as the other
+     * *FilterFeatures() methods), n is an integer, ranking is a feature
+     * ranking shared by every feature in featureRowList, and useTop is a
+     * boolean value.
+     *
+     * If n is greater than the number of features in featureRowList, all of
+     * the features are returned.
+     *
+     * featureRowList isn't modified. (The sorting is done once per ranking
+     * by getSortedOrder(), so after that this just takes O(n) time.)
+     *
+     * Throws an error if any features don't have the specified ranking.
+     */
+    function extremeFilterFeatures(featureRowList, n, ranking, useTop) {
+        var order = getSortedOrder(featureRowList, ranking);
+        var featureCt = order.length;
+        // If n is larger than the number of features, just return all of the
+        // features (e.g. "Literal Top" searches for more features than there
+        // are)
+        n = Math.min(n, featureCt);
+        // Get either the top n or bottom n features for the given ranking
+        var start = useTop ? featureCt - n : 0;
+        var end = useTop ? featureCt : n;
+        var extremeFeatures = new Array(end - start);
+        for (var i = start; i < end; i++) {
+            extremeFeatures[i - start] = featureRowList[order[i]];
         }
+        return extremeFeatures;
     }
 
     /* We set the balance for samples with an abundance of <= 0 in either
@@ -487,6 +750,9 @@ define(["./dom_utils"], function (dom_utils) {
     return {
         filterFeatures: filterFeatures,
         extremeFilterFeatures: extremeFilterFeatures,
+        getSortedOrder: getSortedOrder,
+        getTextIndex: getTextIndex,
+        getNumericIndex: getNumericIndex,
         computeBalance: computeBalance,
         textToRankArray: textToRankArray,
         operatorToCompareFunc: operatorToCompareFunc,
@@ -1,3 +1,3 @@
 var rankPlotJSON = {};
-var asdfsamplePlotJSON = {"test2": "s"};
-var asdfcountJSON = {"test3": "c"};
+var asdfsamplePlotJSON = {"test2":"s"};
+var asdfcountJSON = {"test3":"c"};
@@ -0,0 +1,174 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from pytest import raises
+from click.testing import CliRunner
+import qurro.scripts._plot as rrvp
+from qurro._count_utils import (
+    sparse_count_dict,
+    write_binary_counts,
+    get_count_value_type,
+)
+from qurro._json_utils import get_jsons
+from qurro.tests.test_df_utils import get_test_data
+
+
+def read_binary_counts(descriptor, output_dir):
+    """Reads a binary count file back in as a dense feature x sample array."""
+    with open(os.path.join(output_dir, descriptor["file"]), "rb") as bf:
+        buf = bf.read()
+    nnz = descriptor["nnz"]
+    num_features = len(descriptor["featureIDs"])
+    value_dtype = "<u4" if descriptor["valueType"] == "uint32" else "<f8"
+    data = np.frombuffer(
+        buf, dtype=value_dtype, count=nnz, offset=descriptor["dataOffset"]
+    )
+    indptr = np.frombuffer(
+        buf,
+        dtype="<u4",
+        count=num_features + 1,
+        offset=descriptor["indptrOffset"],
+    )
+    indices = np.frombuffer(
+        buf, dtype="<u4", count=nnz, offset=descriptor["indicesOffset"]
+    )
+    assert descriptor["indicesOffset"] + (4 * nnz) == len(buf)
+    return scipy.sparse.csr_matrix(
+        (data, indices, indptr),
+        shape=(num_features, len(descriptor["sampleIDs"])),
+    ).toarray()
+
+
+def test_get_count_value_type():
+    assert get_count_value_type(np.array([0, 1, 2, 5.0])) == "uint32"
+    assert get_count_value_type(np.array([1, 2**32 - 1])) == "uint32"
+    assert get_count_value_type(np.array([1, 2**32])) == "float64"
+    assert get_count_value_type(np.array([1, 2.5])) == "float64"
+    assert get_count_value_type(np.array([-1, 2])) == "float64"
+    assert get_count_value_type(np.array([])) == "float64"
+
+
+def test_sparse_count_dict():
+    table, metadata, ranks = get_test_data()
+    # Make a few more entries zero, including an entire feature
+    table.loc["F2"] = 0
+    table.loc["F3", "Sample1"] = 0
+    sdf = table.astype(pd.SparseDtype(float, 0))
+    scd = sparse_count_dict(sdf.sparse.to_coo(), sdf.index, sdf.columns)
+    assert scd == {
+        feature_id: {
+            sample_id: count
+            for sample_id, count in sample_counts.items()
+            if count != 0
+        }
+        for feature_id, sample_counts in table.T.to_dict().items()
+    }
+    assert scd["F2"] == {}
+    assert "Sample1" not in scd["F3"]
+    assert list(scd.keys()) == list(table.index)
+
+
+def test_sparse_count_dict_types():
+    """Checks that counts and IDs are normal python objects, so that they
+    can be serialized as JSON without issue.
+    """
+    scd = sparse_count_dict(
+        scipy.sparse.coo_matrix(np.array([[0, 1.5], [2, 0]])),
+        ["F1", "F2"],
+        pd.Index(["S1", "S2"]),
+    )
+    assert scd == {"F1": {"S2": 1.5}, "F2": {"S1": 2}}
+    assert type(scd["F1"]["S2"]) is float
+    assert type(scd["F2"]["S1"]) is float
+
+
+def test_write_binary_counts_integer(tmp_path):
+    dense = np.array([[0, 3, 0, 1], [2, 0, 0, 0], [0, 0, 0, 7]])
+    # Include an explicitly stored zero, which should be ignored
+    coo = scipy.sparse.coo_matrix(
+        ([3, 1, 2, 7, 0], ([0, 0, 1, 2, 2], [1, 3, 0, 3, 2])), shape=(3, 4)
+    )
+    d = write_binary_counts(
+        coo, ["F1", "F2", "F3"], ["S1", "S2", "S3", "S4"], str(tmp_path)
+    )
+    assert d["qurro_count_format"] == "csr"
+    assert d["file"] == "counts.bin"
+    assert d["featureIDs"] == ["F1", "F2", "F3"]
+    assert d["sampleIDs"] == ["S1", "S2", "S3", "S4"]
+    assert d["valueType"] == "uint32"
+    assert d["nnz"] == 4
+    assert d["dataOffset"] == 0
+    assert d["indptrOffset"] == 16
+    assert d["indicesOffset"] == 32
+    assert np.array_equal(read_binary_counts(d, str(tmp_path)), dense)
+
+
+def test_write_binary_counts_float(tmp_path):
+    dense = np.array([[0.5, 0], [0, 0], [1e-10, 3]])
+    d = write_binary_counts(
+        scipy.sparse.csr_matrix(dense), ["a", "b", "c"], [1, 2], str(tmp_path)
+    )
+    assert d["valueType"] == "float64"
+    assert d["sampleIDs"] == ["1", "2"]
+    # Row pointers should start right after the 3 8-byte counts
+    assert d["indptrOffset"] == 24
+    assert np.array_equal(read_binary_counts(d, str(tmp_path)), dense)
+
+
+def test_write_binary_counts_bad_shape(tmp_path):
+    with raises(ValueError) as exception_info:
+        write_binary_counts(
+            scipy.sparse.csr_matrix(np.ones((2, 3))),
+            ["F1", "F2"],
+            ["S1", "S2"],
+            str(tmp_path),
+        )
+    assert "doesn't match the numbers of feature and sample IDs" in str(
+        exception_info.value
+    )
+    assert not os.path.exists(os.path.join(str(tmp_path), "counts.bin"))
+
+
+def test_binary_count_format_matches_json(tmp_path):
+    """Checks that --count-format binary represents the same counts as the
+    default JSON count format.
+    """
+    in_dir = os.path.join("qurro", "tests", "input", "byrd")
+    base_args = [
+        "--ranks",
+        os.path.join(in_dir, "byrd_differentials.tsv"),
+        "--table",
+        os.path.join(in_dir, "byrd_skin_table.biom"),
+        "--sample-metadata",
+        os.path.join(in_dir, "byrd_metadata.txt"),
+    ]
+    json_dir = str(tmp_path / "json")
+    bin_dir = str(tmp_path / "binary")
+    runner = CliRunner()
+    result = runner.invoke(rrvp.plot, base_args + ["--output-dir", json_dir])
+    assert result.exit_code == 0
+    result = runner.invoke(
+        rrvp.plot,
+        base_args + ["--output-dir", bin_dir, "--count-format", "binary"],
+    )
+    assert result.exit_code == 0
+
+    json_rank, json_sample, count_json = get_jsons(
+        os.path.join(json_dir, "main.js")
+    )
+    bin_rank, bin_sample, descriptor = get_jsons(
+        os.path.join(bin_dir, "main.js")
+    )
+    assert json_rank == bin_rank
+    assert json_sample == bin_sample
+    assert not os.path.exists(os.path.join(json_dir, "counts.bin"))
+
+    assert set(descriptor["featureIDs"]) == set(count_json.keys())
+    counts = read_binary_counts(descriptor, bin_dir)
+    for fi, feature_id in enumerate(descriptor["featureIDs"]):
+        nonzero = {
+            descriptor["sampleIDs"][si]: counts[fi, si]
+            for si in np.flatnonzero(counts[fi])
+        }
+        assert nonzero == count_json[feature_id]
@@ -1,19 +1,15 @@
 import pytest
-import pandas as pd
 import numpy as np
-from pandas import DataFrame, Series
-from pandas.testing import assert_frame_equal, assert_series_equal
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
 from qurro._df_utils import (
     ensure_df_headers_unique,
     validate_df,
+    fix_id,
+    escape_columns,
     replace_nan,
-    remove_empty_samples_and_features,
-    print_if_dropped,
-    match_table_and_data,
     merge_feature_metadata,
-    sparsify_count_dict,
     check_column_names,
-    add_sample_presence_count,
     vibe_check,
 )
 
@@ -127,6 +123,37 @@ def test_validate_df():
         validate_df(nonuniqueColRowDF, "Non-unique-column-and-row DF", 3, 2)
 
 
+def test_fix_id():
+    assert fix_id("abc") == "abc"
+    assert fix_id("") == ""
+    assert fix_id("a.b:c[d]e\\f") == "a_b;c(d)e|f"
+    assert fix_id("'single' \"double\"") == "single double"
+    assert fix_id("Group[T.B]") == "Group(T_B)"
+
+
+def test_escape_columns():
+    df = DataFrame(
+        [[1, 2, 3, 4]], columns=["a.b", "Group[T.B]", 5, "'quoted'"]
+    )
+    escaped_df = escape_columns(df, "test")
+    assert list(escaped_df.columns) == ["a_b", "Group(T_B)", "5", "quoted"]
+
+    # Columns should be the same as what we'd get from calling fix_id() on
+    # each column separately
+    many_cols = ["{}.{}:[{}]".format(i, i, i) for i in range(1000)]
+    df = DataFrame([range(1000)], columns=many_cols)
+    escaped_df = escape_columns(df, "test")
+    assert list(escaped_df.columns) == [fix_id(c) for c in many_cols]
+
+    # Escaping can make columns non-unique
+    df = DataFrame([[1, 2]], columns=["a.b", "a_b"])
+    with pytest.raises(ValueError) as exception_info:
+        escape_columns(df, "test")
+    assert "Columns of the test DataFrame are not unique" in str(
+        exception_info.value
+    )
+
+
 def test_replace_nan():
     """Tests replace_nan()."""
 
@@ -226,212 +253,6 @@ def get_test_data():
     return table, metadata, ranks
 
 
-def test_remove_empty_samples_and_features_samples():
-    """Tests remove_empty_samples_and_features() in the simple cases of
-    removing 0, 1, and 2 empty sample(s).
-    """
-
-    # TRY REMOVING 0 SAMPLES
-    table, metadata, ranks = get_test_data()
-    # Check that, when none of the samples are empty, nothing is changed.
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-    assert_frame_equal(ftable, table)
-    assert_frame_equal(fmetadata, metadata)
-    assert_frame_equal(franks, ranks)
-
-    # TRY REMOVING 1 SAMPLE
-    # Zero out Sample3 (it only has one count, for F1)
-    table.loc["F1", "Sample3"] = 0
-    # Check that just the one empty sample (Sample3) was removed, from both the
-    # table and the sample metadata.
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-    assert_series_equal(ftable["Sample1"], table["Sample1"])
-    assert_series_equal(ftable["Sample2"], table["Sample2"])
-    assert_series_equal(ftable["Sample4"], table["Sample4"])
-    assert "Sample3" not in ftable.columns
-    assert len(ftable.columns) == 3
-    assert len(ftable.index) == len(table.index) == 8
-
-    assert_series_equal(fmetadata.loc["Sample1"], metadata.loc["Sample1"])
-    assert_series_equal(fmetadata.loc["Sample2"], metadata.loc["Sample2"])
-    assert_series_equal(fmetadata.loc["Sample4"], metadata.loc["Sample4"])
-    assert "Sample3" not in fmetadata.index
-    assert len(fmetadata.index) == 3
-    assert len(fmetadata.columns) == len(metadata.columns) == 4
-
-    assert_frame_equal(franks, ranks)
-
-    # TRY REMOVING 2 SAMPLES
-    # Now, zero out Sample4 (it only has one count in F4)
-    table.loc["F4", "Sample4"] = 0
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-    assert_series_equal(ftable["Sample1"], table["Sample1"])
-    assert_series_equal(ftable["Sample2"], table["Sample2"])
-    assert "Sample3" not in ftable.columns
-    assert "Sample4" not in ftable.columns
-    assert len(ftable.columns) == 2
-    assert len(ftable.index) == len(table.index) == 8
-
-    assert_series_equal(fmetadata.loc["Sample1"], metadata.loc["Sample1"])
-    assert_series_equal(fmetadata.loc["Sample2"], metadata.loc["Sample2"])
-    assert "Sample3" not in fmetadata.index
-    assert "Sample4" not in fmetadata.index
-    assert len(fmetadata.index) == 2
-
-    assert_frame_equal(franks, ranks)
-
-
-def test_remove_empty_samples_and_features_features():
-    """Tests remove_empty_samples_and_features() in the simple cases of
-    removing 1 and then 2 empty feature(s).
-    """
-
-    table, metadata, ranks = get_test_data()
-    # Zero out F8
-    table.loc["F8"] = 0
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-    assert_frame_equal(fmetadata, metadata)
-    # Check that F8 was removed from the table and ranks
-
-    def check(new, old):
-        assert_frame_equal(new.iloc[0:7], old.iloc[0:7])
-        assert "F8" not in new.index
-        assert len(new.index) == 7
-
-    check(ftable, table)
-    check(franks, ranks)
-
-    # Zero out F6, also
-    table.loc["F6"] = 0
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-    assert_frame_equal(fmetadata, metadata)
-    # Check that F1 through F5 (and F7) are still the same
-
-    def check2(new, old):
-        assert_frame_equal(new.iloc[0:5], old.iloc[0:5])
-        assert_series_equal(new.loc["F7"], old.loc["F7"])
-        assert "F6" not in new.index
-        assert len(new.index) == 6
-
-    check2(ftable, table)
-    check2(franks, ranks)
-
-
-def test_remove_empty_samples_and_features_both():
-    """Tests remove_empty_samples_and_features() when both samples and features
-    are empty.
-    """
-
-    table, metadata, ranks = get_test_data()
-    # Zero out F8 and F7
-    table.loc["F8"] = 0
-    table.loc["F7"] = 0
-    # Zero out Sample2 and Sample4
-    table["Sample2"] = 0
-    table["Sample4"] = 0
-    ftable, fmetadata, franks = remove_empty_samples_and_features(
-        table, metadata, ranks
-    )
-
-    assert "F8" not in ftable.index
-    assert "F7" not in ftable.index
-    assert "F8" not in franks.index
-    assert "F7" not in franks.index
-    assert "Sample2" not in ftable.columns
-    assert "Sample4" not in ftable.columns
-    assert "Sample2" not in fmetadata.index
-    assert "Sample4" not in fmetadata.index
-    assert_frame_equal(
-        ftable, table[["Sample1", "Sample3"]].iloc[0:6], check_like=True
-    )
-    assert_frame_equal(
-        fmetadata, metadata.loc[["Sample1", "Sample3"]], check_like=True
-    )
-    assert_frame_equal(franks, ranks.iloc[0:6])
-
-
-def test_remove_empty_samples_and_features_allempty():
-    """Tests remove_empty_samples_and_features() on an empty table."""
-
-    table, metadata, ranks = get_test_data()
-    table["Sample1"] = np.zeros(len(table.index))
-    table["Sample2"] = np.zeros(len(table.index))
-    table["Sample3"] = np.zeros(len(table.index))
-    table["Sample4"] = np.zeros(len(table.index))
-    with pytest.raises(ValueError):
-        remove_empty_samples_and_features(table, metadata, ranks)
-
-
-def test_print_if_dropped(capsys):
-
-    table, metadata, ranks = get_test_data()
-
-    # Neither of these should result in anything being printed
-    print_if_dropped(table, table, 0, "feature", "table", "n/a")
-    captured = capsys.readouterr()
-    assert captured.out == ""
-
-    print_if_dropped(table, table, 1, "sample", "table", "n/a")
-    captured = capsys.readouterr()
-    assert captured.out == ""
-
-    # This should result in something, though!
-    table_f = table.drop(["F3", "F4", "F5", "F1", "F7"], axis="index")
-    print_if_dropped(table, table_f, 0, "feature", "table", "n/a")
-    captured = capsys.readouterr()
-    expected_output = (
-        "5 feature(s) in the table were not present in the n/a.\n"
-        "These feature(s) have been removed from the visualization.\n"
-    )
-    assert captured.out == expected_output
-
-    # As should this. (Check filtering against another axis.)
-    table_f = table.drop(["Sample2"], axis="columns")
-    print_if_dropped(table, table_f, 1, "sample", "table", "n/a")
-    captured = capsys.readouterr()
-    expected_output = (
-        "1 sample(s) in the table were not present in the n/a.\n"
-        "These sample(s) have been removed from the visualization.\n"
-    )
-    assert captured.out == expected_output
-
-    # Test behavior when *all* features are dropped.
-    # Should never happen -- we'd raise an error before this -- but good to
-    # check this, at least.
-    table_f = table.drop(list(table.index), axis="index")
-    print_if_dropped(table, table_f, 0, "feature", "table", "n/a")
-    captured = capsys.readouterr()
-    expected_output = (
-        "8 feature(s) in the table were not present in the n/a.\n"
-        "These feature(s) have been removed from the visualization.\n"
-    )
-    assert captured.out == expected_output
-
-    # Lastly, test behavior when everything is dropped -- i.e. this is an empty
-    # table. Should also never happen in practice.
-    # NOTE how we now modify table_f in place to make it truly empty.
-    table_f.drop(list(table_f.columns), axis="columns", inplace=True)
-    assert table_f.empty
-
-    print_if_dropped(table, table_f, 1, "sample", "table", "n/a")
-    captured = capsys.readouterr()
-    expected_output = (
-        "4 sample(s) in the table were not present in the n/a.\n"
-        "These sample(s) have been removed from the visualization.\n"
-    )
-    assert captured.out == expected_output
-
-
 def test_merge_feature_metadata():
 
     ranks = DataFrame(
@@ -486,35 +307,6 @@ def test_merge_feature_metadata():
         merge_feature_metadata(ranks, fm)
 
 
-def test_sparsify_count_dict():
-
-    # Test that it works in basic case
-    test_cts = {
-        "Feature 1": {"Sample 1": 0, "Sample 2": 3, "Sample 3": 0},
-        "Feature 2": {"Sample 1": 2, "Sample 2": 4, "Sample 3": 0},
-    }
-    assert sparsify_count_dict(test_cts) == {
-        "Feature 1": {"Sample 2": 3},
-        "Feature 2": {"Sample 1": 2, "Sample 2": 4},
-    }
-
-    # Test that it works even when the data is inherently dense (i.e. no zeros)
-    test_cts = {
-        "Feature 1": {"Sample 1": 1, "Sample 2": 3, "Sample 3": 5},
-        "Feature 2": {"Sample 1": 2, "Sample 2": 4, "Sample 3": 6},
-    }
-    assert sparsify_count_dict(test_cts) == test_cts
-
-    # Test that it works even when the data is totally sparse
-    # This should never happen, since we filter out empty features, but good to
-    # be sure
-    test_cts = {
-        "Feature 1": {"Sample 1": 0, "Sample 2": 0, "Sample 3": 0},
-        "Feature 2": {"Sample 1": 0, "Sample 2": 0, "Sample 3": 0},
-    }
-    assert sparsify_count_dict(test_cts) == {"Feature 1": {}, "Feature 2": {}}
-
-
 def test_check_column_names():
 
     _, sm, fr = get_test_data()
@@ -547,6 +339,13 @@ def test_check_column_names():
         check_column_names(sm, fr, fm)
     assert '"qurro_balance"' in str(exception_info.value)
 
+    # The sample plot computes these fields for each sample
+    for col in ("qurro_jitter", "qurro_x_value", "qurro_color_value"):
+        sm.columns = [col, "Metadata2", "Metadata3", "Metadata4"]
+        with pytest.raises(ValueError) as exception_info:
+            check_column_names(sm, fr, fm)
+        assert '"{}"'.format(col) in str(exception_info.value)
+
     # reset sample metadata columns to be sane
     sm.columns = ["Metadata1", "Metadata2", "Metadata3", "Metadata4"]
 
@@ -607,6 +406,19 @@ def test_check_column_names():
         check_column_names(sm, fr, fm)
     assert '"qurro_classification"' in str(exception_info.value)
 
+    # The rank plot computes a "qurro_rank_value" field for each feature
+    fr.columns = ["qurro_rank_value", "R2"]
+    with pytest.raises(ValueError) as exception_info:
+        check_column_names(sm, fr, fm)
+    assert '"qurro_rank_value"' in str(exception_info.value)
+
+    fr.columns = ["R1", "R2"]
+    fm.columns = ["FM1", "qurro_rank_value"]
+    with pytest.raises(ValueError) as exception_info:
+        check_column_names(sm, fr, fm)
+    assert '"qurro_rank_value"' in str(exception_info.value)
+    fm.columns = ["FM1", "FM2"]
+
     # reset feature ranking columns to be sane
     fr.columns = ["R1", "R2"]
 
@@ -660,262 +472,6 @@ def test_check_column_names():
     assert "must be distinct" in str(exception_info.value)
 
 
-def test_match_table_and_data_no_change(capsys):
-    # In basic case, nothing should change
-    table, metadata, ranks = get_test_data()
-
-    m_table, m_metadata = match_table_and_data(table, ranks, metadata)
-    # Check that table and metadata are actually equal
-    assert_frame_equal(table, m_table)
-    assert_frame_equal(metadata, m_metadata)
-    # Check that nothing was printed (i.e. no "sample/feature dropped" messages
-    # or whatever)
-    captured = capsys.readouterr()
-    assert captured.out == ""
-
-
-def test_match_table_and_data_table_extra_feature(capsys):
-    # Test case where table contains a feature that isn't in the ranks
-    table, metadata, ranks = get_test_data()
-    new_row = DataFrame(
-        [[20, 20, 20, 20]],
-        columns=table.columns,
-        index=["FeatureInTableButNotRanks"],
-    )
-    table = pd.concat([table, new_row], verify_integrity=True)
-    m_table, m_metadata = match_table_and_data(table, ranks, metadata)
-    # Only features in the ranks' index should be left in the table's index,
-    # and the table and ranks' indices should line up.
-    assert len(set(m_table.index) & set(ranks.index)) == len(ranks.index)
-    # Sanity check -- another way of verifying the above
-    assert "FeatureInTableButNotRanks" not in m_table.index
-    # Check that the matched-up fields' data wasn't altered somehow
-    assert_frame_equal(table.loc[ranks.index], m_table)
-    assert_frame_equal(metadata, m_metadata)
-    # Check that a feature-dropping message was printed
-    captured = capsys.readouterr()
-    expected_msg = (
-        "1 feature(s) in the BIOM table were not present in the feature "
-        "rankings"
-    )
-    assert expected_msg in captured.out
-
-
-def test_match_table_and_data_table_extra_sample(capsys):
-    # Test case where table contains a sample that isn't in the metadata
-    table, metadata, ranks = get_test_data()
-
-    table["SampleInTableButNotMD"] = 10
-    m_table, m_metadata = match_table_and_data(table, ranks, metadata)
-
-    assert len(set(m_table.columns) & set(m_metadata.index)) == len(
-        metadata.index
-    )
-    assert "SampleInTableButNotMD" not in m_table.columns
-    assert "SampleInTableButNotMD" not in m_metadata.index
-    # Check that the matched-up fields' data wasn't altered somehow
-    assert_frame_equal(table[metadata.index], m_table)
-    assert_frame_equal(metadata, m_metadata)
-    # Check that a message re: the sample being dropped was printed
-    captured = capsys.readouterr()
-    expected_msg = (
-        "1 sample(s) in the BIOM table were not present in the sample "
-        "metadata file"
-    )
-    assert expected_msg in captured.out
-
-
-def test_match_table_and_data_metadata_extra_sample(capsys):
-    # Test case where metadata contains a sample that isn't in the table
-    table, metadata, ranks = get_test_data()
-
-    # Add a new row to the metadata
-    new_row = DataFrame(
-        [[20, 20, 20, 20]],
-        columns=metadata.columns,
-        index=["SampleInMDButNotTable"],
-    )
-    metadata = pd.concat([metadata, new_row], verify_integrity=True)
-    m_table, m_metadata = match_table_and_data(table, ranks, metadata)
-    assert len(set(m_table.columns) & set(m_metadata.index)) == len(
-        table.columns
-    )
-    assert "SampleInMDButNotTable" not in m_table.columns
-    assert "SampleInMDButNotTable" not in m_metadata.index
-    # Check that the matched-up fields' data wasn't altered somehow
-    assert_frame_equal(table, m_table)
-    assert_frame_equal(metadata.loc[table.columns], m_metadata)
-    # Check that a message re: the sample being dropped was printed
-    captured = capsys.readouterr()
-    expected_msg = (
-        "1 sample(s) in the sample metadata file were not present in the BIOM "
-        "table"
-    )
-    assert expected_msg in captured.out
-
-
-def test_match_table_and_data_ranked_features_not_in_table():
-    # Qurro is pretty accepting for mismatched data, but if any of your ranked
-    # features aren't in the BIOM Qurro will immediately throw an error.
-    # (...because that is not a good situation.)
-    table, metadata, ranks = get_test_data()
-    new_feature_row = DataFrame([[9, 0]], columns=ranks.columns, index=["F9"])
-    ranks_modified = pd.concat([ranks, new_feature_row], verify_integrity=True)
-    with pytest.raises(ValueError) as exception_info:
-        match_table_and_data(table, ranks_modified, metadata)
-    expected_message = (
-        "Of the 9 ranked features, 1 was not present in the input BIOM table"
-    )
-    assert expected_message in str(exception_info.value)
-
-    # Try this again; verify it works with more than 1 ranked features not in
-    # the table
-    # (also, the error message should use "were" instead of "was" now :)
-    new_feature_row = DataFrame(
-        [[10, -1]], columns=ranks.columns, index=["F10"]
-    )
-    ranks_modified = pd.concat(
-        [ranks_modified, new_feature_row], verify_integrity=True
-    )
-    with pytest.raises(ValueError) as exception_info:
-        match_table_and_data(table, ranks_modified, metadata)
-    expected_message = (
-        "Of the 10 ranked features, 2 were not present in the input BIOM table"
-    )
-    assert expected_message in str(exception_info.value)
-
-
-def test_match_table_and_data_complete_sample_mismatch():
-    # Test that, if no samples are shared between the table and metadata, an
-    # error is raised.
-    table, metadata, ranks = get_test_data()
-
-    # Instead of Sample1, ... use S1, ...
-    metadata.index = ["S1", "S2", "S3", "S4"]
-    with pytest.raises(ValueError) as exception_info:
-        match_table_and_data(table, ranks, metadata)
-    expected_message = (
-        "No samples are shared between the sample metadata file and BIOM table"
-    )
-    assert expected_message in str(exception_info.value)
-
-
-def test_match_table_and_data_complex(capsys):
-    # Test the case where there are multiple sources of mismatched data:
-    # -> 1 extra feature in the table ("F9")
-    # -> 1 extra sample in the table ("Sample5")
-    # -> 1 extra sample in the metadata ("SampleM")
-    table, metadata, ranks = get_test_data()
-
-    # Add the extra feature to the table
-    new_f_row = DataFrame([[1, 2, 3, 4]], columns=table.columns, index=["F9"])
-    table = pd.concat([table, new_f_row], verify_integrity=True)
-
-    # Add the extra sample to the table
-    table["Sample5"] = 5
-
-    # Add the extra sample to the metadata
-    new_s_row = DataFrame(
-        [[4, 3, 2, 1]], columns=metadata.columns, index=["SampleM"]
-    )
-    metadata = pd.concat([metadata, new_s_row], verify_integrity=True)
-
-    # Ok, actually run the function!
-    m_table, m_metadata = match_table_and_data(table, ranks, metadata)
-    captured = capsys.readouterr()
-
-    # ...Now we can check all of the output messages. There'll be a lot.
-    expected_message_1 = (
-        "1 feature(s) in the BIOM table were not present in the feature "
-        "rankings"
-    )
-    expected_message_2 = (
-        "1 sample(s) in the BIOM table were not present in the sample "
-        "metadata file"
-    )
-    expected_message_3 = (
-        "1 sample(s) in the sample metadata file were not present in the BIOM "
-        "table"
-    )
-    assert expected_message_1 in captured.out
-    assert expected_message_2 in captured.out
-    assert expected_message_3 in captured.out
-
-
-def verify_spc_data_integrity(output_feature_data, initial_feature_data):
-    """Checks that add_sample_presence_count() doesn't change any of the
-    initially input feature_data -- it just adds a qurro_spc column, and
-    doesn't change the DF in any other way.
-    """
-    ifd_in_ofd = output_feature_data.drop("qurro_spc", axis="columns")
-    assert_frame_equal(ifd_in_ofd, initial_feature_data)
-
-
-def test_add_sample_presence_count_basic():
-
-    # NOTE: for reference, the get_test_data() table initially looks like this:
-    # "Sample1": [1, 2, 3, 4, 5, 6, 7, 8],
-    # "Sample2": [8, 7, 6, 5, 4, 3, 2, 1],
-    # "Sample3": [1, 0, 0, 0, 0, 0, 0, 0],
-    # "Sample4": [0, 0, 0, 1, 0, 0, 0, 0],
-    table, metadata, ranks = get_test_data()
-
-    # Test a basic case.
-    output_feature_data = add_sample_presence_count(ranks, table)
-    assert_series_equal(
-        output_feature_data["qurro_spc"],
-        Series([3, 2, 2, 3, 2, 2, 2, 2], index=ranks.index, name="qurro_spc"),
-    )
-    # Make sure that the underlying feature data remains the same
-    verify_spc_data_integrity(output_feature_data, ranks)
-
-
-def test_add_sample_presence_count_zeros():
-    """Checks the case when some features aren't present in any samples."""
-
-    table, metadata, ranks = get_test_data()
-
-    # Test 1: zero out all counts for feature F3
-    table.loc["F3"] = 0
-    output_feature_data = add_sample_presence_count(ranks, table)
-    assert_series_equal(
-        output_feature_data["qurro_spc"],
-        Series([3, 2, 0, 3, 2, 2, 2, 2], index=ranks.index, name="qurro_spc"),
-    )
-    verify_spc_data_integrity(output_feature_data, ranks)
-
-    # Test 2: zero out all counts
-    table.loc[:] = 0
-    ofd_2 = add_sample_presence_count(ranks, table)
-    assert_series_equal(
-        ofd_2["qurro_spc"],
-        Series([0] * 8, index=ranks.index, name="qurro_spc"),
-    )
-    verify_spc_data_integrity(ofd_2, ranks)
-
-    # Test 3: just one count for one feature
-    table.loc["F2", "Sample4"] = 1
-    ofd_3 = add_sample_presence_count(ranks, table)
-    assert_series_equal(
-        ofd_3["qurro_spc"],
-        Series([0, 1, 0, 0, 0, 0, 0, 0], index=ranks.index, name="qurro_spc"),
-    )
-    verify_spc_data_integrity(ofd_3, ranks)
-
-
-def test_add_sample_presence_count_name_error():
-    """Checks the case where the feature data already contains a column
-    called qurro_spc.
-
-    This should never happen due to check_column_names() being called, but
-    we might as well be careful.
-    """
-    table, metadata, ranks = get_test_data()
-    ranks.columns = ["Rank 0", "qurro_spc"]
-    with pytest.raises(ValueError):
-        add_sample_presence_count(ranks, table)
-
-
 def test_vibe_check_safe_range_invalid_safe_ranges():
     """Checks cases where the input range specified to vibe_check() is somehow
     invalid.
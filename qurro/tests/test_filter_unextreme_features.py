@@ -1,10 +1,10 @@
 import biom
-from numpy import arange
+from numpy import arange, array
 from pandas import DataFrame
 from pandas.testing import assert_frame_equal
 import pytest
-from qurro._rank_utils import filter_unextreme_features
-from qurro.generate import biom_table_to_sparse_df, process_input
+from qurro._rank_utils import filter_unextreme_features, top_k_mask
+from qurro.generate import process_input
 from qurro.tests.test_df_utils import get_test_data as get_test_data_2
 
 
@@ -38,7 +38,7 @@ def get_test_data():
     # ...And yeah we're actually making it into a Sparse DF because that's what
     # I changed filter_unextreme_features() to expect now.
     # (TODO: simplify this code in the future?)
-    output_table = biom_table_to_sparse_df(biom_table)
+    output_table = biom_table.to_dataframe(dense=False)
 
     return output_table, ranks
 
@@ -83,6 +83,115 @@ def test_filtering_basic():
     )
 
 
+def test_filtering_biom_table():
+    """Tests filter_unextreme_features() when given a biom.Table."""
+
+    table, ranks = get_test_data()
+    biom_table = biom.Table(
+        table.sparse.to_coo(), list(table.index), list(table.columns)
+    )
+    filtered_table, filtered_ranks = filter_unextreme_features(
+        biom_table, ranks, 2
+    )
+    assert isinstance(filtered_table, biom.Table)
+    # The table's features should be in the same order as the ranks'
+    assert list(filtered_table.ids(axis="observation")) == list(
+        filtered_ranks.index
+    )
+    assert list(filtered_table.ids(axis="sample")) == list(table.columns)
+    assert sorted(filtered_ranks.index) == ["F1", "F2", "F7", "F8"]
+    f2_counts = filtered_table.data("F2", axis="observation")
+    assert list(f2_counts) == [5, 6, 0, 8, 9]
+
+
+def test_filtering_table_and_ranks_in_different_orders():
+    """Tests that the right features are kept when the table's features are
+    in a different order than the ranks' features.
+    """
+    table, ranks = get_test_data()
+    biom_table = biom.Table(
+        table.sparse.to_coo(), list(table.index), list(table.columns)
+    )
+    shuffled_ranks = ranks.loc[
+        ["F5", "F8", "F3", "F1", "F6", "F2", "F7", "F4"]
+    ]
+    for t in (biom_table, table):
+        filtered_table, filtered_ranks = filter_unextreme_features(
+            t, shuffled_ranks, 2
+        )
+        assert list(filtered_ranks.index) == ["F8", "F1", "F2", "F7"]
+        if isinstance(filtered_table, biom.Table):
+            assert list(filtered_table.ids(axis="observation")) == list(
+                filtered_ranks.index
+            )
+            f2_counts = filtered_table.data("F2", axis="observation")
+        else:
+            assert list(filtered_table.index) == list(filtered_ranks.index)
+            f2_counts = filtered_table.sparse.to_dense().loc["F2"]
+        assert list(f2_counts) == [5, 6, 0, 8, 9]
+
+
+def test_process_input_ranks_in_different_order(capsys):
+    """Regression test: process_input() should keep the same features (and
+    counts) regardless of the order of the ranked features.
+    """
+    table, ranks = get_test_data()
+    biom_table = biom.Table(
+        table.sparse.to_coo(), list(table.index), list(table.columns)
+    )
+    metadata = DataFrame(
+        {"Metadata1": ["a", "b", "c", "d", "e"]}, index=list(table.columns)
+    )
+    shuffled_ranks = ranks.loc[
+        ["F5", "F8", "F3", "F1", "F6", "F2", "F7", "F4"]
+    ]
+    outputs = [
+        process_input(r, metadata, biom_table, extreme_feature_count=2)
+        for r in (ranks, shuffled_ranks)
+    ]
+    for output_ranks, output_table in (
+        (outputs[0][1], outputs[0][4]),
+        (outputs[1][1], outputs[1][4]),
+    ):
+        assert sorted(output_ranks.index) == ["F1", "F2", "F7", "F8"]
+        assert list(output_table.ids(axis="observation")) == list(
+            output_ranks.index
+        )
+        for fid in output_ranks.index:
+            assert list(output_table.data(fid, axis="observation")) == list(
+                biom_table.data(fid, axis="observation")[[0, 1, 3, 4]]
+            )
+
+
+def test_filtering_ties_and_order():
+    """Tests that ties are broken the same way as in DataFrame.nlargest() and
+    DataFrame.nsmallest(), and that filtering preserves the order of the
+    features.
+    """
+    table, ranks = get_test_data()
+    ranks["Rank 0"] = [3, 1, 3, 2, 3, 5, 1, 5]
+    ranks["Rank 1"] = [0, 0, 0, 0, 0, 0, 0, 0]
+    filtered_table, filtered_ranks = filter_unextreme_features(table, ranks, 2)
+    # Rank 0: the largest values are F6 and F8 (5), and the smallest are F2
+    # and F7 (1). Rank 1: everything is tied, so F1 and F2 are picked for
+    # both ends.
+    assert list(filtered_ranks.index) == ["F1", "F2", "F6", "F7", "F8"]
+    assert list(filtered_table.index) == ["F1", "F2", "F6", "F7", "F8"]
+
+
+def test_top_k_mask():
+    values = array([[1, 5], [3, 5], [3, 2], [2, 5], [3, 9]])
+    mask = top_k_mask(values, 2)
+    assert mask.tolist() == [
+        [False, True],
+        [True, False],
+        [True, False],
+        [False, False],
+        [False, True],
+    ]
+    assert mask.sum(axis=0).tolist() == [2, 2]
+
+
 def test_filtering_large_efc():
     """Tests filter_unextreme_features() when (the extreme feature count * 2)
     is greater than or equal to the number of ranked features.
@@ -71,3 +71,47 @@ def test_differentials_to_df_bad_cases():
     )
     with pytest.raises(ValueError):
         differentials_to_df(ninf_val_diff)
+
+
+def test_differentials_to_df_error_message():
+    """Tests that the error message for bad differentials names the first
+    feature (in the file's order) with a bad differential, regardless of
+    whether its differential is non-numeric or non-finite.
+    """
+    diff = StringIO(
+        "\tIntercept\tRank 1\nTaxon1\t1.0\t2.0\nTaxon2\t3.0\tInfinity\n"
+        "Taxon3\tasdf\t4.0\nTaxon4\tNaN\t5.0"
+    )
+    with pytest.raises(ValueError) as exception_info:
+        differentials_to_df(diff)
+    assert str(exception_info.value) == (
+        "Missing / nonnumeric differential(s) found for feature Taxon2"
+    )
+
+    diff = StringIO(
+        "\tIntercept\tRank 1\nTaxon1\t1.0\t2.0\nTaxon2\t3.0\t\n"
+        "Taxon3\tasdf\t4.0"
+    )
+    with pytest.raises(ValueError) as exception_info:
+        differentials_to_df(diff)
+    assert str(exception_info.value) == (
+        "Missing / nonnumeric differential(s) found for feature Taxon2"
+    )
+
+
+def test_differentials_to_df_number_formats():
+    """Tests that differentials are parsed in the same way as by float()."""
+    diff = StringIO(
+        "\tIntercept\tRank 1\nTaxon1\t 1.5 \t1_000\nTaxon2\t+3\t-1e-5\n"
+        "Taxon3\t0.30000000000000004\t1E2"
+    )
+    assert_frame_equal(
+        differentials_to_df(diff),
+        DataFrame(
+            {
+                "Intercept": [1.5, 3.0, 0.30000000000000004],
+                "Rank 1": [1000.0, -1e-5, 100.0],
+            },
+            index=["Taxon1", "Taxon2", "Taxon3"],
+        ),
+    )
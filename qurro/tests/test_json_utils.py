@@ -7,12 +7,19 @@
 # The full license is in the file LICENSE.txt, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import json
+import os
 from os.path import join
 import pytest
+from qurro import _json_utils
 from qurro._json_utils import (
+    dumps_json,
+    loads_json,
     get_jsons,
     plot_jsons_equal,
     try_to_replace_line_json,
+    iter_json_chunks,
+    write_js_json_definitions,
     replace_js_json_definitions,
     check_json_dataset_names,
 )
@@ -262,21 +269,21 @@ def test_try_to_replace_line_json():
     # Test various cases where we expect a replacement
     good_rank_line = "  var rankPlotJSON = {};\n"
     new_line, r = try_to_replace_line_json(good_rank_line, "rank", {"a": "b"})
-    assert new_line == '  var rankPlotJSON = {"a": "b"};\n'
+    assert new_line == '  var rankPlotJSON = {"a":"b"};\n'
     assert r
 
     good_sample_line = "  var samplePlotJSON = {};\n"
     new_line, r = try_to_replace_line_json(
         good_sample_line, "sample", {"a": "b"}
     )
-    assert new_line == '  var samplePlotJSON = {"a": "b"};\n'
+    assert new_line == '  var samplePlotJSON = {"a":"b"};\n'
     assert r
 
     good_count_line = "  var countJSON = {};\n"
     new_line, r = try_to_replace_line_json(
         good_count_line, "count", {"a": "b"}
     )
-    assert new_line == '  var countJSON = {"a": "b"};\n'
+    assert new_line == '  var countJSON = {"a":"b"};\n'
     assert r
 
     # Test various cases where we expect no replacement
@@ -307,7 +314,7 @@ def test_try_to_replace_line_json():
     new_line, r = try_to_replace_line_json(
         prefix_sample_line, "sample", {"a": "b"}, json_prefix="asdf"
     )
-    assert new_line == '    var asdfsamplePlotJSON = {"a": "b"};\n'
+    assert new_line == '    var asdfsamplePlotJSON = {"a":"b"};\n'
     assert r
 
     # Check that an invalid json type causes an error to be raised
@@ -327,13 +334,11 @@ def test_replace_js_json_definitions():
                 assert output_lines[1] == "var samplePlotJSON = {};\n"
                 assert output_lines[2] == "var countJSON = {};\n"
             else:
+                assert output_lines[0] == 'var rankPlotJSON = {"test1":"r"};\n'
                 assert (
-                    output_lines[0] == 'var rankPlotJSON = {"test1": "r"};\n'
+                    output_lines[1] == 'var samplePlotJSON = {"test2":"s"};\n'
                 )
-                assert (
-                    output_lines[1] == 'var samplePlotJSON = {"test2": "s"};\n'
-                )
-                assert output_lines[2] == 'var countJSON = {"test3": "c"};\n'
+                assert output_lines[2] == 'var countJSON = {"test3":"c"};\n'
 
     test_inputs = [{"test1": "r"}, {"test2": "s"}, {"test3": "c"}]
     # Test that the basic case works (all JSONs are in the input file)
@@ -368,7 +373,7 @@ def test_replace_js_json_definitions():
     assert exit_code == 0
     with open(oloc, "r") as output_fobj:
         output_lines = output_fobj.readlines()
-        assert output_lines[0] == 'var rankPlotJSON = {"test1": "r"};\n'
+        assert output_lines[0] == 'var rankPlotJSON = {"test1":"r"};\n'
         assert output_lines[1] == "var asdfsamplePlotJSON = {};\n"
         assert output_lines[2] == "var asdfcountJSON = {};\n"
 
@@ -384,5 +389,275 @@ def test_replace_js_json_definitions():
     with open(oloc, "r") as output_fobj:
         output_lines = output_fobj.readlines()
         assert output_lines[0] == "var rankPlotJSON = {};\n"
-        assert output_lines[1] == 'var asdfsamplePlotJSON = {"test2": "s"};\n'
-        assert output_lines[2] == 'var asdfcountJSON = {"test3": "c"};\n'
+        assert output_lines[1] == 'var asdfsamplePlotJSON = {"test2":"s"};\n'
+        assert output_lines[2] == 'var asdfcountJSON = {"test3":"c"};\n'
+
+
+def test_iter_json_chunks():
+    test_objs = [
+        {},
+        [],
+        {"b": 1, "a": [1, 2.5, None, True, "x"], "c": {"z": {}, "y": []}},
+        {"F1": {"S2": 3.0, "S1": 1.0}, "F0": {"S1": 2.0}},
+        {"datasets": {"d": [{"b": "é", "a": float("nan")}, {"c": "\n"}]}},
+        # Non-string keys should be handled the same as by dumps_json()
+        {"x": {1: "a", 2.5: "b", 0: "c"}},
+        [[[[[1, {"d": [2]}]]]]],
+        "just a string",
+        5,
+    ]
+    for obj in test_objs:
+        for max_depth in (0, 1, 2, 3, 10):
+            chunks = list(iter_json_chunks(obj, max_depth=max_depth))
+            assert "".join(chunks) == dumps_json(obj)
+
+    # Check that chunking actually happens for large objects
+    count_json = {
+        "F{}".format(f): {"S{}".format(s): f * s for s in range(1, 4)}
+        for f in range(2500)
+    }
+    plot_json = {
+        "mark": "bar",
+        "datasets": {"d": [{"x": i, "y": [i]} for i in range(2500)]},
+    }
+    for obj in (count_json, plot_json):
+        chunks = list(iter_json_chunks(obj))
+        assert len(chunks) > 2
+        assert "".join(chunks) == dumps_json(obj)
+
+
+def get_backend_test_objs():
+    """Returns a list of objects for testing the JSON backends with."""
+    return [
+        {},
+        [],
+        None,
+        "just a string",
+        {"b": 1, "a": [1, 2.5, None, True, False, "x"], "c": {"z": {}}},
+        # Keys should be sorted by code point, in the same way regardless of
+        # the backend
+        {"b": 1, "B": 2, "é": 3, "e": 4, "😀": 5, "": 6, "Sample ID": 7},
+        # Strings with characters that need escaping, and non-ASCII characters
+        # (which shouldn't be escaped)
+        {"s": 'a"b\\c\nd\te\x01\x1f\u2028/é😀</script>'},
+        # Floats that both backends format the same way...
+        [0.0, -0.0, 0.1, 0.30000000000000004, 1 / 3, 1.5, -2.75, 1e15],
+        [0.0001, 0.00015, 123456.789, 9007199254740992.0, 5.0, 100.0],
+        # ...and floats that orjson formats differently
+        [1e-05, 3.2e-05, 1e-06, 1.5e-07, 5e-324, 1e16, 1e22, 1.7e308],
+        {"F1": {"S1": 1e-05}, "F2": {"S1": 2.0}},
+        {"a": [-1e-05, [1e-07]], "b": {"c": -3.2e-05, "d": 1e16}, "e": 1e22},
+        1e-05,
+        -1.5e16,
+        # Strings that look like they contain numbers that orjson formats
+        # differently (e.g. feature IDs that are hashes)
+        {"4b5eb9300498b": {"S1,1e5": 2.0, "S2": 0.00001}},
+        {"S1,1e-7,": 1e-07, "S2": ["[0.00001]", 1e16]},
+        {"a\\b\n": 1e-05, "c": '"0.00001,'},
+        # NaN and Infinity, which both backends should write as null
+        [float("nan"), float("inf"), -float("inf"), {"a": float("nan")}],
+        # Integers (including ones too large for orjson)
+        [0, -1, 2**53, 2**63 - 1, -(2**63), 2**64, -(2**70)],
+        # Non-string keys (which orjson doesn't support by default)
+        {1: "a", 0: "c"},
+        {"x": {"y": {2.5: "b", 0.5: "a"}}},
+    ]
+
+
+def test_dumps_json():
+    for obj in get_backend_test_objs():
+        output = dumps_json(obj)
+        # The output should be equivalent to the json module's output, other
+        # than NaN and Infinity being written as null
+        assert output == json.dumps(
+            _json_utils._replace_nonfinite_floats(obj),
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        assert type(output) is str
+
+    assert dumps_json({"b": [1, 2.5], "a": "é"}) == '{"a":"é","b":[1,2.5]}'
+    assert dumps_json([float("nan"), 1]) == "[null,1]"
+
+    # Like json.dumps(), this should fail on things that aren't JSON
+    # serializable
+    with pytest.raises(TypeError):
+        dumps_json({"a": object()})
+
+
+def test_dumps_json_lone_surrogates(tmp_path):
+    """Checks that strings with lone surrogates (which orjson refuses to
+    serialize, and which can't be encoded as UTF-8) are escaped.
+    """
+    obj = {"a": "x\ud800", "b": "é"}
+    output = dumps_json(obj)
+    assert output == '{"a":"x\\ud800","b":"\\u00e9"}'
+    assert _json_utils._dumps_json_stdlib(obj) == output
+    if _json_utils.JSON_BACKEND == "orjson":
+        assert _json_utils._dumps_json_orjson(obj) == output
+    assert json.loads(output) == obj
+
+    # The output should be writable to a main.js file
+    js_loc = join(str(tmp_path), "main.js")
+    with open(js_loc, "w", encoding="utf-8") as js_file:
+        js_file.write("var countJSON = {};\n")
+    write_js_json_definitions(js_loc, count_json=obj)
+    with open(js_loc, "r", encoding="utf-8") as js_file:
+        assert js_file.read() == "var countJSON = " + output + ";\n"
+
+
+def test_json_backends_identical():
+    """Checks that dumps_json() produces byte-identical output regardless of
+    whether or not orjson is used.
+    """
+    pytest.importorskip("orjson")
+    test_objs = get_backend_test_objs()
+    # Also test some actual Qurro JSONs, which exercise iter_json_chunks()
+    rpj, spj, cj = get_jsons(
+        join("qurro", "tests", "input", "json_tests", "all_full.js")
+    )
+    test_objs.extend([rpj, spj, cj])
+    count_json = {
+        "F{}".format(f): {"S{}".format(s): f / s for s in range(1, 4)}
+        for f in range(2500)
+    }
+    test_objs.append(count_json)
+
+    for obj in test_objs:
+        stdlib_output = _json_utils._dumps_json_stdlib(obj)
+        orjson_output = _json_utils._dumps_json_orjson(obj)
+        assert orjson_output.encode("utf-8") == stdlib_output.encode("utf-8")
+
+    orig_backend = _json_utils.JSON_BACKEND
+    try:
+        chunk_outputs = []
+        for backend in ("json", "orjson"):
+            _json_utils.JSON_BACKEND = backend
+            chunk_outputs.append("".join(iter_json_chunks(count_json)))
+        assert chunk_outputs[0] == chunk_outputs[1]
+    finally:
+        _json_utils.JSON_BACKEND = orig_backend
+
+
+def test_fix_orjson_numbers():
+    fix = _json_utils._fix_orjson_numbers
+    assert fix(b'{"a":[1,2.5]}') == b'{"a":[1,2.5]}'
+    assert fix(b'{"a":[1e16,-1.5e-7,0.00001],"b":-0.000032}') == (
+        b'{"a":[1e+16,-1.5e-07,1e-05],"b":-3.2e-05}'
+    )
+    # Exponents with more than one digit are already formatted the same way
+    assert fix(b"[1e-10,5e-324]") == b"[1e-10,5e-324]"
+    # Strings that just look like these numbers shouldn't be changed
+    assert fix(b'{"4b5eb9300498b":0.00001}') == b'{"4b5eb9300498b":1e-05}'
+    assert fix(b'{"1e16":0.00001}') == b'{"1e16":1e-05}'
+    # ...but if a string really looks like one of these numbers, or if we
+    # can't tell where strings are, this should give up
+    assert fix(b'{"a,1e16]":1}') is None
+    assert fix(b'{"a\\"b":1e16}') is None
+
+
+def test_dumps_json_orjson_small_floats(monkeypatch):
+    """Checks that relative abundances (lots of which are small enough that
+    orjson formats them differently than the json module) don't cause the
+    orjson backend to fall back to the json module.
+    """
+    pytest.importorskip("orjson")
+    count_json = {
+        "F{}".format(f): {
+            "S{}".format(s): (f + 1) / (s * 10**5) for s in range(1, 4)
+        }
+        for f in range(100)
+    }
+    expected_output = _json_utils._dumps_json_stdlib(count_json)
+    assert "e-05" in expected_output
+
+    def fail(obj):
+        raise AssertionError("Fell back to the json module")
+
+    monkeypatch.setattr(_json_utils, "_dumps_json_stdlib", fail)
+    assert _json_utils._dumps_json_orjson(count_json) == expected_output
+
+
+def test_loads_json():
+    for obj in get_backend_test_objs():
+        if isinstance(obj, dict) and not all(type(k) is str for k in obj):
+            continue
+        assert loads_json(dumps_json(obj)) == json.loads(dumps_json(obj))
+    # NaN and Infinity values (written to main.js by older versions of
+    # Qurro) should still be parsed
+    output = loads_json('{"a": NaN, "b": [Infinity, -Infinity], "c": 1}')
+    assert output["a"] != output["a"]
+    assert output["b"] == [float("inf"), -float("inf")]
+    assert output["c"] == 1
+
+
+def test_write_js_json_definitions(tmp_path):
+    idir = join("qurro", "tests", "input", "json_tests")
+    oloc = str(tmp_path / "main.js")
+
+    test_inputs = [{"test1": "r"}, {"test2": "s"}, {"test3": "c"}]
+    exit_code = write_js_json_definitions(
+        join(idir, "all.js"), *test_inputs, output_file_loc=oloc
+    )
+    assert exit_code == 0
+    with open(oloc, "r") as output_fobj:
+        assert output_fobj.readlines() == [
+            'var rankPlotJSON = {"test1":"r"};\n',
+            'var samplePlotJSON = {"test2":"s"};\n',
+            'var countJSON = {"test3":"c"};\n',
+        ]
+
+    # Unlike replace_js_json_definitions(), this doesn't check if the JSONs
+    # have changed -- so this should still write to the output file
+    os.chmod(oloc, 0o644)
+    exit_code = write_js_json_definitions(oloc, *test_inputs)
+    assert exit_code == 0
+    # The file's permissions should be preserved, and no temporary files
+    # should be left behind
+    assert os.stat(oloc).st_mode & 0o777 == 0o644
+    assert os.listdir(str(tmp_path)) == ["main.js"]
+
+    # JSONs passed as None shouldn't be changed
+    exit_code = write_js_json_definitions(
+        oloc, {"new": "r"}, None, {"new": "c"}
+    )
+    assert exit_code == 0
+    assert get_jsons(oloc) == ({"new": "r"}, {"test2": "s"}, {"new": "c"})
+
+    # If no JSON definitions are found, nothing should be written
+    exit_code = write_js_json_definitions(
+        join(idir, "empty_file.js"), *test_inputs, output_file_loc=oloc
+    )
+    assert exit_code == 1
+    assert get_jsons(oloc) == ({"new": "r"}, {"test2": "s"}, {"new": "c"})
+    assert os.listdir(str(tmp_path)) == ["main.js"]
+
+    # If the input file doesn't exist, the temporary file should be closed
+    # and removed
+    # (We can only check for leaked file descriptors on systems with /proc)
+    fd_dir = join(os.sep, "proc", "self", "fd")
+    check_fds = os.path.isdir(fd_dir)
+    if check_fds:
+        open_fds = set(os.listdir(fd_dir))
+    with pytest.raises(FileNotFoundError):
+        write_js_json_definitions(
+            join(idir, "nonexistent.js"), *test_inputs, output_file_loc=oloc
+        )
+    assert os.listdir(str(tmp_path)) == ["main.js"]
+    if check_fds:
+        assert set(os.listdir(fd_dir)) == open_fds
+
+    # Check that prefixes are handled properly
+    exit_code = write_js_json_definitions(
+        join(idir, "spcp_prefix.js"),
+        *test_inputs,
+        json_prefix="asdf",
+        output_file_loc=oloc
+    )
+    assert exit_code == 0
+    with open(oloc, "r") as output_fobj:
+        output_lines = output_fobj.readlines()
+        assert output_lines[0] == "var rankPlotJSON = {};\n"
+        assert output_lines[1] == 'var asdfsamplePlotJSON = {"test2":"s"};\n'
+        assert output_lines[2] == 'var asdfcountJSON = {"test3":"c"};\n'
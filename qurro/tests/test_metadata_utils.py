@@ -0,0 +1,73 @@
+import os
+from io import StringIO
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from qurro._metadata_utils import (
+    get_q2_comment_lines,
+    strip_and_nanify,
+    read_metadata_file,
+)
+
+
+def test_strip_and_nanify():
+    output = strip_and_nanify(
+        ["a", " a", "b ", "  ", "", np.nan, "a", "\tc d\t", "0"]
+    )
+    assert output.dtype == object
+    assert list(output[:3]) == ["a", "a", "b"]
+    assert all(pd.isna(v) for v in output[3:6])
+    assert list(output[6:]) == ["a", "c d", "0"]
+
+    assert len(strip_and_nanify(np.array([], dtype=object))) == 0
+
+
+def test_get_q2_comment_lines_file_obj():
+    """Tests that get_q2_comment_lines() works on file objects, and leaves
+    them at the start of the file.
+    """
+    md = os.path.join("qurro", "tests", "input", "moving_pictures")
+    md = os.path.join(md, "sample-metadata.tsv")
+    with open(md, "r") as md_file_obj:
+        assert get_q2_comment_lines(md_file_obj) == [1]
+        assert md_file_obj.readline().startswith("#SampleID")
+
+    md_sio = StringIO("id\tx\n#q2:types\tcategorical\n#q2:asdf\ta\nS1\t1\n")
+    assert get_q2_comment_lines(md_sio) == [1, 2]
+    assert md_sio.readline() == "id\tx\n"
+
+
+def test_read_metadata_file_stringio():
+    md = StringIO(
+        "id\tColor\tCount\tEmpty\n"
+        "#q2:types\tcategorical\tnumeric\tcategorical\n"
+        " S1 \t red\t1\t\n"
+        "S2\t  \t 02 \t \n"
+        "S3\tblue\t3.0\n"
+    )
+    md_df = read_metadata_file(md)
+    expected_df = pd.DataFrame(
+        {
+            "Color": ["red", np.nan, "blue"],
+            "Count": ["1", "02", "3.0"],
+            "Empty": [np.nan, np.nan, np.nan],
+        },
+        index=pd.Index(["S1", "S2", "S3"], name="id"),
+        dtype=object,
+    )
+    assert_frame_equal(md_df, expected_df)
+
+
+def test_read_metadata_file_utf8(tmp_path):
+    """Tests that metadata files are read as UTF-8, whether they're given as
+    a filename or as an already-opened file object.
+    """
+    md_loc = os.path.join(str(tmp_path), "md.tsv")
+    with open(md_loc, "w", encoding="utf-8") as md_file_obj:
+        md_file_obj.write("id\tPlace\n#q2:types\tcategorical\nS1\tCafé ☕\n")
+    expected_df = pd.DataFrame(
+        {"Place": ["Café ☕"]}, index=pd.Index(["S1"], name="id"), dtype=object
+    )
+    assert_frame_equal(read_metadata_file(md_loc), expected_df)
+    with open(md_loc, "r", encoding="utf-8") as md_file_obj:
+        assert_frame_equal(read_metadata_file(md_file_obj), expected_df)
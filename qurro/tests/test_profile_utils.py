@@ -0,0 +1,127 @@
+import os
+import tracemalloc
+from pytest import raises
+from click.testing import CliRunner
+import qurro.scripts._plot as rrvp
+from qurro._json_utils import loads_json
+from qurro._profile_utils import StageProfiler
+
+
+def test_stage_profiler():
+    profiler = StageProfiler()
+    with profiler.stage("a"):
+        x = [0] * 100000
+    with profiler.stage("b"):
+        pass
+    del x
+    assert [s["name"] for s in profiler.stages] == ["a", "b"]
+    a = profiler.stages[0]
+    for key in ("wall_time", "cpu_time"):
+        assert a[key] >= 0
+    # A list of 100,000 references takes up at least 800 KB
+    assert a["peak_memory"] - a["start_memory"] >= 800000
+    assert tracemalloc.is_tracing()
+
+    report = profiler.get_report()
+    assert report["stages"] == profiler.stages
+    assert report["total_wall_time"] == a["wall_time"] + (
+        profiler.stages[1]["wall_time"]
+    )
+    assert report["peak_memory"] >= a["peak_memory"]
+
+    # Stopping the profiler should stop tracemalloc
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+
+def test_stage_profiler_error():
+    """Checks that stages are still recorded if they raise an error."""
+    profiler = StageProfiler()
+    with raises(ValueError):
+        with profiler.stage("error"):
+            raise ValueError("oops")
+    profiler.stop()
+    assert [s["name"] for s in profiler.stages] == ["error"]
+
+
+def test_stage_profiler_disabled(tmp_path):
+    profiler = StageProfiler(enabled=False)
+    with profiler.stage("a"):
+        pass
+    assert profiler.stages == []
+    assert not tracemalloc.is_tracing()
+    assert profiler.write_report(str(tmp_path)) is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_profile_cli(tmp_path):
+    in_dir = os.path.join("qurro", "tests", "input", "byrd")
+    args = [
+        "--ranks",
+        os.path.join(in_dir, "byrd_differentials.tsv"),
+        "--table",
+        os.path.join(in_dir, "byrd_skin_table.biom"),
+        "--sample-metadata",
+        os.path.join(in_dir, "byrd_metadata.txt"),
+        "--output-dir",
+        str(tmp_path),
+    ]
+    runner = CliRunner()
+    result = runner.invoke(rrvp.plot, args)
+    assert result.exit_code == 0
+    report_path = os.path.join(str(tmp_path), "qurro_profile.json")
+    assert not os.path.exists(report_path)
+
+    result = runner.invoke(rrvp.plot, args + ["--profile"])
+    assert result.exit_code == 0
+    assert "Wrote a profiling report to {}.".format(report_path) in (
+        result.output
+    )
+    assert not tracemalloc.is_tracing()
+    with open(report_path, "r") as report_file:
+        report = loads_json(report_file.read())
+    assert [s["name"] for s in report["stages"]] == [
+        "load_table",
+        "read_sample_metadata",
+        "read_ranks",
+        "validate",
+        "replace_nan",
+        "validate_table",
+        "vibe_check",
+        "match",
+        "filter_unextreme_features",
+        "remove_empty_samples_and_features",
+        "merge_feature_metadata",
+        "gen_rank_plot",
+        "gen_sample_plot",
+        "gen_count_json",
+        "copy_support_files",
+        "write_main_js",
+    ]
+    for stage in report["stages"]:
+        assert stage["wall_time"] >= 0
+        assert stage["cpu_time"] >= 0
+        assert stage["peak_memory"] >= stage["start_memory"]
+
+
+def test_profile_cli_error(tmp_path):
+    """Checks that tracemalloc is stopped even if the CLI fails."""
+    in_dir = os.path.join("qurro", "tests", "input", "byrd")
+    args = [
+        "--ranks",
+        os.path.join(in_dir, "nonexistent_differentials.tsv"),
+        "--table",
+        os.path.join(in_dir, "byrd_skin_table.biom"),
+        "--sample-metadata",
+        os.path.join(in_dir, "byrd_metadata.txt"),
+        "--output-dir",
+        str(tmp_path),
+        "--profile",
+    ]
+    result = CliRunner().invoke(rrvp.plot, args)
+    assert result.exit_code != 0
+    assert isinstance(result.exception, FileNotFoundError)
+    assert not tracemalloc.is_tracing()
+    assert not os.path.exists(
+        os.path.join(str(tmp_path), "qurro_profile.json")
+    )
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from collections import namedtuple
+from io import StringIO
 import os
 
 import biom
@@ -10,8 +11,14 @@ import pytest
 from q2_types.sample_data import SampleData
 from qiime2 import Metadata
 from qiime2.plugin.testing import TestPluginBase
-from qurro.qarcoal import qarcoal, filter_and_join_taxonomy
+from qurro.qarcoal import (
+    qarcoal,
+    qarcoal_batch,
+    filter_and_join_taxonomy,
+    TaxonomyIndex,
+)
 from qurro.q2._type import LogRatios, LogRatiosDirFmt
+from qurro.q2._transformer import _read_log_ratios
 
 MP_URL = "qurro/tests/input/moving_pictures"
 
@@ -28,6 +35,30 @@ class TestTypes(TestPluginBase):
         )
 
 
+def test_read_log_ratios():
+    """Checks that log-ratio files (including ones saved from a
+    qiime2.Metadata, which have a "#q2:types" line) are parsed properly.
+    """
+    lr_file = StringIO(
+        "Sample-ID\tNum_Sum\tDenom_Sum\tlog_ratio\n"
+        "#q2:types\tnumeric\tnumeric\tnumeric\n"
+        "001\t7\t15\t-0.762140\n"
+        "S2\t1.5\t2\t-0.287682\n"
+    )
+    df = _read_log_ratios(lr_file)
+    assert df.index.name == "Sample-ID"
+    assert list(df.index) == ["001", "S2"]
+    assert list(df.columns) == ["Num_Sum", "Denom_Sum", "log_ratio"]
+    assert all(dtype == np.float64 for dtype in df.dtypes)
+    assert list(df["Num_Sum"]) == [7, 1.5]
+
+    # Other columns (e.g. from qarcoal_batch()) should still be numeric
+    batch_file = StringIO("Sample-ID\tq1\tq2\nS1\t1.5\t\nS2\t-2\t3\n")
+    df = _read_log_ratios(batch_file)
+    assert all(dtype == np.float64 for dtype in df.dtypes)
+    assert np.isnan(df.loc["S1", "q2"])
+
+
 def _check_dataframe_equality(df1, df2):
     """Helper function to test whether two dataframes are equal.
 
@@ -105,6 +136,33 @@ class TestQarcoalOutput:
 
         assert qarcoal_results - qurro_results == pytest.approx(0)
 
+    def test_sums(self, get_mp_data, get_mp_results):
+        """Checks the sums computed from the table's sparse matrix against
+        the (DataFrame-based) output of filter_and_join_taxonomy().
+        """
+        num_df, denom_df = filter_and_join_taxonomy(
+            get_mp_data.table.to_dataframe(dense=True),
+            get_mp_data.taxonomy,
+            "g__Bacteroides",
+            "g__Streptococcus",
+        )
+        samples = get_mp_results.index
+        assert set(samples) == set(num_df.columns)
+        # Samples should be in the same order as in the table
+        table_samples = list(get_mp_data.table.ids(axis="sample"))
+        assert list(samples) == sorted(samples, key=table_samples.index)
+        assert get_mp_results["Num_Sum"].values == pytest.approx(
+            num_df[samples].sum(axis=0).values
+        )
+        assert get_mp_results["Denom_Sum"].values == pytest.approx(
+            denom_df[samples].sum(axis=0).values
+        )
+        assert get_mp_results["log_ratio"].values == pytest.approx(
+            np.log(
+                get_mp_results["Num_Sum"] / get_mp_results["Denom_Sum"]
+            ).values
+        )
+
 
 class TestErrors:
     def test_invalid_num(self, get_mp_data):
@@ -463,3 +521,192 @@ class TestIrregularData:
 
         # differences are ~ 10^-6
         assert diff == pytest.approx(0, abs=1e-5)
+
+
+def _make_queries(names, num_strings, denom_strings):
+    queries_df = pd.DataFrame(
+        {"num_string": num_strings, "denom_string": denom_strings},
+        index=pd.Index(names, name="id"),
+    )
+    return Metadata(queries_df)
+
+
+class TestQarcoalBatch:
+    def test_matches_qarcoal(self, get_mp_data):
+        names = ["bact_strep", "bacteroidetes_firmicutes", "firm_bacilli"]
+        nums = ["g__Bacteroides", "p__Bacteroidetes", "Firmicutes"]
+        denoms = ["g__Streptococcus", "p__Firmicutes", "Bacilli"]
+        batch = qarcoal_batch(
+            get_mp_data.table,
+            get_mp_data.taxonomy,
+            _make_queries(names, nums, denoms),
+            allow_shared_features=True,
+        )
+        assert list(batch.columns) == names
+        assert batch.index.name == "Sample-ID"
+        all_samples = set()
+        for name, num, denom in zip(names, nums, denoms):
+            single = qarcoal(
+                get_mp_data.table,
+                get_mp_data.taxonomy,
+                num,
+                denom,
+                allow_shared_features=True,
+            )
+            all_samples |= set(single.index)
+            # Samples without both numerator and denominator features for
+            # this query should have NaN log-ratios
+            assert set(batch[name].dropna().index) == set(single.index)
+            assert batch.loc[single.index, name].values == pytest.approx(
+                single["log_ratio"].values
+            )
+        assert set(batch.index) == all_samples
+
+    def test_query_errors(self, get_mp_data):
+        with pytest.raises(ValueError) as excinfo:
+            qarcoal_batch(
+                get_mp_data.table,
+                get_mp_data.taxonomy,
+                _make_queries(
+                    ["ok", "bad"],
+                    ["g__Bacteroides", "beyblade"],
+                    ["g__Streptococcus", "Firm"],
+                ),
+            )
+        assert (
+            'Query "bad": No feature(s) found matching numerator string!'
+            == str(excinfo.value)
+        )
+
+        with pytest.raises(ValueError) as excinfo:
+            qarcoal_batch(
+                get_mp_data.table,
+                get_mp_data.taxonomy,
+                _make_queries(["shared"], ["Firmicutes"], ["Bacilli"]),
+            )
+        assert 'Query "shared": Shared features between num and denom!' == (
+            str(excinfo.value)
+        )
+
+    def test_missing_strings(self, get_mp_data):
+        for nums, denoms, col in (
+            (["g__Bacteroides", np.nan], ["Firm", "Bacilli"], "num_string"),
+            (["g__Bacteroides", "Firm"], ["Firm", np.nan], "denom_string"),
+        ):
+            with pytest.raises(ValueError) as excinfo:
+                qarcoal_batch(
+                    get_mp_data.table,
+                    get_mp_data.taxonomy,
+                    _make_queries(["ok", "empty"], nums, denoms),
+                )
+            assert 'Query "empty": No {} given!'.format(col) == str(
+                excinfo.value
+            )
+
+    def test_error_order_matches_qarcoal(self):
+        """Checks that, for a query with shared features that also has no
+        samples containing both numerator and denominator features, the
+        same error is raised as by qarcoal().
+        """
+        feats = ["F0", "F1", "F2"]
+        mat = np.array([[0, 0], [0, 3], [5, 0]])
+        table = biom.table.Table(mat, feats, ["S0", "S1"])
+        taxonomy = pd.DataFrame(
+            {
+                "Taxon": [
+                    "p__Firmicutes; c__Bacilli",
+                    "p__Firmicutes; c__Clostridia",
+                    "p__Bacteroidetes",
+                ]
+            },
+            index=feats,
+        )
+        with pytest.raises(ValueError) as single_excinfo:
+            qarcoal(table, taxonomy, "Firm", "Bacilli")
+        with pytest.raises(ValueError) as batch_excinfo:
+            qarcoal_batch(
+                table, taxonomy, _make_queries(["q"], ["Firm"], ["Bacilli"])
+            )
+        assert 'Query "q": {}'.format(single_excinfo.value) == str(
+            batch_excinfo.value
+        )
+        assert "No samples contain both" in str(batch_excinfo.value)
+
+    def test_missing_column(self, get_mp_data):
+        queries = Metadata(
+            pd.DataFrame(
+                {"num_string": ["g__Bacteroides"]},
+                index=pd.Index(["a"], name="id"),
+            )
+        )
+        with pytest.raises(ValueError) as excinfo:
+            qarcoal_batch(get_mp_data.table, get_mp_data.taxonomy, queries)
+        assert "Queries file doesn't have a denom_string column." == str(
+            excinfo.value
+        )
+
+
+class TestTaxonomyIndex:
+    @pytest.fixture(scope="function")
+    def get_taxonomy(self):
+        feats = ["F{}".format(i) for i in range(6)]
+        tax_labels = [
+            "k__Bacteria; p__Firmicutes; c__Bacilli",
+            "k__Bacteria; p__Firmicutes; c__Clostridia",
+            "k__Bacteria; p__Bacteroidetes; c__Bacteroidia",
+            "k__Bacteria; p__Firmicutes; c__Bacilli",
+            np.nan,
+            "k__Bacteria; p__Bacteroidetes",
+        ]
+        taxonomy = pd.DataFrame({"Taxon": tax_labels}, index=feats)
+        # F5 isn't in the "table"
+        return TaxonomyIndex(pd.Index(feats[:5]), taxonomy), taxonomy
+
+    def test_taxa(self, get_taxonomy):
+        index, _ = get_taxonomy
+        assert list(index.feature_ids) == ["F0", "F1", "F2", "F3"]
+        assert len(index.taxa) == 3
+        assert list(index.taxon_codes) == [0, 1, 2, 0]
+
+    def test_search_matches_str_contains(self, get_taxonomy):
+        index, taxonomy = get_taxonomy
+        taxa = taxonomy["Taxon"].loc[["F0", "F1", "F2", "F3"]]
+        searches = [
+            "Bacilli",
+            "c__Bac",
+            "Firm",
+            "Firmicutes; c__",
+            " p__Bacteroidetes",
+            "^k__Bacteria; p__B",
+            "c__B.*li",
+            "Archaea",
+        ]
+        for indexed in (False, True):
+            if indexed:
+                index.index_tokens()
+            for text in searches:
+                expected = taxa.index[taxa.str.contains(text)]
+                assert list(index.search(text)) == list(expected)
+
+    def test_lookup(self, get_taxonomy):
+        index, _ = get_taxonomy
+        assert list(index.lookup("c__Bacilli")) == ["F0", "F3"]
+        assert list(index.lookup(" c__Bacilli ")) == ["F0", "F3"]
+        assert list(index.lookup("c__Bac")) == []
+        assert list(index.lookup("c__Bac", prefix=True)) == [
+            "F0",
+            "F2",
+            "F3",
+        ]
+        assert list(index.lookup("p__Firmicutes", level=1)) == [
+            "F0",
+            "F1",
+            "F3",
+        ]
+        assert list(index.lookup("p__Firmicutes", level=2)) == []
+        assert list(index.lookup("p__", level=1, prefix=True)) == [
+            "F0",
+            "F1",
+            "F2",
+            "F3",
+        ]
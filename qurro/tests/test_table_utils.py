@@ -0,0 +1,418 @@
+import pytest
+import biom
+import pandas as pd
+from pandas import DataFrame, Series
+from pandas.testing import assert_frame_equal, assert_series_equal
+from qurro._df_utils import vibe_check
+from qurro._table_utils import (
+    validate_table,
+    subset_table,
+    remove_empty_samples_and_features,
+    match_table_and_data,
+    print_dropped_message,
+    add_sample_presence_count,
+    get_nonzero_counts,
+    get_value_range,
+)
+from qurro.tests.test_df_utils import get_test_data
+
+
+def df_to_table(df):
+    """Converts a DataFrame (features x samples) to a biom.Table."""
+    return biom.Table(df.values, list(df.index), list(df.columns))
+
+
+def table_to_df(table):
+    """Converts a biom.Table to a dense DataFrame of floats."""
+    return table.to_dataframe(dense=True)
+
+
+def test_validate_table():
+    table, metadata, ranks = get_test_data()
+    validate_table(df_to_table(table))
+
+    with pytest.raises(ValueError) as exception_info:
+        validate_table(df_to_table(table.iloc[:1]))
+    assert "Less than 2 rows found in the BIOM table." in str(
+        exception_info.value
+    )
+
+    with pytest.raises(ValueError) as exception_info:
+        validate_table(df_to_table(table), min_col_ct=5)
+    assert "Less than 5 columns found in the BIOM table." in str(
+        exception_info.value
+    )
+
+
+def test_subset_table():
+    table, metadata, ranks = get_test_data()
+    bt = df_to_table(table)
+    sub = subset_table(bt, [3, 0], [2, 1])
+    assert_frame_equal(
+        table_to_df(sub),
+        table.iloc[[3, 0], [2, 1]].astype(float),
+        check_names=False,
+    )
+    # The input table shouldn't have been changed
+    assert_frame_equal(table_to_df(bt), table.astype(float), check_names=False)
+    # Passing None for either axis keeps everything along that axis
+    assert_frame_equal(
+        table_to_df(subset_table(bt, sample_positions=[0])),
+        table.iloc[:, [0]].astype(float),
+        check_names=False,
+    )
+
+
+def test_print_dropped_message(capsys):
+    # Nothing should be printed if nothing was dropped
+    print_dropped_message(0, "feature", "table", "n/a")
+    assert capsys.readouterr().out == ""
+
+    print_dropped_message(5, "feature", "table", "n/a")
+    assert capsys.readouterr().out == (
+        "5 feature(s) in the table were not present in the n/a.\n"
+        "These feature(s) have been removed from the visualization.\n"
+    )
+
+    print_dropped_message(1, "sample", "table", "n/a")
+    assert capsys.readouterr().out == (
+        "1 sample(s) in the table were not present in the n/a.\n"
+        "These sample(s) have been removed from the visualization.\n"
+    )
+
+
+def test_match_table_and_data_no_change(capsys):
+    table, metadata, ranks = get_test_data()
+    bt = df_to_table(table)
+    m_table, m_ranks, m_metadata = match_table_and_data(bt, ranks, metadata)
+    # If nothing needs to be filtered, the table shouldn't be copied
+    assert m_table is bt
+    assert_frame_equal(ranks, m_ranks)
+    assert_frame_equal(metadata, m_metadata)
+    assert capsys.readouterr().out == ""
+
+
+def test_match_table_and_data_table_extra_feature(capsys):
+    # Test case where table contains a feature that isn't in the ranks
+    table, metadata, ranks = get_test_data()
+    new_row = DataFrame(
+        [[20, 20, 20, 20]],
+        columns=table.columns,
+        index=["FeatureInTableButNotRanks"],
+    )
+    table = pd.concat([table, new_row], verify_integrity=True)
+    m_table, m_ranks, m_metadata = match_table_and_data(
+        df_to_table(table), ranks, metadata
+    )
+    assert "FeatureInTableButNotRanks" not in m_table.ids(axis="observation")
+    # Check that the matched-up fields' data wasn't altered somehow
+    assert_frame_equal(
+        table_to_df(m_table),
+        table.loc[ranks.index].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(ranks, m_ranks)
+    assert_frame_equal(metadata, m_metadata)
+    # Check that a feature-dropping message was printed
+    expected_msg = (
+        "1 feature(s) in the BIOM table were not present in the feature "
+        "rankings"
+    )
+    assert expected_msg in capsys.readouterr().out
+
+
+def test_match_table_and_data_table_extra_sample(capsys):
+    # Test case where table contains a sample that isn't in the metadata
+    table, metadata, ranks = get_test_data()
+    table["SampleInTableButNotMD"] = 10
+    m_table, m_ranks, m_metadata = match_table_and_data(
+        df_to_table(table), ranks, metadata
+    )
+    assert "SampleInTableButNotMD" not in m_table.ids()
+    assert "SampleInTableButNotMD" not in m_metadata.index
+    assert_frame_equal(
+        table_to_df(m_table),
+        table[metadata.index].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(ranks, m_ranks)
+    assert_frame_equal(metadata, m_metadata)
+    expected_msg = (
+        "1 sample(s) in the BIOM table were not present in the sample "
+        "metadata file"
+    )
+    assert expected_msg in capsys.readouterr().out
+
+
+def test_match_table_and_data_metadata_extra_sample(capsys):
+    # Test case where metadata contains a sample that isn't in the table
+    table, metadata, ranks = get_test_data()
+    new_row = DataFrame(
+        [[20, 20, 20, 20]],
+        columns=metadata.columns,
+        index=["SampleInMDButNotTable"],
+    )
+    metadata = pd.concat([metadata, new_row], verify_integrity=True)
+    m_table, m_ranks, m_metadata = match_table_and_data(
+        df_to_table(table), ranks, metadata
+    )
+    assert "SampleInMDButNotTable" not in m_table.ids()
+    assert "SampleInMDButNotTable" not in m_metadata.index
+    assert_frame_equal(
+        table_to_df(m_table), table.astype(float), check_names=False
+    )
+    assert_frame_equal(metadata.loc[table.columns], m_metadata)
+    expected_msg = (
+        "1 sample(s) in the sample metadata file were not present in the BIOM "
+        "table"
+    )
+    assert expected_msg in capsys.readouterr().out
+
+
+def test_match_table_and_data_ranks_in_different_order():
+    table, metadata, ranks = get_test_data()
+    shuffled_ranks = ranks.iloc[[3, 0, 7, 5, 1, 2, 6, 4]]
+    m_table, m_ranks, m_metadata = match_table_and_data(
+        df_to_table(table), shuffled_ranks, metadata
+    )
+    # The ranks should be reordered to match the table's features
+    assert list(m_ranks.index) == list(m_table.ids(axis="observation"))
+    assert_frame_equal(m_ranks, ranks)
+
+
+def test_match_table_and_data_complex(capsys):
+    # Test the case where there are multiple sources of mismatched data:
+    # -> 1 extra feature in the table ("F9")
+    # -> 1 extra sample in the table ("Sample5")
+    # -> 1 extra sample in the metadata ("SampleM")
+    table, metadata, ranks = get_test_data()
+    new_f_row = DataFrame([[1, 2, 3, 4]], columns=table.columns, index=["F9"])
+    table = pd.concat([table, new_f_row], verify_integrity=True)
+    table["Sample5"] = 5
+    new_s_row = DataFrame(
+        [[4, 3, 2, 1]], columns=metadata.columns, index=["SampleM"]
+    )
+    metadata = pd.concat([metadata, new_s_row], verify_integrity=True)
+
+    m_table, m_ranks, m_metadata = match_table_and_data(
+        df_to_table(table), ranks, metadata
+    )
+    captured = capsys.readouterr()
+    assert (
+        "1 feature(s) in the BIOM table were not present in the feature "
+        "rankings"
+    ) in captured.out
+    assert (
+        "1 sample(s) in the BIOM table were not present in the sample "
+        "metadata file"
+    ) in captured.out
+    assert (
+        "1 sample(s) in the sample metadata file were not present in the BIOM "
+        "table"
+    ) in captured.out
+    assert_frame_equal(
+        table_to_df(m_table),
+        table.loc[ranks.index, metadata.index[:4]].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(m_metadata, metadata.iloc[:4])
+
+
+def test_match_table_and_data_errors():
+    table, metadata, ranks = get_test_data()
+    bt = df_to_table(table)
+
+    ranks_modified = ranks.copy()
+    ranks_modified.loc["F9"] = [9, 0]
+    with pytest.raises(ValueError) as exception_info:
+        match_table_and_data(bt, ranks_modified, metadata)
+    assert (
+        "Of the 9 ranked features, 1 was not present in the input BIOM table"
+        in str(exception_info.value)
+    )
+
+    # (the error message should use "were" instead of "was" now :)
+    ranks_modified.loc["F10"] = [10, -1]
+    with pytest.raises(ValueError) as exception_info:
+        match_table_and_data(bt, ranks_modified, metadata)
+    assert (
+        "Of the 10 ranked features, 2 were not present in the input BIOM table"
+        in str(exception_info.value)
+    )
+
+    metadata.index = ["lol", "these", "are", "invalid"]
+    with pytest.raises(ValueError) as exception_info:
+        match_table_and_data(bt, ranks, metadata)
+    assert (
+        "No samples are shared between the sample metadata file and BIOM table"
+        in str(exception_info.value)
+    )
+
+
+def test_remove_empty_samples_and_features_none_empty(capsys):
+    table, metadata, ranks = get_test_data()
+    bt = df_to_table(table)
+    f_table, f_metadata, f_ranks = remove_empty_samples_and_features(
+        bt, metadata, ranks
+    )
+    assert f_table is bt
+    assert_frame_equal(f_metadata, metadata)
+    assert_frame_equal(f_ranks, ranks)
+    assert capsys.readouterr().out == ""
+
+
+def test_remove_empty_samples_and_features_samples(capsys):
+    table, metadata, ranks = get_test_data()
+    # Zero out Sample3 (it only has one count, for F1) and Sample4 (it only
+    # has one count, for F4)
+    table.loc["F1", "Sample3"] = 0
+    table.loc["F4", "Sample4"] = 0
+    f_table, f_metadata, f_ranks = remove_empty_samples_and_features(
+        df_to_table(table), metadata, ranks
+    )
+    assert_frame_equal(
+        table_to_df(f_table),
+        table[["Sample1", "Sample2"]].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(f_metadata, metadata.loc[["Sample1", "Sample2"]])
+    assert_frame_equal(f_ranks, ranks)
+    assert "Removed 2 empty sample(s)." in capsys.readouterr().out
+
+
+def test_remove_empty_samples_and_features_features(capsys):
+    table, metadata, ranks = get_test_data()
+    table.loc["F8"] = 0
+    table.loc["F6"] = 0
+    f_table, f_metadata, f_ranks = remove_empty_samples_and_features(
+        df_to_table(table), metadata, ranks
+    )
+    kept_features = ["F1", "F2", "F3", "F4", "F5", "F7"]
+    assert_frame_equal(
+        table_to_df(f_table),
+        table.loc[kept_features].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(f_metadata, metadata)
+    assert_frame_equal(f_ranks, ranks.loc[kept_features])
+    assert "Removed 2 empty feature(s)." in capsys.readouterr().out
+
+
+def test_remove_empty_samples_and_features_both(capsys):
+    table, metadata, ranks = get_test_data()
+    table.loc["F2"] = 0
+    table["Sample4"] = 0
+    f_table, f_metadata, f_ranks = remove_empty_samples_and_features(
+        df_to_table(table), metadata, ranks
+    )
+    kept_features = ["F1", "F3", "F4", "F5", "F6", "F7", "F8"]
+    kept_samples = ["Sample1", "Sample2", "Sample3"]
+    assert_frame_equal(
+        table_to_df(f_table),
+        table.loc[kept_features, kept_samples].astype(float),
+        check_names=False,
+    )
+    assert_frame_equal(f_metadata, metadata.loc[kept_samples])
+    assert_frame_equal(f_ranks, ranks.loc[kept_features])
+    out = capsys.readouterr().out
+    assert "Removed 1 empty sample(s)." in out
+    assert "Removed 1 empty feature(s)." in out
+
+
+def test_remove_empty_samples_and_features_allempty():
+    table, metadata, ranks = get_test_data()
+    table.loc[:] = 0
+    with pytest.raises(ValueError) as exception_info:
+        remove_empty_samples_and_features(df_to_table(table), metadata, ranks)
+    assert "The table is empty." in str(exception_info.value)
+
+
+def test_add_sample_presence_count():
+    # NOTE: for reference, the get_test_data() table initially looks like this:
+    # "Sample1": [1, 2, 3, 4, 5, 6, 7, 8],
+    # "Sample2": [8, 7, 6, 5, 4, 3, 2, 1],
+    # "Sample3": [1, 0, 0, 0, 0, 0, 0, 0],
+    # "Sample4": [0, 0, 0, 1, 0, 0, 0, 0],
+    table, metadata, ranks = get_test_data()
+
+    def check_spc(expected_spc):
+        output_feature_data = add_sample_presence_count(
+            ranks, df_to_table(table)
+        )
+        assert_series_equal(
+            output_feature_data["qurro_spc"],
+            Series(expected_spc, index=ranks.index, name="qurro_spc").astype(
+                float
+            ),
+        )
+        # Make sure that the underlying feature data remains the same
+        assert_frame_equal(
+            output_feature_data.drop("qurro_spc", axis="columns"), ranks
+        )
+
+    check_spc([3, 2, 2, 3, 2, 2, 2, 2])
+
+    # Zero out all counts for feature F3
+    table.loc["F3"] = 0
+    check_spc([3, 2, 0, 3, 2, 2, 2, 2])
+
+    # Zero out all counts, then add back just one count for one feature
+    table.loc[:] = 0
+    table.loc["F2", "Sample4"] = 1
+    check_spc([0, 1, 0, 0, 0, 0, 0, 0])
+
+    ranks.columns = ["Rank 0", "qurro_spc"]
+    with pytest.raises(ValueError):
+        add_sample_presence_count(ranks, df_to_table(table))
+
+
+def test_non_csr_tables():
+    """Checks that functions that look at a table's underlying sparse matrix
+    still work when the matrix isn't in CSR format (e.g. after filtering a
+    table with biom).
+    """
+    table, metadata, ranks = get_test_data()
+    table.loc["F3"] = 0
+    bt = df_to_table(table)
+    csc_bt = bt.filter(list(table.columns), inplace=False)
+    assert csc_bt.matrix_data.format == "csc"
+    assert_frame_equal(
+        add_sample_presence_count(ranks, csc_bt),
+        add_sample_presence_count(ranks, bt),
+    )
+    for expected, observed in zip(
+        get_nonzero_counts(bt), get_nonzero_counts(csc_bt)
+    ):
+        assert list(expected) == list(observed)
+    assert list(get_nonzero_counts(csc_bt)[0]) == [3, 2, 0, 3, 2, 2, 2, 2]
+
+
+def test_get_value_range():
+    table, metadata, ranks = get_test_data()
+    assert get_value_range(df_to_table(table)) == (0, 8)
+    # If there aren't any implicit zeros, 0 shouldn't be included in the range
+    assert get_value_range(df_to_table(table[["Sample1", "Sample2"]])) == (
+        1,
+        8,
+    )
+
+
+def test_vibe_check_table():
+    table, metadata, ranks = get_test_data()
+    bt = df_to_table(table)
+    vibe_check(ranks, bt)
+    vibe_check(ranks, bt, safe_range=[0, 8])
+
+    with pytest.raises(OverflowError) as exception_info:
+        vibe_check(ranks, bt, safe_range=[1, 8])
+    assert (
+        'The input feature table contains entries lower than the "safe" lower '
+        "limit for numbers of 1."
+    ) in str(exception_info.value)
+
+    with pytest.raises(OverflowError) as exception_info:
+        vibe_check(ranks, bt, safe_range=[0, 7])
+    assert (
+        'The input feature table contains entries larger than the "safe" '
+        "upper limit for numbers of 7."
+    ) in str(exception_info.value)
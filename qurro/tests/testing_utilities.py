@@ -7,11 +7,8 @@ from biom import load_table
 import qurro.scripts._plot as rrvp
 from qurro._rank_utils import read_rank_file
 from qurro._metadata_utils import read_metadata_file
-from qurro._df_utils import (
-    replace_nan,
-    match_table_and_data,
-    biom_table_to_sparse_df,
-)
+from qurro._df_utils import replace_nan
+from qurro._table_utils import match_table_and_data
 from qurro._json_utils import get_jsons
 
 
@@ -271,16 +268,18 @@ def validate_rank_plot_json(
     # (Differential or Feature Loading) matches
     assert rank_json["datasets"]["qurro_rank_type"] == ref_rank_type
 
-    # Load the table as a Sparse DF, and then match it up with the sample
-    # metadata. This is needed in order to ensure that the table only describes
-    # samples in the sample metadata.
+    # Load the table, and then match it up with the sample metadata. This is
+    # needed in order to ensure that the table only describes samples in the
+    # sample metadata.
     # (And the reason we do *that* is so that, when we're trying to figure out
     # if a feature is "empty," we can just compute the sum of that feature's
     # row in the table -- which we couldn't do if the table contained samples
     # that would be filtered out in Qurro.)
-    table = biom_table_to_sparse_df(load_table(biom_table_loc))
+    table = load_table(biom_table_loc)
     sample_metadata = read_metadata_file(metadata_loc)
-    table, _ = match_table_and_data(table, ref_feature_ranks, sample_metadata)
+    table, _, _ = match_table_and_data(
+        table, ref_feature_ranks, sample_metadata
+    )
 
     # Validate some basic properties of the plot
     # (This is all handled by Altair, so these property tests aren't
@@ -300,12 +299,9 @@ def validate_rank_plot_json(
         rank_json, id_field="Feature ID"
     )
 
-    # Convert the table to a dense DF (the horror!) so that we can use .loc[]
-    dense_table = table.sparse.to_dense()
-
     for ref_feature_id in ref_feature_ranks.index:
         # If this feature is empty, it should have been filtered!
-        if sum(dense_table.loc[ref_feature_id]) == 0:
+        if sum(table.data(ref_feature_id, axis="observation")) == 0:
             assert ref_feature_id not in rank_json_feature_data
             continue
         # ...If this feature isn't empty, though, it shouldn't have been
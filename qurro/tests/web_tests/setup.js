@@ -3,6 +3,8 @@ requirejs.config({
         display: "instrumented_js/display",
         dom_utils: "instrumented_js/dom_utils",
         feature_computation: "instrumented_js/feature_computation",
+        count_store: "instrumented_js/count_store",
+        count_worker: "instrumented_js/count_worker",
         vega: "../../support_files/vendor/vega.min",
         "vega-lite": "../../support_files/vendor/vega-lite.min",
         "vega-embed": "../../support_files/vendor/vega-embed.min",
@@ -13,6 +15,8 @@ requirejs.config({
         chai: "vendor/chai",
         testing_utilities: "testing_utilities",
         test_compute_balance: "tests/test_compute_balance",
+        test_count_store: "tests/test_count_store",
+        test_count_worker: "tests/test_count_worker",
         test_dom_utils: "tests/test_dom_utils",
         test_filter_features: "tests/test_filter_features",
         test_identify_sample_ids: "tests/test_identify_sample_ids",
@@ -61,6 +65,8 @@ requirejs(
         "chai",
         "testing_utilities",
         "test_compute_balance",
+        "test_count_store",
+        "test_count_worker",
         "test_dom_utils",
         "test_filter_features",
         "test_identify_sample_ids",
@@ -87,6 +93,8 @@ requirejs(
         chai,
         testing_utilities,
         test_compute_balance,
+        test_count_store,
+        test_count_worker,
         test_dom_utils,
         test_filter_features,
         test_identify_sample_ids,
@@ -0,0 +1,67 @@
+define(["count_store", "mocha", "chai"], function (count_store, mocha, chai) {
+    var CountStore = count_store.CountStore;
+    describe("Storing feature counts in a CountStore", function () {
+        // Samples for F2 are listed out of order, to check that rows are
+        // sorted
+        var countJSON = {
+            F1: { S1: 1, S3: 5 },
+            F2: { S4: 2.5, S2: 3, S1: 7 },
+            F3: { S2: 0, S3: 4 },
+        };
+        var sampleIDs = ["S1", "S2", "S3", "S4"];
+        it("Converts count JSONs to CSR format", function () {
+            var cs = CountStore.fromJSON(countJSON, sampleIDs);
+            chai.assert.deepEqual(cs.featureIDs, ["F1", "F2", "F3"]);
+            chai.assert.deepEqual(cs.sampleIDs, sampleIDs);
+            chai.assert.deepEqual(Array.from(cs.indptr), [0, 2, 5, 6]);
+            chai.assert.deepEqual(Array.from(cs.indices), [0, 2, 0, 1, 3, 2]);
+            chai.assert.deepEqual(Array.from(cs.data), [1, 5, 7, 3, 2.5, 4]);
+        });
+        it("Doesn't modify the input sample IDs", function () {
+            var cs = CountStore.fromJSON({ F1: { S1: 1, S9: 2 } }, sampleIDs);
+            chai.assert.deepEqual(cs.sampleIDs, ["S1", "S2", "S3", "S4", "S9"]);
+            chai.assert.deepEqual(sampleIDs, ["S1", "S2", "S3", "S4"]);
+            chai.assert.equal(cs.getCount("F1", "S9"), 2);
+        });
+        it("Looks up counts, treating missing entries as zeros", function () {
+            var cs = CountStore.fromJSON(countJSON, sampleIDs);
+            chai.assert.equal(cs.getCount("F1", "S1"), 1);
+            chai.assert.equal(cs.getCount("F1", "S2"), 0);
+            chai.assert.equal(cs.getCount("F1", "S3"), 5);
+            chai.assert.equal(cs.getCount("F2", "S1"), 7);
+            chai.assert.equal(cs.getCount("F2", "S2"), 3);
+            chai.assert.equal(cs.getCount("F2", "S4"), 2.5);
+            chai.assert.equal(cs.getCount("F3", "S2"), 0);
+            chai.assert.equal(cs.getCount("F3", "S3"), 4);
+            chai.assert.equal(cs.getCount("F4", "S1"), 0);
+            chai.assert.equal(cs.getCount("F1", "S5"), 0);
+        });
+        it("Sums the counts of features in each sample", function () {
+            var cs = CountStore.fromJSON(countJSON, sampleIDs);
+            chai.assert.deepEqual(
+                Array.from(cs.sumFeatureCounts(["F1", "F2"])),
+                [8, 3, 5, 2.5]
+            );
+            chai.assert.deepEqual(
+                Array.from(cs.sumFeatureCounts(["F3", "NotAFeature"])),
+                [0, 0, 4, 0]
+            );
+            chai.assert.deepEqual(
+                Array.from(cs.sumFeatureCounts([])),
+                [0, 0, 0, 0]
+            );
+        });
+        it("Checks if sample IDs are present", function () {
+            var cs = CountStore.fromJSON(countJSON, sampleIDs);
+            chai.assert.isTrue(cs.hasSample("S4"));
+            chai.assert.isFalse(cs.hasSample("S5"));
+        });
+        it("Identifies binary count descriptors", function () {
+            chai.assert.isTrue(
+                CountStore.isDescriptor({ qurro_count_format: "csr" })
+            );
+            chai.assert.isFalse(CountStore.isDescriptor(countJSON));
+            chai.assert.isFalse(CountStore.isDescriptor(null));
+        });
+    });
+});
@@ -0,0 +1,49 @@
+define(["count_store", "count_worker", "mocha", "chai"], function (
+    count_store,
+    count_worker,
+    mocha,
+    chai
+) {
+    describe("Summing feature counts with a CountWorker", function () {
+        var countStore = count_store.CountStore.fromJSON(
+            {
+                F1: { S1: 1, S3: 5 },
+                F2: { S4: 2.5, S2: 3, S1: 7 },
+                F3: { S3: 4 },
+            },
+            ["S1", "S2", "S3", "S4"]
+        );
+        var countWorker;
+        beforeEach(function () {
+            countWorker = new count_worker.CountWorker(countStore);
+        });
+        afterEach(function () {
+            countWorker.terminate();
+        });
+        it("Sums the counts of features in each sample", async function () {
+            var sums = await countWorker.sumFeatureCounts([
+                ["F1", "F2"],
+                ["F3"],
+                [],
+            ]);
+            chai.assert.lengthOf(sums, 3);
+            chai.assert.deepEqual(Array.from(sums[0]), [8, 3, 5, 2.5]);
+            chai.assert.deepEqual(Array.from(sums[1]), [0, 0, 4, 0]);
+            chai.assert.deepEqual(Array.from(sums[2]), [0, 0, 0, 0]);
+            // The CountStore's data should be left alone
+            chai.assert.deepEqual(
+                Array.from(countStore.data),
+                [1, 5, 7, 3, 2.5, 4]
+            );
+        });
+        it("Finishes pending requests on the main thread after being terminated", async function () {
+            var sumsPromise = countWorker.sumFeatureCounts([["F2"]]);
+            countWorker.terminate();
+            chai.assert.isFalse(countWorker.usingWorker());
+            var sums = await sumsPromise;
+            chai.assert.deepEqual(Array.from(sums[0]), [7, 3, 0, 2.5]);
+            sums = await countWorker.sumFeatureCounts([["F1"]]);
+            chai.assert.deepEqual(Array.from(sums[0]), [1, 0, 5, 0]);
+        });
+    });
+});
@@ -1457,6 +1457,95 @@ define(["feature_computation", "mocha", "chai", "testing_utilities"], function (
                     );
                 }, /x ranking not present and\/or numeric for all features/);
             });
+            it("Doesn't reorder the input features", function () {
+                var features = [
+                    { "Feature ID": "A", r: 3 },
+                    { "Feature ID": "B", r: -1 },
+                    { "Feature ID": "C", r: 3 },
+                    { "Feature ID": "D", r: 0 },
+                ];
+                var inputOrder = features.slice();
+                // Top features are returned in ascending order, and ties are
+                // broken by the features' order in the input
+                chai.assert.sameOrderedMembers(
+                    testing_utilities.getFeatureIDsFromObjectArray(
+                        feature_computation.extremeFilterFeatures(
+                            features,
+                            3,
+                            "r",
+                            true
+                        )
+                    ),
+                    ["D", "A", "C"]
+                );
+                chai.assert.sameOrderedMembers(
+                    testing_utilities.getFeatureIDsFromObjectArray(
+                        feature_computation.extremeFilterFeatures(
+                            features,
+                            2,
+                            "r",
+                            false
+                        )
+                    ),
+                    ["B", "D"]
+                );
+                chai.assert.sameOrderedMembers(features, inputOrder);
+            });
+            it("Returns all features if n is larger than the number of features", function () {
+                var features = [
+                    { "Feature ID": "A", r: 3 },
+                    { "Feature ID": "B", r: -1 },
+                    { "Feature ID": "C", r: 0 },
+                ];
+                var useTopVals = [true, false];
+                for (var u = 0; u < useTopVals.length; u++) {
+                    chai.assert.sameOrderedMembers(
+                        testing_utilities.getFeatureIDsFromObjectArray(
+                            feature_computation.extremeFilterFeatures(
+                                features,
+                                5,
+                                "r",
+                                useTopVals[u]
+                            )
+                        ),
+                        ["B", "C", "A"]
+                    );
+                }
+                // Same thing, but going through filterFeatures()
+                var potentialFeatures = rpJSON1.datasets[rpJSON1.data.name];
+                var searchTypes = ["autoLiteralTop", "autoLiteralBot"];
+                for (var s = 0; s < searchTypes.length; s++) {
+                    chai.assert.lengthOf(
+                        feature_computation.filterFeatures(
+                            rpJSON1,
+                            String(potentialFeatures.length + 10),
+                            "n",
+                            searchTypes[s]
+                        ),
+                        potentialFeatures.length
+                    );
+                }
+            });
+            it("Caches the sorted order of features for each ranking", function () {
+                var features = [
+                    { "Feature ID": "A", r: 3, s: 0 },
+                    { "Feature ID": "B", r: -1, s: 1 },
+                    { "Feature ID": "C", r: 2, s: 2 },
+                ];
+                var rOrder = feature_computation.getSortedOrder(features, "r");
+                chai.assert.instanceOf(rOrder, Int32Array);
+                chai.assert.sameOrderedMembers(Array.from(rOrder), [1, 2, 0]);
+                chai.assert.strictEqual(
+                    rOrder,
+                    feature_computation.getSortedOrder(features, "r")
+                );
+                chai.assert.sameOrderedMembers(
+                    Array.from(
+                        feature_computation.getSortedOrder(features, "s")
+                    ),
+                    [0, 1, 2]
+                );
+            });
         });
         describe("existsIntersection()", function () {
             it("Returns true if an intersection exists", function () {
@@ -1493,6 +1582,116 @@ define(["feature_computation", "mocha", "chai", "testing_utilities"], function (
                 );
             });
         });
+        describe("getTextIndex()", function () {
+            var features = [
+                { "Feature ID": "A", t: "a;B;c" },
+                { "Feature ID": "B", t: null },
+                { "Feature ID": "C", t: "A;b;C" },
+                { "Feature ID": "D", t: 5 },
+                { "Feature ID": "E", t: "a;b;d" },
+            ];
+            it("Stores distinct text-searchable values and their features", function () {
+                var index = feature_computation.getTextIndex(features, "t");
+                chai.assert.sameOrderedMembers(index.values, [
+                    "a;b;c",
+                    "5",
+                    "a;b;d",
+                ]);
+                chai.assert.sameOrderedMembers(
+                    Array.from(index.rowValues),
+                    [0, -1, 0, 1, 2]
+                );
+                chai.assert.sameOrderedMembers(index.valueRows[0], [0, 2]);
+            });
+            it("Is cached for each field", function () {
+                chai.assert.strictEqual(
+                    feature_computation.getTextIndex(features, "t"),
+                    feature_computation.getTextIndex(features, "t")
+                );
+                chai.assert.notEqual(
+                    feature_computation.getTextIndex(features, "t"),
+                    feature_computation.getTextIndex(features, "Feature ID")
+                );
+            });
+            it("Is used for text, rank, and OR searching", function () {
+                var rpJSON = JSON.parse(JSON.stringify(rankPlotSkeleton));
+                rpJSON.datasets.dataName = features;
+                rpJSON.datasets.qurro_feature_metadata_ordering.push("t");
+                var searches = [
+                    ["b;c", "text", ["A", "C"]],
+                    ["b", "text", ["A", "C", "E"]],
+                    ["c", "nottext", ["D", "E"]],
+                    ["d", "rank", ["E"]],
+                    ["d | 5", "or", ["D", "E"]],
+                ];
+                for (var i = 0; i < searches.length; i++) {
+                    chai.assert.sameOrderedMembers(
+                        testing_utilities.getFeatureIDsFromObjectArray(
+                            feature_computation.filterFeatures(
+                                rpJSON,
+                                searches[i][0],
+                                "t",
+                                searches[i][1]
+                            )
+                        ),
+                        searches[i][2]
+                    );
+                }
+            });
+        });
+        describe("getNumericIndex()", function () {
+            var features = [
+                { "Feature ID": "A", n: 3 },
+                { "Feature ID": "B", n: null },
+                { "Feature ID": "C", n: " 1.5 " },
+                { "Feature ID": "D", n: "asdf" },
+                { "Feature ID": "E", n: 3 },
+                { "Feature ID": "F", n: -2 },
+            ];
+            it("Stores sorted numeric values and their features", function () {
+                var index = feature_computation.getNumericIndex(features, "n");
+                chai.assert.sameOrderedMembers(
+                    Array.from(index.values),
+                    [-2, 1.5, 3, 3]
+                );
+                chai.assert.sameOrderedMembers(
+                    Array.from(index.positions),
+                    [5, 2, 0, 4]
+                );
+            });
+            it("Is cached for each field", function () {
+                chai.assert.strictEqual(
+                    feature_computation.getNumericIndex(features, "n"),
+                    feature_computation.getNumericIndex(features, "n")
+                );
+            });
+            it("Is used for threshold searching, preserving feature order", function () {
+                var rpJSON = JSON.parse(JSON.stringify(rankPlotSkeleton));
+                rpJSON.datasets.dataName = features;
+                rpJSON.datasets.qurro_feature_metadata_ordering.push("n");
+                var searches = [
+                    ["3", "lt", ["C", "F"]],
+                    ["3", "lte", ["A", "C", "E", "F"]],
+                    ["3", "gt", []],
+                    ["3", "gte", ["A", "E"]],
+                    ["-5", "gt", ["A", "C", "E", "F"]],
+                    ["-2", "lt", []],
+                ];
+                for (var i = 0; i < searches.length; i++) {
+                    chai.assert.sameOrderedMembers(
+                        testing_utilities.getFeatureIDsFromObjectArray(
+                            feature_computation.filterFeatures(
+                                rpJSON,
+                                searches[i][0],
+                                "n",
+                                searches[i][1]
+                            )
+                        ),
+                        searches[i][2]
+                    );
+                }
+            });
+        });
         describe("textToRankArray()", function () {
             it("Works with basic, simple taxonomy strings", function () {
                 chai.assert.sameOrderedMembers(
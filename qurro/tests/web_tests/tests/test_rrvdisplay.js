@@ -776,6 +776,20 @@ define(["vega", "mocha", "chai", "testing_utilities", "dom_utils"], function (
                         rrv.rankPlotJSON.transform[0].sort[0].field
                     );
                 });
+                it("Updates the rank plot in place, without remaking it", async function () {
+                    var oldView = rrv.rankPlotView;
+                    document.getElementById("rankField").value = "Rank 1";
+                    await document.getElementById("rankField").onchange();
+                    chai.assert.strictEqual(oldView, rrv.rankPlotView);
+                    chai.assert.equal(
+                        "Rank 1",
+                        rrv.rankPlotView.signal("qurro_rank_field")
+                    );
+                    chai.assert.equal(
+                        "Differential: Rank 1",
+                        rrv.rankPlotView.signal("qurro_rank_title")
+                    );
+                });
             });
             describe("Changing the bar width", function () {
                 async function triggerBarSizeUpdate(newValue) {
@@ -907,6 +921,11 @@ define(["vega", "mocha", "chai", "testing_utilities", "dom_utils"], function (
                         "#e0e0e0",
                         rrv.rankPlotJSON.encoding.color.scale.range[0]
                     );
+                    // Check that the rank plot itself was updated, too
+                    chai.assert.sameOrderedMembers(
+                        rrv.rankPlotJSON.encoding.color.scale.range,
+                        rrv.rankPlotView.signal("qurro_rank_colors")
+                    );
                 });
             });
         });
@@ -1002,6 +1021,15 @@ define(["vega", "mocha", "chai", "testing_utilities", "dom_utils"], function (
                         )
                     );
                 });
+                it("Updates the sample plot in place, without remaking it", async function () {
+                    var oldView = rrv.samplePlotView;
+                    await testColorFieldChange("Metadata3");
+                    chai.assert.strictEqual(oldView, rrv.samplePlotView);
+                    chai.assert.equal(
+                        "Metadata3",
+                        rrv.samplePlotView.signal("qurro_color_field")
+                    );
+                });
             });
             describe("Changing the color scale type used on the sample plot", function () {
                 var colorScaleEle = document.getElementById("colorScale");
@@ -136,70 +136,83 @@ define(["mocha", "chai", "testing_utilities"], function (
             });
         });
         describe("Summing feature abundances in a sample", function () {
+            // Returns the summed counts of some features in a sample, using
+            // the same per-sample sums that updateBalanceMulti() uses
+            function sumCounts(sampleID, features) {
+                var s = rrv.countStore.sampleIndex.get(sampleID);
+                return rrv.getFeatureCountSums(features)[s];
+            }
             it("Correctly sums feature abundances in a sample", function () {
                 // Check case when number of features is just one
                 chai.assert.equal(
                     6,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample1" },
-                        [{ "Feature ID": "Taxon2" }]
-                    )
+                    sumCounts("Sample1", [{ "Feature ID": "Taxon2" }])
                 );
                 // Check with multiple features
                 chai.assert.equal(
                     7,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample1" },
-                        [{ "Feature ID": "Taxon2" }, { "Feature ID": "Taxon4" }]
-                    )
+                    sumCounts("Sample1", [
+                        { "Feature ID": "Taxon2" },
+                        { "Feature ID": "Taxon4" },
+                    ])
                 );
                 chai.assert.equal(
                     7,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample1" },
-                        [
-                            { "Feature ID": "Taxon2" },
-                            { "Feature ID": "Taxon4" },
-                            { "Feature ID": "Taxon1" },
-                        ]
-                    )
+                    sumCounts("Sample1", [
+                        { "Feature ID": "Taxon2" },
+                        { "Feature ID": "Taxon4" },
+                        { "Feature ID": "Taxon1" },
+                    ])
                 );
                 // Check with another sample + an annotated feature
                 chai.assert.equal(
                     8,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample2" },
-                        [{ "Feature ID": "Taxon2" }, { "Feature ID": "Taxon3" }]
-                    )
+                    sumCounts("Sample2", [
+                        { "Feature ID": "Taxon2" },
+                        { "Feature ID": "Taxon3" },
+                    ])
                 );
                 // Check that sparse data is handled properly (i.e. 0s are
                 // returned)
                 // (Sample1 doesn't have any counts of Taxon1 or Taxon5.)
                 chai.assert.equal(
                     0,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample1" },
-                        [{ "Feature ID": "Taxon1" }, { "Feature ID": "Taxon5" }]
-                    )
+                    sumCounts("Sample1", [
+                        { "Feature ID": "Taxon1" },
+                        { "Feature ID": "Taxon5" },
+                    ])
                 );
             });
             it("Returns 0 when the input list of features is empty", function () {
-                chai.assert.equal(
-                    0,
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "Sample3" },
-                        []
-                    )
-                );
+                chai.assert.equal(0, sumCounts("Sample3", []));
             });
-            it("Throws an error if sample ID isn't present in data", function () {
-                // Check that an invalid sample ID causes an error
-                chai.assert.throws(function () {
-                    rrv.sumAbundancesForSampleFeatures(
-                        { "Sample ID": "lolthisisntreal" },
-                        []
+            it("Returns sums for every sample, in the count store's order", function () {
+                var features = [
+                    { "Feature ID": "Taxon2" },
+                    { "Feature ID": "Taxon5" },
+                ];
+                var sums = rrv.getFeatureCountSums(features);
+                chai.assert.lengthOf(sums, rrv.countStore.sampleIDs.length);
+                for (var s = 0; s < sums.length; s++) {
+                    var sampleID = rrv.countStore.sampleIDs[s];
+                    chai.assert.equal(
+                        rrv.getCount("Taxon2", sampleID) +
+                            rrv.getCount("Taxon5", sampleID),
+                        sums[s]
                     );
-                });
+                }
+            });
+            it("Caches the sums for each array of features", function () {
+                var features = [{ "Feature ID": "Taxon3" }];
+                chai.assert.strictEqual(
+                    rrv.getFeatureCountSums(features),
+                    rrv.getFeatureCountSums(features)
+                );
+                // A new array of the same features gets its own sums
+                chai.assert.notStrictEqual(
+                    rrv.getFeatureCountSums(features),
+                    rrv.getFeatureCountSums([{ "Feature ID": "Taxon3" }])
+                );
             });
         });
     });
@@ -72,7 +72,8 @@ setup(
     # is due to how the setup_requires dependencies are downloaded; they aren't
     # officially "installed".
     setup_requires=["cython", "numpy >= 1.12.0"],
-    packages=find_packages(),
+    # benchmarks/ contains asv benchmarks, which shouldn't be installed
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     # Needed in order to ensure that support_files/*, etc. are installed (in
     # turn, these files are specified in MANIFEST.in).
     # See https://python-packaging.readthedocs.io/en/latest/non-code-files.html
@@ -102,7 +103,9 @@ setup(
             "pytest-cov >= 2.0",
             "flake8",
             "nbconvert",
-        ]
+        ],
+        # Optional; used to speed up writing out and reading in JSONs
+        "fast": ["orjson"],
     },
     classifiers=classifiers,
     entry_points={